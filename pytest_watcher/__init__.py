@@ -1,5 +1,13 @@
-from .watcher import VERSION, run
+from .constants import VERSION
 
 __version__ = VERSION
 
 __all__ = ["run"]
+
+
+def run():
+    # Imported lazily so that the pytest plugin shipped with the package
+    # does not pull the watcher machinery into the test runner process
+    from .watcher import run
+
+    return run()
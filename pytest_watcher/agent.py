@@ -0,0 +1,420 @@
+"""
+Test runs on another machine or inside a container.
+
+The watcher keeps observing the files on the host and sends the run
+requests to an agent started next to the tests:
+
+    python -m pytest_watcher.agent --socket /path/to/agent.sock
+    python -m pytest_watcher.agent --stdio
+
+Messages are newline-delimited JSON objects, requests have a `cmd` key and
+responses a `type` key, like the daemon protocol. The agent imports pytest
+once and forks every pytest run from that warm process.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from dataclasses import asdict
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional
+
+from . import runner
+from .resources import RSSSampler, Usage
+from .runner import RunResult
+
+Message = Dict[str, Any]
+
+# Pings sent on connection, the fastest one is the reported round trip
+PING_COUNT = 3
+
+# Transport overhead of a run above which a warning is logged
+OVERHEAD_WARNING = 0.05
+
+# Return code of the runs the agent could not execute, pytest's internal error
+AGENT_ERROR_RETURNCODE = 3
+
+
+def write_message(writer: IO[bytes], message: Message) -> None:
+    writer.write(json.dumps(message).encode() + b"\n")
+    writer.flush()
+
+
+def read_messages(reader: IO[bytes]) -> Iterator[Message]:
+    for line in reader:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            logging.debug(f"Malformed agent message: {line!r}")
+
+
+class _ForkedRun:
+    def __init__(self, pid: int):
+        self.pid = pid
+
+    def terminate(self) -> None:
+        try:
+            os.kill(self.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+class Agent:
+    """Executes the runs requested by a watcher, one at a time"""
+
+    def __init__(self, reader: IO[bytes], writer: IO[bytes]):
+        self._reader = reader
+        self._writer = writer
+        self._lock = threading.Lock()
+        self._current: Any = None
+        self._worker: Optional[threading.Thread] = None
+        # Cleared before the result is sent, the worker may still be exiting
+        # when the watcher requests the next run
+        self._busy = False
+
+        try:
+            import pytest
+        except ImportError:
+            self._pytest: Any = None
+        else:
+            self._pytest = pytest
+
+    def send(self, message: Message) -> None:
+        with self._lock:
+            write_message(self._writer, message)
+
+    def serve(self) -> None:
+        for message in read_messages(self._reader):
+            cmd = message.get("cmd")
+
+            if cmd == "ping":
+                self.send({"type": "pong"})
+            elif cmd == "run":
+                if self._busy:
+                    self.send({"type": "error", "message": "A run is in progress"})
+                    continue
+                if self._worker is not None:
+                    self._worker.join()
+                self._busy = True
+                self._worker = threading.Thread(
+                    target=self._run, args=(message,), daemon=True
+                )
+                self._worker.start()
+            elif cmd == "cancel":
+                current = self._current
+                if current is not None:
+                    current.terminate()
+            else:
+                self.send({"type": "error", "message": f"Unknown command: {cmd}"})
+
+        if self._worker is not None:
+            self._worker.join()
+
+    def _run(self, message: Message) -> None:
+        command = message["command"]
+        env = message.get("env") or {}
+        sample_interval = message.get("sample_interval", 0.0)
+
+        def on_output(line: str) -> None:
+            self.send({"type": "output", "data": line})
+
+        reply: Message
+        try:
+            if self._can_fork(command):
+                result = self._fork_pytest(command, env, sample_interval, on_output)
+            else:
+                result = runner.run(
+                    command,
+                    on_output=on_output,
+                    sample_interval=sample_interval,
+                    env=env,
+                    on_start=self._started,
+                )
+        except Exception as exc:
+            reply = {"type": "error", "message": str(exc)}
+        else:
+            usage = asdict(result.usage)
+            reply = {"type": "result", "returncode": result.returncode, "usage": usage}
+        finally:
+            self._current = None
+
+        self._busy = False
+        self.send(reply)
+
+    def _started(self, process: Any) -> None:
+        self._current = process
+        self.send({"type": "started"})
+
+    def _can_fork(self, command: List[str]) -> bool:
+        return (
+            self._pytest is not None
+            and hasattr(os, "fork")
+            and runner.is_pytest_command(command)
+        )
+
+    def _fork_pytest(
+        self,
+        command: List[str],
+        env: Dict[str, str],
+        sample_interval: float,
+        on_output: Callable[[str], None],
+    ) -> RunResult:
+        args = command[1:] if runner.is_pytest_runner(command[0]) else command[3:]
+
+        started = time.monotonic()
+        read_fd, write_fd = os.pipe()
+
+        # No message is half-written by another thread when forking
+        with self._lock:
+            pid = os.fork()
+
+        if pid == 0:
+            os.close(read_fd)
+            self._exec_pytest(args, env, write_fd)
+
+        os.close(write_fd)
+        sampler = RSSSampler(pid, sample_interval).start() if sample_interval else None
+        self._started(_ForkedRun(pid))
+
+        try:
+            with os.fdopen(read_fd, errors="replace") as output:
+                for line in output:
+                    on_output(line)
+            _, status, rusage = os.wait4(pid, 0)
+        finally:
+            samples = sampler.stop() if sampler else []
+
+        usage = Usage.from_rusage(time.monotonic() - started, rusage)
+        usage.rss_samples = samples
+        return RunResult(command, os.waitstatus_to_exitcode(status), usage)
+
+    def _exec_pytest(self, args: List[str], env: Dict[str, str], output_fd: int) -> None:
+        """Runs in the forked child and never returns"""
+        code = 1
+        try:
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.dup2(output_fd, 1)
+            os.dup2(output_fd, 2)
+            # The inherited streams may be locked by another thread of the agent
+            sys.stdin = open(0, closefd=False)
+            sys.stdout = open(1, "w", buffering=1, closefd=False)
+            sys.stderr = open(2, "w", buffering=1, closefd=False)
+            os.environ.update(env)
+
+            code = int(self._pytest.main(args))
+        except SystemExit as exc:
+            code = exc.code if isinstance(exc.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+
+class _RemoteProcess:
+    """Stands for the runner process on the agent side"""
+
+    def __init__(self, remote: RemoteRunner):
+        self._remote = remote
+
+    def terminate(self) -> None:
+        self._remote.cancel()
+
+
+class RemoteRunner:
+    """Client side of the agent, a drop-in for `runner.run`"""
+
+    def __init__(
+        self,
+        reader: IO[bytes],
+        writer: IO[bytes],
+        address: str,
+        close: Optional[Callable[[], None]] = None,
+    ):
+        self.address = address
+        self._reader = reader
+        self._writer = writer
+        self._messages = read_messages(reader)
+        self._close = close
+        self._lock = threading.Lock()
+        self.round_trip: Optional[float] = None
+        # Time between sending a run request and the start of the runner
+        self.overhead: Optional[float] = None
+
+    @classmethod
+    def connect(cls, address: str) -> RemoteRunner:
+        """Connect to `unix:PATH`, or start `stdio:COMMAND` and talk to it"""
+        scheme, _, target = address.partition(":")
+
+        try:
+            if scheme == "unix":
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(target)
+                remote = cls(
+                    sock.makefile("rb"), sock.makefile("wb"), address, sock.close
+                )
+            elif scheme == "stdio":
+                proc = subprocess.Popen(
+                    shlex.split(target), stdin=subprocess.PIPE, stdout=subprocess.PIPE
+                )
+                assert proc.stdin is not None and proc.stdout is not None
+                remote = cls(proc.stdout, proc.stdin, address, proc.terminate)
+            else:
+                raise SystemExit(
+                    f"Invalid remote address: {address}\n"
+                    "Expected unix:PATH or stdio:COMMAND"
+                )
+
+            remote.round_trip = min(remote.ping() for _ in range(PING_COUNT))
+        except OSError as exc:
+            raise SystemExit(f"Unable to connect to the agent at {address}: {exc}")
+
+        logging.info(
+            f"Connected to the agent at {address}, "
+            f"round trip {remote.round_trip * 1000:.2f} ms"
+        )
+        return remote
+
+    def send(self, message: Message) -> None:
+        with self._lock:
+            write_message(self._writer, message)
+
+    def ping(self) -> float:
+        started = time.perf_counter()
+        self.send({"cmd": "ping"})
+        self._receive("pong")
+        return time.perf_counter() - started
+
+    def cancel(self) -> None:
+        try:
+            self.send({"cmd": "cancel"})
+        except OSError:
+            pass
+
+    def run(
+        self,
+        command: List[str],
+        on_output: Optional[Callable[[str], None]] = None,
+        sample_interval: float = 0.0,
+        env: Optional[Dict[str, str]] = None,
+        base_env: Optional[Dict[str, str]] = None,
+        on_start: Optional[Callable[[Any], None]] = None,
+    ) -> RunResult:
+        """
+        Run the command on the agent. `base_env` is ignored, the runner
+        gets the environment of the agent along with `env`.
+        """
+        started = time.perf_counter()
+        self.send(
+            {
+                "cmd": "run",
+                "command": command,
+                "env": env or {},
+                "sample_interval": sample_interval,
+            }
+        )
+
+        try:
+            for message in self._messages:
+                if message["type"] == "started":
+                    self._record_overhead(time.perf_counter() - started)
+                    if on_start is not None:
+                        on_start(_RemoteProcess(self))
+                elif message["type"] == "output":
+                    if on_output is not None:
+                        on_output(message["data"])
+                    else:
+                        sys.stdout.write(message["data"])
+                        sys.stdout.flush()
+                elif message["type"] == "result":
+                    usage = Usage(**message["usage"])
+                    return RunResult(command, message["returncode"], usage)
+                elif message["type"] == "error":
+                    # The watcher keeps running, the next run may succeed
+                    logging.error(f"The agent failed to run tests: {message['message']}")
+                    return RunResult(command, AGENT_ERROR_RETURNCODE, Usage())
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+
+        raise SystemExit(f"Lost connection to the agent at {self.address}")
+
+    def close(self) -> None:
+        for stream in (self._writer, self._reader):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        if self._close is not None:
+            self._close()
+
+    def _receive(self, message_type: str) -> Message:
+        for message in self._messages:
+            if message["type"] == message_type:
+                return message
+        raise OSError(f"connection closed before {message_type}")
+
+    def _record_overhead(self, overhead: float) -> None:
+        self.overhead = overhead
+        logging.debug(f"Agent started the run in {overhead * 1000:.2f} ms")
+        if overhead > OVERHEAD_WARNING:
+            logging.warning(
+                f"The agent took {overhead * 1000:.0f} ms to start the run, "
+                f"round trip is {(self.round_trip or 0) * 1000:.2f} ms"
+            )
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="pytest_watcher.agent",
+        description="Run the tests requested by a pytest-watcher on another host",
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--socket", help="Listen on this Unix socket path")
+    group.add_argument(
+        "--stdio", action="store_true", help="Talk over the standard streams"
+    )
+    namespace = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO, format="[ptw-agent] %(message)s")
+
+    if namespace.stdio:
+        Agent(sys.stdin.buffer, sys.stdout.buffer).serve()
+        return
+
+    if os.path.exists(namespace.socket):
+        os.unlink(namespace.socket)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(namespace.socket)
+    server.listen()
+    logging.info(f"Waiting for a watcher on {namespace.socket}")
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn, conn.makefile("rb") as reader, conn.makefile("wb") as writer:
+                logging.info("Watcher connected")
+                Agent(reader, writer).serve()
+                logging.info("Watcher disconnected")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.unlink(namespace.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Non-interactive mode: every test run is reported as one JSON record
+on stdout, while the runner output goes to stderr.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Optional, TextIO
+
+from . import runner
+from .cache import get_cache_dir
+from .config import Config
+from .constants import LOOP_DELAY
+from .pipeline import StageRun
+from .plugin import RESULTS_OUTPUT_ENV, read_report, report_path
+from .session import Session
+from .tiers import select_tests
+from .trigger import RunRequest, Trigger
+
+# pytest exit codes
+OUTCOMES = {
+    0: "passed",
+    1: "failed",
+    2: "interrupted",
+    3: "internal-error",
+    4: "usage-error",
+    5: "no-tests",
+}
+
+
+def get_outcome(returncode: int, pytest: bool) -> str:
+    if returncode == 0:
+        return "passed"
+    if pytest:
+        return OUTCOMES.get(returncode, "error")
+    return "failed"
+
+
+def write_record(record: Dict[str, Any], stream: Optional[TextIO] = None) -> None:
+    stream = stream or sys.stdout
+    stream.write(json.dumps(record) + "\n")
+    stream.flush()
+
+
+def run_tests(config: Config, session: Session, request: RunRequest) -> Dict[str, Any]:
+    if config.stages:
+        started = time.time()
+        failed = session.run_stages(config, request.changes, sys.stderr.write)
+        if failed is not None:
+            return _stage_record(request, failed, started)
+
+    tests = select_tests(config, request, session.classifier)
+    prepared = session.prepare_runner(config)
+    command = [*prepared.argv, *(request.args or ()), *tests]
+    env = None
+    results_path: Optional[Path] = None
+
+    pytest = runner.is_pytest_command(command)
+    # The plugin writes to the host cache directory, out of reach of the agent
+    if pytest and session.remote is None and session.environment.loads_plugin(config):
+        results_path = report_path(get_cache_dir(config.path), "results")
+        command = runner.with_plugin(command)
+        env = {RESULTS_OUTPUT_ENV: str(results_path)}
+
+    command = session.plugins.modify_command(command, request)
+
+    def on_output(line: str) -> None:
+        sys.stderr.write(line)
+
+    started = time.time()
+    result = session.run(
+        command,
+        on_output=on_output,
+        sample_interval=config.rss_sample_interval,
+        env=env,
+        base_env=prepared.env,
+    )
+    warnings = session.record(result)
+    session.plugins.run_finished(result, request)
+
+    usage = asdict(result.usage)
+    usage.pop("rss_samples")
+
+    record: Dict[str, Any] = {
+        "type": "run",
+        "source": request.source,
+        "changes": sorted(request.changes),
+        "command": command,
+        "started": started,
+        "duration": result.duration,
+        "returncode": result.returncode,
+        "outcome": get_outcome(result.returncode, pytest),
+        "counts": {},
+        "failed": [],
+        "usage": usage,
+        "warnings": warnings,
+    }
+
+    if results_path is not None:
+        record.update(_read_results(results_path))
+
+    return record
+
+
+def _stage_record(
+    request: RunRequest, failed: StageRun, started: float
+) -> Dict[str, Any]:
+    assert failed.result is not None
+    usage = asdict(failed.result.usage)
+    usage.pop("rss_samples")
+
+    return {
+        "type": "run",
+        "source": request.source,
+        "changes": sorted(request.changes),
+        "command": failed.command,
+        "started": started,
+        "duration": failed.result.duration,
+        "returncode": failed.result.returncode,
+        "outcome": "failed",
+        "stage": failed.stage.name,
+        "counts": {},
+        "failed": [],
+        "usage": usage,
+        "warnings": [],
+    }
+
+
+def _read_results(path: Path) -> Dict[str, Any]:
+    results = read_report(path)
+    if not isinstance(results, dict):
+        return {}
+
+    return {
+        "counts": results.get("counts", {}),
+        "failed": results.get("failed", []),
+        "collected": results.get("collected", 0),
+    }
+
+
+def main_loop(trigger: Trigger, config: Config, session: Session) -> bool:
+    """Run the next test cycle if due. Returns whether a run took place"""
+    ran = False
+
+    if trigger.check():
+        slot = session.scheduler.try_acquire(config, trigger.last_event)
+
+        if slot is not None:
+            request = trigger.take_request(config.runner_args)
+            assert request is not None
+
+            session.changes = request.changes
+            try:
+                write_record(run_tests(config, session, request))
+            finally:
+                slot.release()
+            trigger.release()
+            ran = True
+
+    time.sleep(LOOP_DELAY)
+    return ran
+
+
+def run(trigger: Trigger, config: Config, session: Session) -> int:
+    """
+    Run test cycles until `max_runs` is reached or nothing happens
+    for `exit_on_idle` seconds. Returns the exit code of the last run.
+    """
+    runs = 0
+    idle_since = time.time()
+
+    while True:
+        if main_loop(trigger, config, session):
+            runs += 1
+            idle_since = time.time()
+
+        reason = None
+        if config.max_runs and runs >= config.max_runs:
+            reason = "max-runs"
+        elif trigger.is_active():
+            idle_since = max(idle_since, trigger.last_event)
+        elif config.exit_on_idle and time.time() - idle_since >= config.exit_on_idle:
+            reason = "idle"
+
+        if reason is not None:
+            write_record({"type": "exit", "reason": reason, "runs": runs})
+            last = session.last_result
+            return last.returncode if last is not None else 0
@@ -0,0 +1,13 @@
+import hashlib
+import os
+from pathlib import Path
+
+
+def get_project_digest(path: Path) -> str:
+    return hashlib.sha1(str(path.resolve()).encode()).hexdigest()[:12]
+
+
+def get_cache_dir(path: Path) -> Path:
+    """Directory for the files that pytest-watcher keeps for the project at `path`"""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home().joinpath(".cache")
+    return Path(base, "pytest-watcher", get_project_digest(path))
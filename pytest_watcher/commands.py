@@ -5,6 +5,8 @@ import sys
 from typing import Iterable
 
 from .config import Config
+from .focus import read_last_failed
+from .search import TestIndex
 from .terminal import Terminal
 from .trigger import Trigger
 
@@ -87,7 +89,7 @@ class InvokeCommand(Command):
     description = "Invoke test runner"
 
     def run(self, trigger: Trigger, term: Terminal, config: Config) -> None:
-        trigger.emit_now()
+        trigger.emit_now(config.runner_args)
 
 
 class ResetRunnerArgsCommand(Command):
@@ -97,7 +99,7 @@ class ResetRunnerArgsCommand(Command):
 
     def run(self, trigger: Trigger, term: Terminal, config: Config) -> None:
         config.runner_args.clear()
-        trigger.emit_now()
+        trigger.emit_now(config.runner_args)
 
 
 class ChangeRunnerArgsCommand(Command):
@@ -106,12 +108,35 @@ class ChangeRunnerArgsCommand(Command):
     description = "change runner args"
 
     def run(self, trigger: Trigger, term: Terminal, config: Config) -> None:
-        term.reset()
-        raw = input("\nEnter new runner args: ")
-        new_args = raw.strip().split()
-        config.runner_args.clear()
-        config.runner_args.extend(new_args)
-        trigger.emit_now()
+        def submit(line: str) -> None:
+            config.runner_args[:] = line.split()
+            trigger.emit_now(config.runner_args)
+
+        term.edit_line(
+            "Enter new runner args: ",
+            submit,
+            text=" ".join(config.runner_args),
+            history="runner_args",
+        )
+
+
+class KeywordFilterCommand(Command):
+    character = "k"
+    caption = "k"
+    description = "filter tests by keyword (-k)"
+
+    def run(self, trigger: Trigger, term: Terminal, config: Config) -> None:
+        args, expression = _pop_option(config.runner_args, "-k")
+
+        def submit(line: str) -> None:
+            config.runner_args[:] = args
+            if line.strip():
+                config.runner_args.extend(["-k", line.strip()])
+            trigger.emit_now(config.runner_args)
+
+        term.edit_line(
+            "Run tests matching (-k): ", submit, text=expression, history="keyword"
+        )
 
 
 class OnlyFailedCommand(Command):
@@ -122,7 +147,7 @@ class OnlyFailedCommand(Command):
     def run(self, trigger: Trigger, term: Terminal, config: Config) -> None:
         if "--lf" not in config.runner_args:
             config.runner_args.append("--lf")
-        trigger.emit_now()
+        trigger.emit_now(config.runner_args)
 
 
 class PDBCommand(Command):
@@ -133,7 +158,7 @@ class PDBCommand(Command):
     def run(self, trigger: Trigger, term: Terminal, config: Config) -> None:
         if "--pdb" not in config.runner_args:
             config.runner_args.append("--pdb")
-        trigger.emit_now()
+        trigger.emit_now(config.runner_args)
 
 
 class VerboseCommand(Command):
@@ -144,7 +169,80 @@ class VerboseCommand(Command):
     def run(self, trigger: Trigger, term: Terminal, config: Config) -> None:
         if "-v" not in config.runner_args:
             config.runner_args.append("-v")
-        trigger.emit_now()
+        trigger.emit_now(config.runner_args)
+
+
+class ProfileCommand(Command):
+    character = "P"
+    caption = "P"
+    description = "profile the next run"
+
+    def run(self, trigger: Trigger, term: Terminal, config: Config) -> None:
+        config.profile = True
+        trigger.emit_now(config.runner_args)
+
+
+class FocusCommand(Command):
+    character = "F"
+    caption = "F"
+    description = "focus on a failing test"
+
+    def run(self, trigger: Trigger, term: Terminal, config: Config) -> None:
+        if config.focus is not None:
+            term.print(f"\n[ptw] Leaving focus on {config.focus}\n")
+            config.focus = None
+            return
+
+        failed = read_last_failed(config.path)
+        if not failed:
+            term.print("\n[ptw] No failing test to focus on\n")
+            return
+
+        config.focus = failed[0]
+        term.print(f"\n[ptw] Focusing on {config.focus}\n")
+        trigger.emit_now(config.runner_args)
+
+
+class FilterTestsCommand(Command):
+    character = "/"
+    caption = "/"
+    description = "filter tests by name"
+
+    def run(self, trigger: Trigger, term: Terminal, config: Config) -> None:
+        index = TestIndex.load(config.path)
+        if not len(index) and not config.test_filter:
+            term.print(
+                "\n[ptw] No collected tests in the pytest cache, run them first\n"
+            )
+            return
+
+        def hint(text: str) -> str:
+            count = len(index.search(text)) if text.strip() else len(index)
+            return f"  ({count} tests)"
+
+        def submit(line: str) -> None:
+            if not line.strip():
+                config.test_filter = []
+                config.test_filter_query = ""
+                trigger.emit_now(config.runner_args)
+                return
+
+            matches = index.search(line)
+            if not matches:
+                term.print(f"\n[ptw] No test matches {line.strip()!r}\n")
+                return
+
+            config.test_filter = index.resolve(matches)
+            config.test_filter_query = line.strip()
+            trigger.emit_now(config.runner_args)
+
+        term.edit_line(
+            "Run tests named: ",
+            submit,
+            text=config.test_filter_query,
+            history="test_filter",
+            hint=hint,
+        )
 
 
 class EraseScreenCommand(Command):
@@ -164,3 +262,21 @@ class QuitCommand(Command):
 
     def run(self, trigger: Trigger, term: Terminal, config: Config) -> None:
         sys.exit(0)
+
+
+def _pop_option(args: list[str], option: str) -> tuple[list[str], str]:
+    """The args without `option` and its value, and the value"""
+    rest: list[str] = []
+    value = ""
+    i = 0
+    while i < len(args):
+        if args[i] == option and i + 1 < len(args):
+            value = args[i + 1]
+            i += 2
+        elif args[i].startswith(option + "="):
+            value = args[i][len(option) + 1 :]
+            i += 1
+        else:
+            rest.append(args[i])
+            i += 1
+    return rest, value
@@ -1,9 +1,12 @@
+import dataclasses
+import logging
 from argparse import Namespace
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Mapping, Optional
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
 
 from .constants import DEFAULT_DELAY
+from .pipeline import parse_stages
 
 try:
     import tomllib
@@ -20,8 +23,74 @@ CLI_FIELDS = {
     "patterns",
     "ignore_patterns",
     "notify_on_failure",
+    "rss_sample_interval",
+    "max_load",
+    "min_free_memory",
+    "max_parallel_runs",
+    "since",
+    "json",
+    "max_runs",
+    "exit_on_idle",
+    "watch_paths",
+    "affected",
+    "env_file",
+    "venv",
+    "observer",
+    "speculative",
+    "remote",
+    "retry_flaky",
+    "record",
+    "learn_test_inputs",
 }
-CONFIG_FIELDS = CLI_FIELDS | {"runner_args"}
+CONFIG_FIELDS = CLI_FIELDS | {"runner_args", "test_inputs", "stages"}
+# Watched paths, test inputs, the observer, the agent and the recording are set up
+# once on startup
+RELOADABLE_FIELDS = CONFIG_FIELDS - {
+    "now",
+    "watch_paths",
+    "test_inputs",
+    "observer",
+    "remote",
+    "record",
+}
+
+FIELD_TYPES: Dict[str, Tuple[type, ...]] = {
+    "now": (bool,),
+    "clear": (bool,),
+    "notify_on_failure": (bool,),
+    "delay": (int, float),
+    "runner": (str,),
+    "runner_args": (list,),
+    "patterns": (list,),
+    "ignore_patterns": (list,),
+    "rss_sample_interval": (int, float),
+    "max_load": (int, float),
+    "min_free_memory": (int,),
+    "max_parallel_runs": (int,),
+    "since": (str,),
+    "json": (bool,),
+    "max_runs": (int,),
+    "exit_on_idle": (int, float),
+    "watch_paths": (list,),
+    "affected": (bool,),
+    "env_file": (str,),
+    "venv": (str,),
+    "observer": (str,),
+    "speculative": (bool,),
+    "remote": (str,),
+    "retry_flaky": (bool,),
+    "record": (str,),
+    "learn_test_inputs": (bool,),
+    "test_inputs": (dict,),
+    "stages": (list,),
+}
+
+FIELD_CHOICES: Dict[str, Tuple[str, ...]] = {
+    "observer": ("watchdog", "inotify"),
+}
+
+_find_cache: Dict[Path, Optional[Path]] = {}
+_parse_cache: Dict[Path, Tuple[Tuple[int, int, int], Mapping]] = {}
 
 
 @dataclass
@@ -35,6 +104,39 @@ class Config:
     runner_args: List[str] = field(default_factory=list)
     patterns: List[str] = field(default_factory=list)
     ignore_patterns: List[str] = field(default_factory=list)
+    rss_sample_interval: float = 0.0
+    max_load: float = 0.0
+    min_free_memory: int = 0
+    max_parallel_runs: int = 0
+    since: str = "HEAD"
+    json: bool = False
+    max_runs: int = 0
+    exit_on_idle: float = 0.0
+    watch_paths: List[str] = field(default_factory=list)
+    affected: bool = False
+    env_file: str = ""
+    venv: str = ""
+    observer: str = "watchdog"
+    speculative: bool = False
+    remote: str = ""
+    retry_flaky: bool = False
+    record: str = ""
+    learn_test_inputs: bool = False
+    test_inputs: Dict[str, List[str]] = field(default_factory=dict)
+    # Checks run before the tests, see `pipeline.Stage`
+    stages: List[Dict[str, Any]] = field(default_factory=list)
+    config_path: Optional[Path] = None
+    # Run the next test cycle under a profiler
+    profile: bool = False
+    # Node ID of the failing test every run is narrowed to
+    focus: Optional[str] = None
+    # Runner args selecting the tests matching the name filter, and the filter
+    test_filter: List[str] = field(default_factory=list)
+    test_filter_query: str = ""
+
+    _file_data: Mapping = field(default_factory=dict, repr=False)
+    _cli_fields: Set[str] = field(default_factory=set, repr=False)
+    _extra_args: List[str] = field(default_factory=list, repr=False)
 
     @classmethod
     def create(
@@ -46,13 +148,54 @@ class Config:
         if config_path:
             parsed = parse_config(config_path)
             instance._update_from_mapping(parsed)
+            instance._file_data = parsed
+            instance.config_path = config_path
 
         instance._update_from_namespace(namespace, extra_args or [])
         return instance
 
+    def reload(self) -> Set[str]:
+        """
+        Re-read the configuration file and apply the options that changed in it.
+        Options specified via CLI take precedence and are left untouched.
+        Returns the names of the changed fields.
+        """
+        config_path = find_config(self.path, use_cache=False)
+        data = parse_config(config_path) if config_path else {}
+
+        changed = set()
+
+        for key in RELOADABLE_FIELDS - self._cli_fields:
+            if data.get(key) == self._file_data.get(key):
+                continue
+
+            if key in data:
+                val = data[key]
+            else:
+                val = self._get_default(key)
+
+            if key == "runner_args":
+                self.runner_args[:] = [*val, *self._extra_args]
+            else:
+                setattr(self, key, _copy_value(val))
+
+            changed.add(key)
+
+        self._file_data = data
+        self.config_path = config_path
+
+        return changed
+
+    def _get_default(self, key: str):
+        f = next(f for f in dataclasses.fields(self) if f.name == key)
+
+        if f.default_factory is not dataclasses.MISSING:
+            return f.default_factory()
+        return f.default
+
     def _update_from_mapping(self, data: Mapping):
         for key, val in data.items():
-            setattr(self, key, val)
+            setattr(self, key, _copy_value(val))
 
     def _update_from_namespace(
         self, namespace: Namespace, runner_args: Optional[List[str]]
@@ -60,27 +203,61 @@ class Config:
         self.path = namespace.path
 
         for f in CLI_FIELDS:
-            val = getattr(namespace, f)
+            val = getattr(namespace, f, None)
             if val is not None:
                 setattr(self, f, val)
+                self._cli_fields.add(f)
 
         if runner_args:
             self.runner_args += runner_args
+            self._extra_args = list(runner_args)
+
 
+def _copy_value(val):
+    # Parsed values are cached and shared, so mutable ones must not leak out
+    if isinstance(val, list):
+        return list(val)
+    return val
+
+
+def find_config(cwd: Path, use_cache: bool = True) -> Optional[Path]:
+    cached = _find_cache.get(cwd)
+    if use_cache and cached is not None and cached.exists():
+        return cached
 
-def find_config(cwd: Path) -> Optional[Path]:
     filename = "pyproject.toml"
+    found = None
 
     for path in (cwd, *cwd.parents):
         config_path = path.joinpath(filename)
 
         if config_path.exists():
-            return config_path
+            found = config_path
+            break
 
-    return None
+    _find_cache[cwd] = found
+    return found
 
 
 def parse_config(path: Path) -> Mapping:
+    """
+    Parse the pytest-watcher section of the config file.
+    Results are cached until the file is modified.
+    """
+    stat = path.stat()
+    key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    cached = _parse_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    data = _parse_config(path)
+    _parse_cache[path] = (key, data)
+
+    return data
+
+
+def _parse_config(path: Path) -> Mapping:
     with open(path, "rb") as f:
         try:
             data = tomllib.load(f)
@@ -97,4 +274,39 @@ def parse_config(path: Path) -> Mapping:
             raise SystemExit(
                 f"Error parsing pyproject.toml.\nUnrecognized option: {key}"
             )
+        _validate_option(key, data[key])
+
+    logging.debug(f"Loaded configuration from {path}")
     return data
+
+
+def _validate_option(key: str, val) -> None:
+    if key == "stages" and isinstance(val, list):
+        try:
+            parse_stages(val)
+        except SystemExit as exc:
+            raise SystemExit(f"Error parsing pyproject.toml.\n{exc}")
+        return
+
+    valid = isinstance(val, FIELD_TYPES[key])
+
+    if isinstance(val, bool) and bool not in FIELD_TYPES[key]:
+        valid = False
+
+    if isinstance(val, list):
+        valid = valid and all(isinstance(item, str) for item in val)
+
+    # The tests run for each test input pattern
+    if key == "test_inputs" and isinstance(val, dict):
+        valid = all(
+            isinstance(tests, list) and all(isinstance(test, str) for test in tests)
+            for tests in val.values()
+        )
+
+    if key in FIELD_CHOICES:
+        valid = valid and val in FIELD_CHOICES[key]
+
+    if not valid:
+        raise SystemExit(
+            f"Error parsing pyproject.toml.\nInvalid value for {key}: {val!r}"
+        )
@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import select
+import socket
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from . import runner
+from .cache import get_project_digest
+from .config import Config
+from .constants import LOOP_DELAY
+from .environment import RunnerEnvironment
+from .session import Session
+from .tiers import select_tests
+from .trigger import SOURCE_CLIENT, RunRequest, Trigger
+
+Message = dict[str, Any]
+
+# Longest a message waits for a client to read, the clients stalled longer are dropped
+SEND_TIMEOUT = 1.0
+
+
+def get_socket_path(path: Path) -> Path:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return Path(runtime_dir, f"pytest-watcher-{get_project_digest(path)}.sock")
+
+
+def connect(path: Path) -> socket.socket | None:
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+
+    socket_path = get_socket_path(path)
+    if not socket_path.exists():
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(socket_path))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def is_running(path: Path) -> bool:
+    sock = connect(path)
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+
+def send(sock: socket.socket, message: Message) -> None:
+    sock.sendall(json.dumps(message).encode() + b"\n")
+
+
+def send_within(sock: socket.socket, message: Message, timeout: float) -> bool:
+    """Send without blocking for longer than `timeout`, False if the client stalled"""
+    data = memoryview(json.dumps(message).encode() + b"\n")
+    deadline = time.monotonic() + timeout
+    while data:
+        try:
+            sent = sock.send(data, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([], [sock], [], remaining)[1]:
+                return False
+            continue
+        data = data[sent:]
+    return True
+
+
+def read_messages(sock: socket.socket) -> Iterator[Message]:
+    with sock.makefile("rb") as reader:
+        for line in reader:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logging.debug(f"Malformed daemon message: {line!r}")
+
+
+class Server:
+    """
+    Unix socket server sharing a single watcher between multiple clients.
+
+    Requests are newline-delimited JSON objects with a `cmd` key:
+    `attach` streams runner output and results, `status` returns the latest
+    result and `run` triggers a test run.
+    """
+
+    def __init__(self, path: Path, trigger: Trigger):
+        self.path = path
+        self.socket_path = get_socket_path(path)
+        self._trigger = trigger
+        self._clients: list[socket.socket] = []
+        self._lock = threading.Lock()
+        # Keeps the messages of concurrent broadcasts from interleaving
+        self._send_lock = threading.Lock()
+        self._latest: Message | None = None
+        self._sock: socket.socket | None = None
+
+    @property
+    def latest(self) -> Message | None:
+        return self._latest
+
+    def start(self) -> None:
+        if not hasattr(socket, "AF_UNIX"):
+            raise SystemExit("Daemon mode is not supported on this platform")
+
+        if is_running(self.path):
+            raise SystemExit(f"A daemon is already watching {self.path.absolute()}")
+
+        # A leftover socket file from a daemon that did not shut down cleanly
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(str(self.socket_path))
+        self._sock.listen()
+
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def stop(self) -> None:
+        if self._sock is None:
+            return
+
+        sock, self._sock = self._sock, None
+        try:
+            # Wakes up the thread blocked in accept()
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients.clear()
+
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+    def broadcast(self, message: Message) -> None:
+        with self._send_lock:
+            with self._lock:
+                clients = list(self._clients)
+
+            for client in clients:
+                try:
+                    delivered = send_within(client, message, SEND_TIMEOUT)
+                except OSError:
+                    delivered = False
+                if not delivered:
+                    self._drop(client)
+
+    def _drop(self, client: socket.socket) -> None:
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+        try:
+            # Wakes up its handler, which closes it
+            client.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def publish_result(self, result: Message) -> None:
+        self._latest = result
+        self.broadcast({"type": "result", **result})
+
+    def _accept_loop(self) -> None:
+        while self._sock is not None:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        try:
+            for message in read_messages(conn):
+                self._handle_message(conn, message)
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                if conn in self._clients:
+                    self._clients.remove(conn)
+            conn.close()
+
+    def _handle_message(self, conn: socket.socket, message: Message) -> None:
+        cmd = message.get("cmd")
+
+        if cmd == "attach":
+            with self._lock:
+                if self._latest is not None:
+                    message = {"type": "result", **self._latest}
+                    if not send_within(conn, message, SEND_TIMEOUT):
+                        raise OSError("Client stalled")
+                self._clients.append(conn)
+        elif cmd == "status":
+            send(conn, {"type": "status", "result": self._latest})
+        elif cmd == "run":
+            self._trigger.emit_now(source=SOURCE_CLIENT)
+        else:
+            send(conn, {"type": "error", "message": f"Unknown command: {cmd}"})
+
+
+def run_tests(
+    config: Config,
+    server: Server,
+    session: Optional[Session] = None,
+    request: Optional[RunRequest] = None,
+) -> int:
+    def on_output(line: str) -> None:
+        sys.stdout.write(line)
+        server.broadcast({"type": "output", "data": line})
+
+    if session is not None and config.stages:
+        started = time.time()
+        changes = request.changes if request is not None else set()
+        failed = session.run_stages(config, changes, on_output)
+        if failed is not None:
+            assert failed.result is not None
+            server.publish_result(
+                {
+                    "command": failed.command,
+                    "returncode": failed.result.returncode,
+                    "started": started,
+                    "duration": failed.result.duration,
+                    "usage": asdict(failed.result.usage),
+                    "warnings": [],
+                    "stage": failed.stage.name,
+                }
+            )
+            return failed.result.returncode
+
+    args = request.args if request is not None else None
+    if session is not None:
+        prepared = session.prepare_runner(config)
+    else:
+        prepared = RunnerEnvironment().prepare(config)
+    command = [*prepared.argv, *(config.runner_args if args is None else args)]
+    if request is not None and session is not None:
+        command += select_tests(config, request, session.classifier)
+        command = session.plugins.modify_command(command, request)
+    server.broadcast(
+        {
+            "type": "start",
+            "command": command,
+            "source": request.source if request is not None else SOURCE_CLIENT,
+        }
+    )
+
+    started = time.time()
+    run = session.run if session is not None else runner.run
+    result = run(
+        command,
+        on_output=on_output,
+        sample_interval=config.rss_sample_interval,
+        base_env=prepared.env,
+    )
+
+    warnings = []
+    if session is not None:
+        warnings = session.record(result)
+        session.plugins.run_finished(result, request)
+    sys.stdout.write(f"[ptw] {result.usage.summary()}\n")
+    for warning in warnings:
+        sys.stdout.write(f"[ptw] {warning}\n")
+
+    server.publish_result(
+        {
+            "command": command,
+            "returncode": result.returncode,
+            "started": started,
+            "duration": result.duration,
+            "usage": asdict(result.usage),
+            "warnings": warnings,
+        }
+    )
+    return result.returncode
+
+
+def main_loop(
+    trigger: Trigger,
+    config: Config,
+    server: Server,
+    session: Optional[Session] = None,
+) -> None:
+    if session is None:
+        session = Session()
+
+    if trigger.check():
+        slot = session.scheduler.try_acquire(config, trigger.last_event)
+
+        if slot is not None:
+            request = trigger.take_request(config.runner_args)
+            assert request is not None
+
+            session.changes = request.changes
+            try:
+                run_tests(config, server, session, request)
+            finally:
+                slot.release()
+            trigger.release()
+
+    time.sleep(LOOP_DELAY)
+
+
+def attach(path: Path) -> int:
+    sock = connect(path)
+    if sock is None:
+        raise SystemExit(f"No daemon is watching {path.absolute()}")
+
+    sys.stdout.write(f"Attached to pytest-watcher daemon at {path.absolute()}\n")
+
+    try:
+        send(sock, {"cmd": "attach"})
+        for message in read_messages(sock):
+            # Unknown and malformed messages are ignored
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "output":
+                sys.stdout.write(message.get("data", ""))
+            elif kind == "result":
+                sys.stdout.write(
+                    f"[ptw] Runner exited with {message.get('returncode')}\n"
+                )
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+
+    return 0
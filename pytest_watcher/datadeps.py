@@ -0,0 +1,101 @@
+"""
+Test inputs learned from the test runs: the plugin records the files each
+test file opens for reading, through an audit hook, during the runs of the
+whole suite. A change to one of them reruns only the tests that read it.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set
+
+from .plugin import read_report
+from .runner import split_args
+
+# Runner options running only part of the collected tests
+NARROWING_OPTIONS = (
+    "-k",
+    "-m",
+    "--lf",
+    "--last-failed",
+    "--sw",
+    "--stepwise",
+    "--deselect",
+)
+
+
+class DataDependencies:
+    """Test files by the input files they read, relative to the root"""
+
+    def __init__(self, root: Path, data: Optional[Mapping[str, Any]] = None):
+        self.root = os.path.abspath(root)
+        self._readers: Dict[str, Set[str]] = {}
+        # Changed since it was loaded
+        self.dirty = False
+
+        if data:
+            # Test files are stored once, and referred to by their position
+            tests = data.get("tests", [])
+            for path, positions in data.get("inputs", {}).items():
+                self._readers[path] = {tests[i] for i in positions if i < len(tests)}
+
+    def __len__(self) -> int:
+        return len(self._readers)
+
+    def targets(self, path: str) -> List[str]:
+        """Absolute paths of the test files reading `path`"""
+        relative = self._relative(path)
+        if relative is None:
+            return []
+        return sorted(
+            os.path.join(self.root, test) for test in self._readers.get(relative, ())
+        )
+
+    def replace(self, inputs: Mapping[str, Iterable[str]]) -> None:
+        """Replace the mapping with the one recorded by a run of the whole suite"""
+        readers: Dict[str, Set[str]] = {}
+
+        for test_file, paths in inputs.items():
+            test = self._relative(test_file)
+            if test is None:
+                continue
+            for path in paths:
+                relative = self._relative(path)
+                if relative is not None:
+                    readers.setdefault(relative, set()).add(test)
+
+        self._readers = readers
+        self.dirty = True
+
+    def dump(self) -> Dict[str, Any]:
+        tests = sorted({test for readers in self._readers.values() for test in readers})
+        positions = {test: i for i, test in enumerate(tests)}
+        return {
+            "tests": tests,
+            "inputs": {
+                path: sorted(positions[test] for test in readers)
+                for path, readers in sorted(self._readers.items())
+            },
+        }
+
+    def _relative(self, path: str) -> Optional[str]:
+        relative = os.path.relpath(os.path.abspath(path), self.root)
+        if relative.startswith(os.pardir + os.sep) or relative == os.pardir:
+            return None
+        return relative
+
+
+def read_test_inputs(path: Path) -> Optional[Dict[str, List[str]]]:
+    """The inputs of every test file written by the plugin, none if missing"""
+    inputs = read_report(path)
+    return inputs if isinstance(inputs, dict) else None
+
+
+def runs_whole_suite(args: Sequence[str]) -> bool:
+    """Whether runner args run every collected test, as far as they tell"""
+    options, positional = split_args(args)
+    if any(arg.split("=", 1)[0] in NARROWING_OPTIONS for arg in options):
+        return False
+    # Directories are taken as the whole suite
+    return not any("::" in arg or os.path.isfile(arg) for arg in positional)
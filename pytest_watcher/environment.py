@@ -0,0 +1,260 @@
+"""
+Resolution of the runner executable and its environment, done once and
+reused for every run until one of the files it depends on changes.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import logging
+import os
+import shutil
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .config import Config
+from .runner import PLUGIN, is_pytest_runner
+
+SHELLS = {"sh", "bash", "dash", "zsh"}
+# Version managers resolving their shims with `<tool> which <command>`, by the
+# variable and the default of their root directory
+SHIM_TOOLS = {
+    "pyenv": ("PYENV_ROOT", ".pyenv"),
+    "asdf": ("ASDF_DATA_DIR", ".asdf"),
+}
+# Seconds allowed to the commands checking an interpreter or a shim
+PROBE_TIMEOUT = 10
+
+
+@dataclass
+class PreparedRunner:
+    argv: List[str]
+    env: Dict[str, str]
+
+
+def parse_env_file(path: Path) -> Dict[str, str]:
+    """Read KEY=VALUE lines, in the subset of the dotenv format used by most tools"""
+    env = {}
+
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("export "):
+            line = line[len("export ") :].lstrip()
+
+        key, sep, value = line.partition("=")
+        if not sep:
+            continue
+
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+            value = value[1:-1]
+        elif " #" in value:
+            value = value.split(" #", 1)[0].rstrip()
+
+        env[key.strip()] = value
+
+    return env
+
+
+def is_shim(path: str) -> bool:
+    """Whether the executable is a shell wrapper rather than the runner itself"""
+    if f"{os.sep}shims{os.sep}" in path:
+        return True
+
+    try:
+        with open(path, "rb") as f:
+            first_line = f.readline(256)
+    except OSError:
+        return False
+
+    if not first_line.startswith(b"#!"):
+        return False
+
+    interpreter = first_line[2:].decode(errors="replace").split()
+    if not interpreter:
+        return False
+    if os.path.basename(interpreter[0]) == "env" and len(interpreter) > 1:
+        return interpreter[1] in SHELLS
+    return os.path.basename(interpreter[0]) in SHELLS
+
+
+def resolve_shim(executable: str, env: Dict[str, str], cwd: Path) -> Optional[str]:
+    """
+    The executable a pyenv or asdf shim runs in `cwd`, where the version
+    files select the interpreter. None for other shims, or when it fails.
+    """
+    shims = os.path.dirname(executable)
+    root = os.path.dirname(shims)
+    if os.path.basename(shims) != "shims":
+        return None
+
+    for tool, (root_env, default) in SHIM_TOOLS.items():
+        roots = {env.get(root_env), os.path.join(os.path.expanduser("~"), default)}
+        if root in roots or os.path.basename(root) == default:
+            break
+    else:
+        return None
+
+    # Installed along the shims, or found on PATH
+    command = os.path.join(root, "bin", tool)
+    if not os.access(command, os.X_OK):
+        command = tool
+
+    try:
+        proc = subprocess.run(
+            [command, "which", os.path.basename(executable)],
+            cwd=cwd,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=PROBE_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired) as exc:
+        logging.debug(f"Unable to resolve the shim {executable}: {exc}")
+        return None
+
+    target = proc.stdout.strip()
+    if proc.returncode != 0 or not os.path.isfile(target) or is_shim(target):
+        return None
+    return target
+
+
+def _has_pytest(python: str, env: Dict[str, str]) -> bool:
+    if os.path.abspath(python) == os.path.abspath(sys.executable):
+        return importlib.util.find_spec("pytest") is not None
+    if not os.access(python, os.X_OK):
+        return False
+
+    try:
+        proc = subprocess.run(
+            [python, "-c", "import pytest"],
+            env=env,
+            capture_output=True,
+            timeout=PROBE_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return proc.returncode == 0
+
+
+def _loads_plugin(prepared: PreparedRunner) -> bool:
+    # pytest imports the -p plugins before printing the help, and fails
+    # when the interpreter of the runner does not have pytest-watcher
+    try:
+        proc = subprocess.run(
+            [*prepared.argv, "-p", PLUGIN, "--help"],
+            env=prepared.env,
+            capture_output=True,
+            timeout=PROBE_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return proc.returncode == 0
+
+
+class RunnerEnvironment:
+    """
+    The argv prefix and the environment of the runner. They are prepared
+    once and reused until the runner options or the env file change.
+    """
+
+    def __init__(self) -> None:
+        self._key: Optional[Tuple] = None
+        self._prepared: Optional[PreparedRunner] = None
+        self._loads_plugin: Optional[Tuple[PreparedRunner, bool]] = None
+
+    def prepare(self, config: Config) -> PreparedRunner:
+        key = self._get_key(config)
+        if self._prepared is None or key != self._key:
+            self._prepared = self._prepare(config)
+            self._key = key
+        return self._prepared
+
+    def loads_plugin(self, config: Config) -> bool:
+        """Whether the runner can load the pytest-watcher plugin, checked once"""
+        prepared = self.prepare(config)
+        if self._loads_plugin is None or self._loads_plugin[0] is not prepared:
+            self._loads_plugin = (prepared, _loads_plugin(prepared))
+            if not self._loads_plugin[1]:
+                logging.warning(
+                    "The runner can't import pytest_watcher.plugin, "
+                    "test counts and failed tests are not reported"
+                )
+        return self._loads_plugin[1]
+
+    def _get_key(self, config: Config) -> Tuple:
+        return (
+            config.runner,
+            config.venv,
+            config.env_file,
+            _stat(self._env_file(config)),
+            _stat(self._venv(config)),
+        )
+
+    def _env_file(self, config: Config) -> Optional[Path]:
+        return config.path.joinpath(config.env_file) if config.env_file else None
+
+    def _venv(self, config: Config) -> Optional[Path]:
+        return config.path.joinpath(config.venv).absolute() if config.venv else None
+
+    def _prepare(self, config: Config) -> PreparedRunner:
+        env = dict(os.environ)
+
+        env_file = self._env_file(config)
+        if env_file is not None:
+            try:
+                env.update(parse_env_file(env_file))
+            except OSError as exc:
+                logging.warning(f"Unable to read env file {env_file}: {exc}")
+
+        venv = self._venv(config)
+        if venv is not None:
+            env["VIRTUAL_ENV"] = str(venv)
+            env["PATH"] = os.pathsep.join(
+                [str(venv.joinpath("bin")), env.get("PATH", "")]
+            )
+            env.pop("PYTHONHOME", None)
+
+        executable = shutil.which(config.runner, path=env.get("PATH"))
+        if executable is None:
+            return PreparedRunner([config.runner], env)
+
+        argv = [executable]
+
+        if is_pytest_runner(config.runner) and is_shim(executable):
+            argv = self._bypass_shim(executable, env, config.path) or argv
+
+        return PreparedRunner(argv, env)
+
+    def _bypass_shim(
+        self, executable: str, env: Dict[str, str], cwd: Path
+    ) -> Optional[List[str]]:
+        """The command running pytest without the shim, none if it is unknown"""
+        virtual_env = env.get("VIRTUAL_ENV")
+        if virtual_env:
+            python = os.path.join(virtual_env, "bin", "python")
+            if _has_pytest(python, env):
+                logging.debug(f"{executable} is a shim, running {python} -m pytest")
+                return [python, "-m", "pytest"]
+
+        # The interpreter of the watcher may not be the one the shim selects
+        target = resolve_shim(executable, env, cwd)
+        if target is not None:
+            logging.debug(f"{executable} is a shim, running {target}")
+            return [target]
+        return None
+
+
+def _stat(path: Optional[Path]) -> Optional[Tuple[int, int]]:
+    if path is None:
+        return None
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
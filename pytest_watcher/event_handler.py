@@ -1,11 +1,18 @@
 from __future__ import annotations
 
 import logging
-from typing import List, Optional
+import os
+import time
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
 
 from watchdog import events
 from watchdog.utils.patterns import match_any_paths
 
+from .config import Config
+from .git import FileIndex
+from .hooks import PluginManager
+from .rescan import rescan
+from .tiers import Change, Classifier
 from .trigger import Trigger
 
 trigger = Trigger()
@@ -24,10 +31,20 @@ class EventHandler:
         trigger: Trigger,
         patterns: Optional[List[str]] = None,
         ignore_patterns: Optional[List[str]] = None,
+        index: Optional[FileIndex] = None,
+        default_patterns: Optional[List[str]] = None,
+        classifier: Optional[Classifier] = None,
+        plugins: Optional[PluginManager] = None,
     ):
-        self._patterns = patterns or ["*.py"]
+        self._default_patterns = default_patterns or ["*.py"]
+        self._patterns = patterns or self._default_patterns
         self._ignore_patterns = ignore_patterns or []
         self._trigger = trigger
+        self._index = index
+        self._classifier = classifier
+        self._plugins = plugins
+        # Events are logged at debug level while a bulk change is in progress
+        self.quiet_until = 0.0
 
     @property
     def patterns(self) -> List[str]:
@@ -37,14 +54,36 @@ class EventHandler:
     def ignore_patterns(self) -> List[str]:
         return self._ignore_patterns
 
-    def _is_event_watched(self, event: events.FileSystemEvent) -> bool:
-        if event.event_type not in self.EVENTS_WATCHED:
-            return False
+    def update_patterns(
+        self, patterns: Optional[List[str]], ignore_patterns: Optional[List[str]]
+    ) -> None:
+        self._patterns = list(patterns or self._default_patterns)
+        self._ignore_patterns = list(ignore_patterns or [])
 
-        paths = [event.src_path]
-        if hasattr(event, "dest_path"):
+    def _get_paths(self, event: events.FileSystemEvent) -> List[str]:
+        paths = [os.fsdecode(event.src_path)]
+        if getattr(event, "dest_path", None):
             # For file moved type events we are also interested in the destination
-            paths.append(event.dest_path)
+            paths.append(os.fsdecode(event.dest_path))
+        return paths
+
+    def classify(self, path: str) -> Optional[Change]:
+        if self._classifier is None:
+            return None
+        return self._classifier.classify(path)
+
+    def _is_path_watched(self, paths: List[str]) -> bool:
+        if self._plugins:
+            decisions = [self._plugins.filter_change(p) for p in paths]
+            if True in decisions:
+                return True
+            if all(d is False for d in decisions):
+                return False
+
+        if self._classifier is not None and any(
+            self._classifier.is_test_input(p) for p in paths
+        ):
+            return True
 
         return match_any_paths(
             paths,
@@ -52,9 +91,144 @@ class EventHandler:
             excluded_patterns=self.ignore_patterns,
         )
 
+    def _is_event_watched(self, event: events.FileSystemEvent) -> bool:
+        if event.event_type not in self.EVENTS_WATCHED:
+            return False
+
+        return self._is_path_watched(self._get_paths(event))
+
+    def _is_content_changed(self, event: events.FileSystemEvent) -> bool:
+        if self._index is None or event.is_directory:
+            return True
+
+        changed = [self._index.update(path) for path in self._get_paths(event)]
+        return event.event_type != events.EVENT_TYPE_MODIFIED or any(changed)
+
     def dispatch(self, event: events.FileSystemEvent) -> None:
-        if self._is_event_watched(event):
-            self._trigger.emit()
-            logging.info(f"{event.src_path} {event.event_type}")
+        if not self._is_event_watched(event):
+            logging.debug(f"IGNORED event: {event.event_type} src: {event.src_path!r}")
+            return
+
+        if not self._is_content_changed(event):
+            logging.debug(f"UNCHANGED content: {event.src_path!r}")
+            return
+
+        for path in self._get_paths(event):
+            self._trigger.emit(path)
+
+        message = f"{os.fsdecode(event.src_path)} {event.event_type}"
+        change = self.classify(os.fsdecode(event.src_path))
+        if change is not None:
+            message += f" ({change.tier.value})"
+        self._log(message)
+
+    def handle_changes(
+        self,
+        paths: Iterable[str],
+        trigger_run: bool = True,
+        content_only: bool = False,
+    ) -> int:
+        """
+        Register changes detected by other means than file system events.
+        With `content_only`, the paths whose content is the one in the file
+        index are left out. Returns the number of watched paths registered.
+        """
+        watched = [path for path in paths if self._is_path_watched([path])]
+
+        if self._index is not None:
+            # Every path is recorded, even once one is found unchanged
+            updated = [self._index.update(path) for path in watched]
+            if content_only:
+                watched = [path for path, changed in zip(watched, updated) if changed]
+
+        if watched and trigger_run:
+            self._trigger.emit_many(watched)
+        else:
+            self._trigger.add_changes(watched)
+
+        return len(watched)
+
+    def handle_overflow(self, roots: Sequence[Tuple[str, bool]], since: float) -> None:
+        """
+        Rebuild the changes lost in an event queue overflow by rescanning
+        the (path, recursive) roots. Triggers a single run for all of them.
+        """
+        changed = rescan(
+            roots, self._index, lambda path: self._is_path_watched([path]), since
+        )
+        logging.warning(f"Rescan found {len(changed)} changed files")
+
+        if changed:
+            self._trigger.emit_many(changed)
+
+    def _log(self, msg: str) -> None:
+        if time.time() < self.quiet_until:
+            logging.debug(msg)
         else:
-            logging.debug(f"IGNORED event: {event.event_type} src: {event.src_path}")
+            logging.info(msg)
+
+
+class ConfigEventHandler:
+    """
+    Watches the resolved configuration file and hot-reloads the watcher
+    settings when it changes.
+    """
+
+    CONFIG_FILENAME = "pyproject.toml"
+
+    def __init__(self, config: Config, trigger: Trigger, event_handler: EventHandler):
+        self._config = config
+        self._trigger = trigger
+        self._event_handler = event_handler
+        self._observer: Any = None
+        self._watch: Any = None
+
+    @property
+    def config_file(self) -> str:
+        if self._config.config_path:
+            return os.path.abspath(self._config.config_path)
+        return os.path.abspath(self._config.path.joinpath(self.CONFIG_FILENAME))
+
+    def schedule(self, observer: Any) -> None:
+        self._observer = observer
+        self._watch = observer.schedule(
+            self, os.path.dirname(self.config_file), recursive=False
+        )
+
+    def dispatch(self, event: events.FileSystemEvent) -> None:
+        if event.event_type not in EventHandler.EVENTS_WATCHED:
+            return
+
+        paths = [event.src_path]
+        if getattr(event, "dest_path", None):
+            paths.append(event.dest_path)
+
+        if self.config_file not in (os.path.abspath(p) for p in paths):
+            return
+
+        self.reload()
+
+    def reload(self) -> None:
+        previous_file = self.config_file
+
+        try:
+            changed = self._config.reload()
+        except SystemExit as exc:
+            logging.error(f"Configuration was not reloaded. {exc}")
+            return
+
+        if changed & {"patterns", "ignore_patterns"}:
+            self._event_handler.update_patterns(
+                self._config.patterns, self._config.ignore_patterns
+            )
+
+        if "delay" in changed:
+            self._trigger.delay = self._config.delay
+
+        if self.config_file != previous_file and self._observer is not None:
+            # Only the config watch moves, the project watch stays intact
+            self._observer.unschedule(self._watch)
+            self.schedule(self._observer)
+
+        if changed:
+            logging.info(f"Configuration reloaded: {', '.join(sorted(changed))}")
@@ -0,0 +1,96 @@
+"""
+Flaky test detection: the outcome of every test is kept between runs, and a
+test whose outcome flips while nothing it depends on changed is flaky.
+
+A run failing only on flaky tests has them retried in parallel. When they
+pass, the run is reported as flaky instead of failed.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from .plugin import read_report
+from .runner import RunResult
+from .tiers import Classifier
+
+# Flips without a relevant change after which a test is flaky
+FLAKY_FLIPS = 2
+
+# Retried tests running at once, one runner process each
+MAX_RETRY_WORKERS = 4
+
+
+class FlakyTracker:
+    """Outcome history of the tests, by node ID"""
+
+    def __init__(self, history: Optional[Dict[str, List]] = None):
+        # node ID -> [last outcome, flips without a relevant change]
+        self.history: Dict[str, List] = history or {}
+
+    def is_flaky(self, node_id: str) -> bool:
+        entry = self.history.get(node_id)
+        return entry is not None and entry[1] >= FLAKY_FLIPS
+
+    def update(self, outcomes: Dict[str, str], relevant: Callable[[str], bool]) -> None:
+        """Add the outcomes of a run, `relevant` tells the tests its changes affect"""
+        for node_id, outcome in outcomes.items():
+            entry = self.history.get(node_id)
+            if entry is None:
+                self.history[node_id] = [outcome, 0]
+                continue
+
+            if entry[0] != outcome and not relevant(node_id):
+                entry[1] += 1
+            entry[0] = outcome
+
+    def dump(self) -> Dict[str, List]:
+        return self.history
+
+
+def read_outcomes(path: Path) -> Dict[str, str]:
+    """Outcome of every test from the results written by the plugin"""
+    results = read_report(path)
+    if not isinstance(results, dict):
+        return {}
+
+    outcomes = {node_id: "passed" for node_id in results.get("passed", [])}
+    outcomes.update((node_id, "failed") for node_id in results.get("failed", []))
+    return outcomes
+
+
+def relevance(
+    changes: Set[str], classifier: Optional[Classifier], root: Path
+) -> Callable[[str], bool]:
+    """Whether a test, by node ID, may be affected by the changes"""
+    if not changes:
+        return lambda _: False
+    if classifier is None:
+        return lambda _: True
+
+    targets = classifier.select(changes)
+    if targets is None:
+        return lambda _: True
+    targets = [os.path.abspath(t) for t in targets]
+
+    def relevant(node_id: str) -> bool:
+        path = os.path.abspath(root.joinpath(node_id.split("::")[0]))
+        return any(path == t or path.startswith(t + os.sep) for t in targets)
+
+    return relevant
+
+
+def retry(
+    node_ids: Iterable[str],
+    run: Callable[[str], RunResult],
+    workers: int = MAX_RETRY_WORKERS,
+) -> Dict[str, RunResult]:
+    """Run every test on its own, `workers` of them at once"""
+    node_ids = list(node_ids)
+    workers = max(1, min(workers, len(node_ids)))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(node_ids, executor.map(run, node_ids)))
@@ -0,0 +1,30 @@
+"""
+Focus on a failing test: while focused, every run executes only that test,
+until it passes.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import List, Sequence
+
+from .runner import split_args
+from .scope import PytestCache
+
+LAST_FAILED_KEY = "cache/lastfailed"
+
+
+def read_last_failed(root: Path) -> List[str]:
+    """Node IDs of the tests that failed in the latest runs"""
+    cache = PytestCache(root)
+    data = cache.read(LAST_FAILED_KEY)
+
+    if not isinstance(data, dict):
+        return []
+    return [cache.node_id(node_id) for node_id, failed in data.items() if failed]
+
+
+def focused_args(args: Sequence[str], *node_ids: str) -> List[str]:
+    """The runner args without the tests they select, followed by `node_ids`"""
+    options, _ = split_args(args)
+    return [*options, *node_ids]
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from watchdog import events
+
+from .trigger import Trigger
+
+# Per-file events that follow a HEAD move are part of the same bulk change
+BULK_CHANGE_WINDOW = 2.0
+
+
+def blob_hash(path: Path) -> str:
+    """Hash of the file content as computed by `git hash-object`"""
+    data = path.read_bytes()
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class GitRepo:
+    def __init__(self, root: Path, git_dir: Path):
+        self.root = root
+        self.git_dir = git_dir
+
+    @classmethod
+    def discover(cls, path: Path) -> Optional[GitRepo]:
+        try:
+            output = subprocess.run(
+                ["git", "rev-parse", "--show-toplevel", "--absolute-git-dir"],
+                cwd=path,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+        root, git_dir = output.splitlines()
+        return cls(Path(root), Path(git_dir))
+
+    def _git(self, *args: str) -> str:
+        return subprocess.run(
+            ["git", *args],
+            cwd=self.root,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+
+    def _paths(self, output: str) -> Set[Path]:
+        return {self.root.joinpath(name) for name in output.split("\0") if name}
+
+    def head(self) -> Optional[str]:
+        try:
+            return self._git("rev-parse", "--verify", "-q", "HEAD").strip()
+        except subprocess.CalledProcessError:
+            return None
+
+    def changed_files(self, base: str = "HEAD") -> Set[Path]:
+        """Files that differ from `base` in the working tree, including untracked"""
+        changed = self._paths(self._git("diff", "--name-only", "-z", base))
+        return changed | self.untracked_files()
+
+    def untracked_files(self) -> Set[Path]:
+        return self._paths(self._git("ls-files", "-z", "--others", "--exclude-standard"))
+
+    def diff(self, old: str, new: str) -> Set[Path]:
+        return self._paths(self._git("diff", "--name-only", "-z", old, new))
+
+    def index_hashes(self) -> Dict[Path, str]:
+        """Blob hashes of the tracked files as recorded in the git index"""
+        hashes = {}
+
+        for entry in self._git("ls-files", "-z", "--stage").split("\0"):
+            if not entry:
+                continue
+            meta, _, name = entry.partition("\t")
+            hashes[self.root.joinpath(name)] = meta.split()[1]
+
+        return hashes
+
+    def unstaged_files(self) -> Set[Path]:
+        return self._paths(self._git("diff", "--name-only", "-z"))
+
+
+class FileIndex:
+    """
+    Content hashes of the watched files, used to tell real changes from
+    events that leave the content intact (touch, save without edits).
+    """
+
+    def __init__(self) -> None:
+        self._hashes: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def get(self, path: str) -> Optional[str]:
+        return self._hashes.get(os.path.abspath(path))
+
+    def dump(self) -> Dict[str, str]:
+        return dict(self._hashes)
+
+    def restore(self, hashes: Dict[str, str]) -> None:
+        """
+        Take the hashes recorded by a previous session. A file changed while
+        the watcher was not running has a stale hash and is reported as
+        changed on its next event, which is the desired outcome.
+        """
+        self._hashes.update(hashes)
+
+    def seed_from_git(self, repo: GitRepo) -> None:
+        """
+        Take the hashes of the clean tracked files from the git index,
+        so that only the modified and untracked files need to be read.
+        """
+        hashes = repo.index_hashes()
+
+        for path in repo.unstaged_files() | repo.untracked_files():
+            hashes.pop(path, None)
+            self.update(str(path))
+
+        for path, digest in hashes.items():
+            self._hashes[str(path)] = digest
+
+    def update(self, path: str) -> bool:
+        """Record the current content of the file. Returns whether it changed"""
+        path = os.path.abspath(path)
+
+        try:
+            digest = blob_hash(Path(path))
+        except OSError:
+            return self._hashes.pop(path, None) is not None
+
+        if self._hashes.get(path) == digest:
+            return False
+
+        self._hashes[path] = digest
+        return True
+
+
+class GitEventHandler:
+    """
+    Watches the git directory and turns HEAD moves (checkout, pull, reset)
+    into a single bulk change computed from the diff between the revisions.
+    """
+
+    def __init__(self, repo: GitRepo, trigger: Trigger, event_handler: Any):
+        self._repo = repo
+        self._trigger = trigger
+        self._event_handler = event_handler
+        self._head = repo.head()
+
+    def schedule(self, observer: Any) -> None:
+        observer.schedule(self, str(self._repo.git_dir), recursive=False)
+
+    def dispatch(self, event: events.FileSystemEvent) -> None:
+        if event.is_directory or event.event_type == events.EVENT_TYPE_OPENED:
+            return
+
+        head = self._repo.head()
+        if head == self._head:
+            return
+
+        old, self._head = self._head, head
+        if old is None or head is None:
+            return
+
+        try:
+            changed = self._repo.diff(old, head)
+        except subprocess.CalledProcessError:
+            return
+
+        logging.info(f"HEAD moved {old[:8]} -> {head[:8]}: {len(changed)} files changed")
+
+        self._event_handler.quiet_until = time.time() + BULK_CHANGE_WINDOW
+        # A commit moves HEAD without touching the working tree
+        self._event_handler.handle_changes(
+            [str(p) for p in sorted(changed)], content_only=True
+        )
+
+
+def seed_changes(repo: GitRepo, base: str) -> List[str]:
+    try:
+        changed = repo.changed_files(base)
+    except subprocess.CalledProcessError as exc:
+        logging.error(f"Unable to compute changes since {base}: {exc.stderr.strip()}")
+        return []
+
+    return [str(p) for p in sorted(changed)]
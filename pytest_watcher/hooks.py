@@ -0,0 +1,154 @@
+"""
+Plugins extending the event-to-run pipeline, discovered through the
+`pytest_watcher` entry point group.
+
+An entry point refers to a module, a class (instantiated without
+arguments) or any object, implementing some of these hooks:
+
+- `filter_change(path) -> Optional[bool]`: whether a changed file is
+  watched, None to leave it to the patterns
+- `select_tests(path) -> Optional[List[str]]`: tests affected by a changed
+  file with `--affected`, None to leave it to the built-in tiers
+- `modify_command(command, request) -> Optional[List[str]]`: the runner
+  command to execute, None to keep it
+- `run_finished(result, request) -> None`: called after every run
+"""
+
+from __future__ import annotations
+
+import inspect
+import logging
+import time
+from dataclasses import dataclass
+from importlib import metadata
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .runner import RunResult
+from .trigger import RunRequest
+
+ENTRY_POINT_GROUP = "pytest_watcher"
+
+HOOKS = ("filter_change", "select_tests", "modify_command", "run_finished")
+
+# A hook call slower than this is reported after the run
+SLOW_HOOK_TIME = 0.05
+
+_discovered: Optional[List[Tuple[str, Any]]] = None
+
+
+@dataclass
+class HookTiming:
+    calls: int = 0
+    total: float = 0.0
+    slowest: float = 0.0
+
+
+def discover() -> List[Tuple[str, Any]]:
+    """Load the installed plugins, once per process"""
+    global _discovered
+
+    if _discovered is None:
+        _discovered = []
+        for entry_point in _entry_points():
+            try:
+                plugin = entry_point.load()
+            except Exception:
+                logging.exception(f"Unable to load plugin {entry_point.name}")
+                continue
+
+            if inspect.isclass(plugin):
+                plugin = plugin()
+            _discovered.append((entry_point.name, plugin))
+
+    return list(_discovered)
+
+
+def _entry_points() -> list:
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        return list(entry_points.select(group=ENTRY_POINT_GROUP))
+    # Python < 3.10
+    return list(entry_points.get(ENTRY_POINT_GROUP, []))  # type: ignore[attr-defined]
+
+
+class PluginManager:
+    """Calls the plugin hooks and keeps the time each plugin spends in them"""
+
+    def __init__(self, plugins: Sequence[Tuple[str, Any]] = ()):
+        self.names = [name for name, _ in plugins]
+        # The hooks are looked up once, not on every call
+        self._hooks: Dict[str, List[Tuple[str, Callable]]] = {
+            hook: [
+                (name, getattr(plugin, hook))
+                for name, plugin in plugins
+                if callable(getattr(plugin, hook, None))
+            ]
+            for hook in HOOKS
+        }
+        self.timings: Dict[Tuple[str, str], HookTiming] = {}
+        self._slow: Dict[Tuple[str, str], float] = {}
+
+    @classmethod
+    def discover(cls) -> PluginManager:
+        plugins = discover()
+        if plugins:
+            logging.info(f"Loaded plugins: {', '.join(name for name, _ in plugins)}")
+        return cls(plugins)
+
+    def __bool__(self) -> bool:
+        return bool(self.names)
+
+    def filter_change(self, path: str) -> Optional[bool]:
+        for result in self._call("filter_change", path):
+            if result is not None:
+                return bool(result)
+        return None
+
+    def select_tests(self, path: str) -> Optional[List[str]]:
+        for result in self._call("select_tests", path):
+            if result is not None:
+                return list(result)
+        return None
+
+    def modify_command(self, command: List[str], request: RunRequest) -> List[str]:
+        for name, hook in self._hooks["modify_command"]:
+            result = self._call_one(name, "modify_command", hook, list(command), request)
+            if result is not None:
+                command = list(result)
+        return command
+
+    def run_finished(self, result: RunResult, request: Optional[RunRequest]) -> None:
+        for _ in self._call("run_finished", result, request):
+            pass
+
+    def take_warnings(self) -> List[str]:
+        """Report the hooks that were slow since the previous call"""
+        warnings = [
+            f"Plugin {name} took {elapsed * 1000:.0f} ms in {hook}"
+            for (name, hook), elapsed in sorted(self._slow.items())
+        ]
+        self._slow.clear()
+        return warnings
+
+    def _call(self, hook_name: str, *args: Any):
+        for name, hook in self._hooks[hook_name]:
+            yield self._call_one(name, hook_name, hook, *args)
+
+    def _call_one(self, name: str, hook_name: str, hook: Callable, *args: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return hook(*args)
+        except Exception:
+            logging.exception(f"Plugin {name} failed in {hook_name}")
+            return None
+        finally:
+            elapsed = time.perf_counter() - started
+
+            timing = self.timings.setdefault((name, hook_name), HookTiming())
+            timing.calls += 1
+            timing.total += elapsed
+            timing.slowest = max(timing.slowest, elapsed)
+
+            if elapsed > SLOW_HOOK_TIME:
+                key = (name, hook_name)
+                self._slow[key] = max(self._slow.get(key, 0.0), elapsed)
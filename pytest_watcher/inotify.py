@@ -0,0 +1,422 @@
+"""
+A Linux observer reading inotify directly, without the watchdog emitters.
+
+It runs a single thread, reads the kernel events in large batches and
+dispatches them to the handlers as compact events carrying only what the
+handlers use. The directories are walked and watched on start, and the
+new ones as they appear, skipping the ones that never contain sources
+(caches, virtualenvs, VCS metadata). Inotify reports nothing for a
+directory without a watch, so they can't be added on first use.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from watchdog import events
+
+from .rescan import PRUNED_DIRS, rescan
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+# Content changes are reported once the file is closed, not on every write
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_CREATE
+    | IN_DELETE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+EVENT_HEADER = struct.Struct("iIII")
+# Room for a few thousand events per read
+BUFFER_SIZE = 256 * 1024
+
+
+class InotifyError(OSError):
+    pass
+
+
+class Event:
+    """The part of a file system event the handlers look at"""
+
+    __slots__ = ("event_type", "src_path", "dest_path", "is_directory")
+
+    def __init__(
+        self, event_type: str, src_path: str, dest_path: str = "", is_directory=False
+    ):
+        self.event_type = event_type
+        self.src_path = src_path
+        self.dest_path = dest_path
+        self.is_directory = is_directory
+
+    def __repr__(self) -> str:
+        return f"<Event {self.event_type} {self.src_path!r}>"
+
+
+@dataclass(frozen=True)
+class Watch:
+    handler: Any
+    path: str
+    recursive: bool
+
+    def covers(self, directory: str) -> bool:
+        if directory == self.path:
+            return True
+        return self.recursive and directory.startswith(self.path + os.sep)
+
+
+_libc: Any = None
+
+
+def _get_libc() -> Any:
+    global _libc
+
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+
+    return _libc
+
+
+def is_available() -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+
+    try:
+        libc = _get_libc()
+    except (OSError, AttributeError):
+        return False
+    return hasattr(libc, "inotify_init1")
+
+
+def _check(result: int) -> int:
+    if result == -1:
+        code = ctypes.get_errno()
+        raise InotifyError(code, os.strerror(code))
+    return result
+
+
+def parse_events(data: bytes) -> Iterator[Tuple[int, int, int, str]]:
+    """Split a buffer read from inotify into (wd, mask, cookie, name)"""
+    offset = 0
+    while offset + EVENT_HEADER.size <= len(data):
+        wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+        offset += EVENT_HEADER.size
+        name = data[offset : offset + length].rstrip(b"\0")
+        offset += length
+        yield wd, mask, cookie, os.fsdecode(name)
+
+
+class InotifyObserver:
+    """
+    Drop-in replacement for the watchdog observer on Linux, implementing
+    the part of its interface the watcher uses.
+    """
+
+    def __init__(self) -> None:
+        self._fd = -1
+        self._watches: List[Watch] = []
+        self._dirs: Dict[int, str] = {}
+        self._wds: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_r, self._stop_w = os.pipe()
+        self._overflowed = False
+
+    def schedule(self, handler: Any, path: Any, recursive: bool = False) -> Watch:
+        watch = Watch(handler, os.path.abspath(os.fsdecode(path)), recursive)
+
+        with self._lock:
+            self._watches.append(watch)
+            if self._fd != -1:
+                self._add_tree(watch.path, recursive)
+
+        return watch
+
+    def unschedule(self, watch: Watch) -> None:
+        with self._lock:
+            self._watches.remove(watch)
+            for directory in list(self._wds):
+                if not any(w.covers(directory) for w in self._watches):
+                    self._remove_watch(directory)
+
+    def start(self) -> None:
+        self._fd = _check(_get_libc().inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+
+        with self._lock:
+            for watch in self._watches:
+                self._add_tree(watch.path, watch.recursive)
+
+        self._thread = threading.Thread(
+            target=self._run, name="ptw-inotify", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._stop_w != -1:
+            os.write(self._stop_w, b"\0")
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                return
+
+        if self._stop_w != -1:
+            os.close(self._stop_r)
+            os.close(self._stop_w)
+            self._stop_r = self._stop_w = -1
+
+    def _run(self) -> None:
+        # Events up to this time are known to be received
+        last_read = time.time()
+
+        try:
+            while True:
+                ready, _, _ = select.select([self._fd, self._stop_r], [], [])
+                if self._stop_r in ready:
+                    break
+
+                read_at = time.time()
+                try:
+                    data = os.read(self._fd, BUFFER_SIZE)
+                except BlockingIOError:
+                    continue
+                except OSError as exc:
+                    logging.error(f"Unable to read file system events: {exc}")
+                    break
+
+                self._overflowed = False
+                for event, handlers in self._translate(data):
+                    for handler in handlers:
+                        self._dispatch(handler, event)
+
+                if self._overflowed:
+                    self._recover(last_read)
+                last_read = read_at
+        finally:
+            with self._lock:
+                os.close(self._fd)
+                self._fd = -1
+
+    def _dispatch(self, handler: Any, event: Event) -> None:
+        try:
+            handler.dispatch(event)
+        except Exception:
+            logging.exception(f"Error while handling {event!r}")
+
+    def _translate(self, data: bytes) -> List[Tuple[Event, List[Any]]]:
+        result: List[Tuple[Event, List[Any]]] = []
+        # Moves are reported as a pair of events sharing a cookie
+        moved_from: Dict[int, Tuple[str, bool]] = {}
+
+        with self._lock:
+            for wd, mask, cookie, name in parse_events(data):
+                if mask & IN_Q_OVERFLOW:
+                    self._overflowed = True
+                    continue
+
+                directory = self._dirs.get(wd)
+                if directory is None:
+                    continue
+
+                if mask & IN_IGNORED:
+                    self._forget(wd)
+                    if any(w.path == directory for w in self._watches):
+                        logging.warning(f"Watched directory {directory} was removed")
+                    continue
+                if not name:
+                    # IN_DELETE_SELF and IN_MOVE_SELF, followed by IN_IGNORED
+                    continue
+
+                translated = self._translate_one(
+                    directory, mask, cookie, name, moved_from
+                )
+                handlers = self._handlers(directory)
+                result.extend((event, handlers) for event in translated)
+
+            # The destination is outside of the watched directories
+            for path, is_dir in moved_from.values():
+                event = Event(events.EVENT_TYPE_DELETED, path, "", is_dir)
+                result.append((event, self._handlers(os.path.dirname(path))))
+
+        return result
+
+    def _translate_one(
+        self,
+        directory: str,
+        mask: int,
+        cookie: int,
+        name: str,
+        moved_from: Dict[int, Tuple[str, bool]],
+    ) -> List[Event]:
+        path = os.path.join(directory, name)
+        is_dir = bool(mask & IN_ISDIR)
+
+        if mask & IN_MOVED_FROM:
+            moved_from[cookie] = (path, is_dir)
+            if is_dir:
+                self._remove_tree(path)
+            return []
+
+        if mask & IN_MOVED_TO:
+            source = moved_from.pop(cookie, None)
+            if source is not None:
+                event = Event(events.EVENT_TYPE_MOVED, source[0], path, is_dir)
+            else:
+                event = Event(events.EVENT_TYPE_CREATED, path, "", is_dir)
+        elif mask & IN_CREATE:
+            event = Event(events.EVENT_TYPE_CREATED, path, "", is_dir)
+        elif mask & IN_DELETE:
+            event = Event(events.EVENT_TYPE_DELETED, path, "", is_dir)
+        elif mask & IN_CLOSE_WRITE:
+            event = Event(events.EVENT_TYPE_MODIFIED, path)
+        else:
+            return []
+
+        if is_dir and event.event_type != events.EVENT_TYPE_DELETED:
+            return [event, *self._add_new_tree(directory, path)]
+        return [event]
+
+    def _handlers(self, directory: str) -> List[Any]:
+        handlers = []
+        for watch in self._watches:
+            if watch.covers(directory) and watch.handler not in handlers:
+                handlers.append(watch.handler)
+        return handlers
+
+    def _add_new_tree(self, parent: str, path: str) -> List[Event]:
+        """
+        Watch a directory that appeared in a watched one. Files created in it
+        before the watch was added produce no events, they are reported here.
+        """
+        if not any(w.recursive and w.covers(parent) for w in self._watches):
+            return []
+        if os.path.basename(path) in PRUNED_DIRS:
+            return []
+
+        self._add_tree(path, recursive=True)
+        return [
+            Event(events.EVENT_TYPE_CREATED, file_path)
+            for file_path in _walk_files(path)
+        ]
+
+    def _recover(self, since: float) -> None:
+        """
+        Events were dropped by the kernel. Watch the directories that may have
+        been missed, and let the handlers rescan their directories for the
+        changes made after `since`.
+        """
+        logging.warning(
+            "File system event queue overflowed, rescanning the watched directories"
+        )
+
+        roots: Dict[Any, List[Tuple[str, bool]]] = {}
+        with self._lock:
+            for watch in self._watches:
+                self._add_tree(watch.path, watch.recursive)
+                roots.setdefault(watch.handler, []).append((watch.path, watch.recursive))
+
+        for handler, handler_roots in roots.items():
+            if hasattr(handler, "handle_overflow"):
+                try:
+                    handler.handle_overflow(handler_roots, since)
+                except Exception:
+                    logging.exception("Error while rescanning")
+                continue
+
+            for path in rescan(handler_roots, None, lambda _: True, since):
+                self._dispatch(handler, Event(events.EVENT_TYPE_MODIFIED, path))
+
+    def _add_tree(self, root: str, recursive: bool) -> None:
+        self._add_watch(root)
+        if not recursive:
+            return
+
+        for directory, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d not in PRUNED_DIRS]
+            for name in dirnames:
+                self._add_watch(os.path.join(directory, name))
+
+    def _add_watch(self, directory: str) -> None:
+        if directory in self._wds:
+            return
+
+        try:
+            wd = _check(
+                _get_libc().inotify_add_watch(
+                    self._fd, os.fsencode(directory), WATCH_MASK
+                )
+            )
+        except InotifyError as exc:
+            if exc.errno == errno.ENOSPC:
+                logging.error(
+                    "Inotify watch limit reached, increase "
+                    "fs.inotify.max_user_watches to watch all directories"
+                )
+            elif exc.errno not in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                raise
+            return
+
+        self._dirs[wd] = directory
+        self._wds[directory] = wd
+
+    def _remove_watch(self, directory: str) -> None:
+        wd = self._wds.pop(directory, None)
+        if wd is None:
+            return
+
+        del self._dirs[wd]
+        _get_libc().inotify_rm_watch(self._fd, wd)
+
+    def _remove_tree(self, root: str) -> None:
+        prefix = root + os.sep
+        for directory in list(self._wds):
+            if directory == root or directory.startswith(prefix):
+                self._remove_watch(directory)
+
+    def _forget(self, wd: int) -> None:
+        directory = self._dirs.pop(wd, None)
+        if directory is not None and self._wds.get(directory) == wd:
+            del self._wds[directory]
+
+
+def _walk_files(root: str) -> Iterator[str]:
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in PRUNED_DIRS]
+        for name in filenames:
+            yield os.path.join(directory, name)
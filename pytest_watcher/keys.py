@@ -0,0 +1,198 @@
+"""
+Keyboard input: the bytes available on the terminal are read at once and
+split into keys, escape sequences included, so that a key never arrives
+in pieces. Text is entered with a line editor fed from the main loop.
+"""
+
+from __future__ import annotations
+
+import codecs
+import os
+import select
+from typing import Dict, List, Optional, Tuple
+
+ESC = "\x1b"
+
+KEY_ENTER = "\n"
+KEY_ESCAPE = "escape"
+KEY_BACKSPACE = "backspace"
+KEY_DELETE = "delete"
+KEY_UP = "up"
+KEY_DOWN = "down"
+KEY_RIGHT = "right"
+KEY_LEFT = "left"
+KEY_HOME = "home"
+KEY_END = "end"
+
+CTRL_A = "\x01"
+CTRL_E = "\x05"
+CTRL_U = "\x15"
+
+# Final characters of the CSI (ESC [) and SS3 (ESC O) sequences
+SEQUENCE_KEYS: Dict[str, str] = {
+    "A": KEY_UP,
+    "B": KEY_DOWN,
+    "C": KEY_RIGHT,
+    "D": KEY_LEFT,
+    "H": KEY_HOME,
+    "F": KEY_END,
+}
+# ESC [ <n> ~
+TILDE_KEYS: Dict[str, str] = {
+    "1": KEY_HOME,
+    "3": KEY_DELETE,
+    "4": KEY_END,
+    "7": KEY_HOME,
+    "8": KEY_END,
+}
+
+READ_SIZE = 4096
+
+
+def parse_keys(text: str) -> Tuple[List[str], str]:
+    """
+    Split the text read from the terminal into keys. Unknown escape
+    sequences are dropped. Returns the keys and the incomplete escape
+    sequence the text ends with, if any.
+    """
+    keys: List[str] = []
+    i = 0
+
+    while i < len(text):
+        char = text[i]
+
+        if char == ESC:
+            if i + 1 == len(text):
+                return keys, text[i:]
+
+            kind = text[i + 1]
+            if kind == "[":
+                end = i + 2
+                while end < len(text) and not "\x40" <= text[end] <= "\x7e":
+                    end += 1
+                if end == len(text):
+                    return keys, text[i:]
+
+                params, final = text[i + 2 : end], text[end]
+                if final == "~":
+                    key = TILDE_KEYS.get(params.split(";")[0])
+                else:
+                    key = SEQUENCE_KEYS.get(final)
+                i = end + 1
+            elif kind == "O":
+                if i + 2 == len(text):
+                    return keys, text[i:]
+                key = SEQUENCE_KEYS.get(text[i + 2])
+                i += 3
+            else:
+                # Alt and a key
+                key = None
+                i += 2
+
+            if key is not None:
+                keys.append(key)
+        elif char == "\r":
+            keys.append(KEY_ENTER)
+            i += 2 if text[i + 1 : i + 2] == "\n" else 1
+        elif char in ("\x7f", "\b"):
+            keys.append(KEY_BACKSPACE)
+            i += 1
+        else:
+            keys.append(char)
+            i += 1
+
+    return keys, ""
+
+
+def is_printable(key: str) -> bool:
+    return len(key) == 1 and key.isprintable()
+
+
+class KeyReader:
+    """Reads the keys available on a file descriptor, without blocking"""
+
+    def __init__(self, fd: int):
+        self._fd = fd
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""
+
+    def read(self) -> List[str]:
+        data = b""
+        while select.select([self._fd], [], [], 0)[0]:
+            chunk = os.read(self._fd, READ_SIZE)
+            if not chunk:
+                break
+            data += chunk
+
+        if not data:
+            # Nothing completed the sequence since the previous read: a lone
+            # ESC is the Escape key, anything else is dropped
+            pending, self._pending = self._pending, ""
+            return [KEY_ESCAPE] if pending == ESC else []
+
+        keys, self._pending = parse_keys(self._pending + self._decoder.decode(data))
+        return keys
+
+
+class LineEditor:
+    """A single line of input, with a cursor and a history"""
+
+    def __init__(self, prompt: str, history: List[str], text: str = ""):
+        self.prompt = prompt
+        self.text = text
+        self.cursor = len(text)
+        self.done = False
+        self._history = history
+        self._position = len(history)
+        self._draft = text
+
+    def feed(self, key: str) -> Optional[str]:
+        """Apply a key. Returns the line once it is entered"""
+        if key == KEY_ENTER:
+            self.done = True
+            line = self.text.strip()
+            if line and (not self._history or self._history[-1] != line):
+                self._history.append(line)
+            return self.text
+        if key == KEY_ESCAPE:
+            self.done = True
+        elif key == KEY_BACKSPACE:
+            if self.cursor:
+                self.text = self.text[: self.cursor - 1] + self.text[self.cursor :]
+                self.cursor -= 1
+        elif key == KEY_DELETE:
+            self.text = self.text[: self.cursor] + self.text[self.cursor + 1 :]
+        elif key == KEY_LEFT:
+            self.cursor = max(self.cursor - 1, 0)
+        elif key == KEY_RIGHT:
+            self.cursor = min(self.cursor + 1, len(self.text))
+        elif key in (KEY_HOME, CTRL_A):
+            self.cursor = 0
+        elif key in (KEY_END, CTRL_E):
+            self.cursor = len(self.text)
+        elif key == CTRL_U:
+            self.text = self.text[self.cursor :]
+            self.cursor = 0
+        elif key in (KEY_UP, KEY_DOWN):
+            self._browse(-1 if key == KEY_UP else 1)
+        elif is_printable(key):
+            self.text = self.text[: self.cursor] + key + self.text[self.cursor :]
+            self.cursor += 1
+        return None
+
+    def render(self) -> Tuple[str, int]:
+        """The line to display and the position of the cursor in it"""
+        return self.prompt + self.text, len(self.prompt) + self.cursor
+
+    def _browse(self, step: int) -> None:
+        position = self._position + step
+        if not 0 <= position <= len(self._history):
+            return
+
+        if self._position == len(self._history):
+            self._draft = self.text
+        self._position = position
+        self.text = (
+            self._history[position] if position < len(self._history) else self._draft
+        )
+        self.cursor = len(self.text)
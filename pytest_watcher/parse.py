@@ -2,6 +2,7 @@ import argparse
 from pathlib import Path
 from typing import List, Sequence, Tuple
 
+from .config import FIELD_CHOICES
 from .constants import DEFAULT_DELAY, VERSION
 
 
@@ -70,6 +71,155 @@ def parse_arguments(args: Sequence[str]) -> Tuple[argparse.Namespace, List[str]]
         help="File patterns to ignore, specified as comma-separated "
         "Unix-style patterns (default: '')",
     )
+    parser.add_argument(
+        "--watch-paths",
+        type=_parse_patterns,
+        required=False,
+        help="Paths to watch, relative to <path> and separated by a comma "
+        "(default: derived from pytest testpaths and the project packages)",
+    )
+    parser.add_argument(
+        "--affected",
+        action="store_true",
+        required=False,
+        default=None,
+        help="On file changes, run only the tests affected by the changed files "
+        "(pytest only)",
+    )
+    parser.add_argument(
+        "--observer",
+        choices=FIELD_CHOICES["observer"],
+        required=False,
+        help="File system observer: the watchdog library, or a native inotify "
+        "reader (Linux only, default: watchdog)",
+    )
+    parser.add_argument(
+        "--env-file",
+        type=str,
+        required=False,
+        help="Load environment variables for the test runner from this file, "
+        "relative to <path>",
+    )
+    parser.add_argument(
+        "--venv",
+        type=str,
+        required=False,
+        help="Run the test runner inside this virtualenv, relative to <path>",
+    )
+    parser.add_argument(
+        "--speculative",
+        action="store_true",
+        required=False,
+        default=None,
+        help="Start a file-triggered run on the first change, and restart it if "
+        "further changes within the delay affect it",
+    )
+    parser.add_argument(
+        "--retry-flaky",
+        action="store_true",
+        required=False,
+        default=None,
+        help="Detect flaky tests from their outcome history, and retry them when "
+        "a run fails only on flaky tests (pytest only)",
+    )
+    parser.add_argument(
+        "--learn-test-inputs",
+        action="store_true",
+        required=False,
+        default=None,
+        help="Record the files the tests read during runs of the whole suite, and "
+        "rerun only the tests reading a changed file (pytest only)",
+    )
+    parser.add_argument(
+        "--remote",
+        type=str,
+        required=False,
+        help="Run the tests with an agent in a container or on another host: "
+        "unix:PATH to connect to a socket, or stdio:COMMAND to start it",
+    )
+    parser.add_argument(
+        "--rss-sample-interval",
+        type=float,
+        required=False,
+        help="Sample the memory usage of the test runner every N seconds "
+        "(Linux only, default: disabled)",
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        required=False,
+        help="Git revision to compute the initial change set against (default: HEAD)",
+    )
+    parser.add_argument(
+        "--max-load",
+        type=float,
+        required=False,
+        help="Defer test runs while the load average per CPU is above this value "
+        "(halved on battery power)",
+    )
+    parser.add_argument(
+        "--min-free-memory",
+        type=int,
+        required=False,
+        help="Defer test runs while less than this many MB of memory is available",
+    )
+    parser.add_argument(
+        "--max-parallel-runs",
+        type=int,
+        required=False,
+        help="Maximum number of test runs executing at once across all "
+        "pytest-watcher instances on the host",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        required=False,
+        help="Run headless and share the watcher with clients attaching "
+        "to the same path",
+    )
+    parser.add_argument(
+        "--json",
+        "--batch",
+        dest="json",
+        action="store_true",
+        required=False,
+        default=None,
+        help="Run without terminal UI and write one JSON record per test run to stdout",
+    )
+    parser.add_argument(
+        "--max-runs",
+        type=int,
+        required=False,
+        help="Exit after this many test runs (with --json)",
+    )
+    parser.add_argument(
+        "--exit-on-idle",
+        type=float,
+        required=False,
+        help="Exit after this many seconds without file changes or test runs "
+        "(with --json)",
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        required=False,
+        help="Write the file system events and the test runs to this file, "
+        "gzip-compressed if it ends with .gz",
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        required=False,
+        help="Replay a recording with a simulated runner and report the runs",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        required=False,
+        default=0.0,
+        help="Pace the replay at this many times the real time "
+        "(default: as fast as possible)",
+    )
     parser.add_argument("--version", action="version", version=VERSION)
 
     return parser.parse_known_args(args)
@@ -0,0 +1,215 @@
+"""
+Stages checking the changes before the tests run, such as a linter and a
+type checker. Stages run in parallel unless one needs another, the first
+failure stops the pipeline, and the tests only run once every stage passed.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Set
+
+from watchdog.utils.patterns import filter_paths
+
+from .resources import Usage
+from .runner import RunResult
+
+STAGE_FIELD_TYPES: Dict[str, type] = {
+    "name": str,
+    "runner": str,
+    "args": list,
+    "patterns": list,
+    "pass_changes": bool,
+    "needs": list,
+}
+
+# Return code of the stages whose runner could not be started, as in a shell
+NOT_STARTED_RETURNCODE = 127
+
+# Runs a stage command: `run(command, on_output, on_start)`
+StageRunner = Callable[
+    [List[str], Callable[[str], None], Callable[[Any], None]], RunResult
+]
+
+
+@dataclass
+class Stage:
+    name: str
+    runner: str
+    args: List[str] = field(default_factory=list)
+    # Changes the stage checks, all of them when empty
+    patterns: List[str] = field(default_factory=list)
+    # Append the changed files matching the patterns to the command
+    pass_changes: bool = False
+    # Stages that have to pass before this one starts
+    needs: List[str] = field(default_factory=list)
+
+    def command(self, changes: Set[str], root: str = os.curdir) -> Optional[List[str]]:
+        """The command checking the changes, none if they don't concern the stage"""
+        command = [self.runner, *self.args]
+        if not changes:
+            # Runs not started by a change check everything, the whole project
+            # rather than no file at all for the stages passed the changes
+            return [*command, root] if self.pass_changes else command
+
+        matching = sorted(
+            filter_paths(list(changes), included_patterns=self.patterns or None)
+        )
+        if self.pass_changes:
+            # Deleted files are left for the tests to notice
+            matching = [path for path in matching if os.path.exists(path)]
+            return [*command, *matching] if matching else None
+        return command if matching else None
+
+
+def parse_stages(data: Sequence[Mapping[str, Any]]) -> List[Stage]:
+    """Stages of the `stages` config option"""
+    stages: List[Stage] = []
+    names: Set[str] = set()
+
+    for entry in data:
+        if not isinstance(entry, Mapping):
+            raise SystemExit(f"Invalid stage: {entry!r}")
+
+        for key, val in entry.items():
+            if key not in STAGE_FIELD_TYPES:
+                raise SystemExit(f"Unrecognized stage option: {key}")
+            valid = isinstance(val, STAGE_FIELD_TYPES[key])
+            if isinstance(val, list):
+                valid = all(isinstance(item, str) for item in val)
+            if not valid:
+                raise SystemExit(f"Invalid value for stage option {key}: {val!r}")
+
+        name = entry.get("name")
+        if not name or not entry.get("runner"):
+            raise SystemExit(f"A stage needs a name and a runner: {dict(entry)!r}")
+        if name in names:
+            raise SystemExit(f"Duplicate stage name: {name}")
+
+        # Stages only need earlier ones, which rules out cycles
+        for needed in entry.get("needs", []):
+            if needed not in names:
+                raise SystemExit(
+                    f"Stage {name} needs {needed}, which is not defined before it"
+                )
+
+        names.add(name)
+        # The parsed config is cached, its lists must not be shared
+        options: Dict[str, Any] = {
+            k: list(v) if isinstance(v, list) else v for k, v in entry.items()
+        }
+        stages.append(Stage(**options))
+
+    return stages
+
+
+@dataclass
+class StageRun:
+    stage: Stage
+    # None when no change concerns the stage
+    command: Optional[List[str]]
+    result: Optional[RunResult] = None
+    output: List[str] = field(default_factory=list)
+    # Stopped because another stage failed
+    terminated: bool = False
+
+    @property
+    def status(self) -> str:
+        if self.command is None:
+            return "skipped"
+        if self.result is None or self.terminated:
+            return "cancelled"
+        return "passed" if self.result.returncode == 0 else "failed"
+
+
+def run_stages(
+    stages: Sequence[Stage],
+    changes: Set[str],
+    run: StageRunner,
+    workers: int,
+    on_finished: Optional[Callable[[StageRun], None]] = None,
+    root: str = os.curdir,
+) -> List[StageRun]:
+    """
+    Run the stages the changes concern, each as soon as the stages it needs
+    passed or were skipped. On the first failure, the stages not started are
+    cancelled and the running ones terminated. `on_finished` is called with
+    each stage run that completes, from the calling thread.
+    """
+    runs = [StageRun(stage, stage.command(changes, root)) for stage in stages]
+    pending = list(runs)
+    # Names of the stages passed or skipped
+    cleared: Set[str] = set()
+    running: Dict[Future, StageRun] = {}
+    processes: Dict[str, Any] = {}
+    failed = threading.Event()
+    lock = threading.Lock()
+
+    def start(stage_run: StageRun) -> RunResult:
+        assert stage_run.command is not None
+
+        def on_start(proc: Any) -> None:
+            with lock:
+                processes[stage_run.stage.name] = proc
+                if failed.is_set():
+                    stage_run.terminated = True
+                    proc.terminate()
+
+        try:
+            return run(stage_run.command, stage_run.output.append, on_start)
+        except OSError as exc:
+            # A missing runner fails the stage rather than the watcher
+            stage_run.output.append(
+                f"[ptw] Unable to run {stage_run.stage.runner}: {exc}\n"
+            )
+            return RunResult(stage_run.command, NOT_STARTED_RETURNCODE, Usage())
+
+    def next_ready() -> Optional[StageRun]:
+        for stage_run in pending:
+            if all(needed in cleared for needed in stage_run.stage.needs):
+                return stage_run
+        return None
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        while True:
+            while not failed.is_set():
+                stage_run = next_ready()
+                if stage_run is None:
+                    break
+                pending.remove(stage_run)
+                if stage_run.command is None:
+                    cleared.add(stage_run.stage.name)
+                else:
+                    running[executor.submit(start, stage_run)] = stage_run
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage_run = running.pop(future)
+                if future.cancelled():
+                    continue
+                stage_run.result = future.result()
+
+                if stage_run.status == "passed":
+                    cleared.add(stage_run.stage.name)
+                elif not failed.is_set():
+                    failed.set()
+                    with lock:
+                        for other_future, other in running.items():
+                            # Done as well, or waiting for a worker and never started
+                            if other_future.done() or other_future.cancel():
+                                continue
+                            proc = processes.get(other.stage.name)
+                            if proc is not None:
+                                other.terminated = True
+                                proc.terminate()
+
+                if on_finished is not None:
+                    on_finished(stage_run)
+
+    return runs
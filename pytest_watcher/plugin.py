@@ -0,0 +1,195 @@
+"""
+pytest plugin injected into the test runner process by pytest-watcher
+(`-p pytest_watcher.plugin`). Its features are enabled through environment
+variables set by the watcher, so that it stays inert otherwise.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+PROFILE_OUTPUT_ENV = "PTW_PROFILE_OUTPUT"
+RESULTS_OUTPUT_ENV = "PTW_RESULTS_OUTPUT"
+INPUTS_OUTPUT_ENV = "PTW_INPUTS_OUTPUT"
+
+# Opened by the import system, never test inputs
+IGNORED_SUFFIXES = (".py", ".pyc", ".pyi", ".pth")
+
+_profiler: Optional[cProfile.Profile] = None
+_results: Optional[Dict[str, Any]] = None
+# Test file -> paths it opened for reading
+_inputs: Optional[Dict[str, Set[str]]] = None
+# Paths the tests opened for writing, outputs of the run rather than inputs
+_written: Set[str] = set()
+_current_file: Optional[str] = None
+_audit_hook_added = False
+
+
+def _audit(event: str, args: Any) -> None:
+    # Called on every audited event of the process, the common case returns early
+    if event != "open" or _current_file is None or _inputs is None:
+        return
+
+    try:
+        path, mode, flags = args
+        if isinstance(path, int):
+            return
+        # `open` has a mode, `os.open` only flags
+        if isinstance(mode, str):
+            writing = any(c in mode for c in "wax+")
+        else:
+            writing = flags & os.O_ACCMODE != os.O_RDONLY or bool(
+                flags & (os.O_CREAT | os.O_TRUNC)
+            )
+
+        path = os.fsdecode(path)
+        if not os.path.isabs(path):
+            path = os.path.join(os.getcwd(), path)
+        if writing:
+            _written.add(path)
+        else:
+            _inputs.setdefault(_current_file, set()).add(path)
+    except Exception:
+        # An error would fail the open call of the test
+        pass
+
+
+def report_path(cache_dir: Path, name: str) -> Path:
+    """Where the plugin writes the `name` report of a run, cleared beforehand"""
+    path = cache_dir.joinpath(f"{name}-{os.getpid()}.json")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    return path
+
+
+def read_report(path: Path) -> Any:
+    """The report written by the plugin, removed once read, none if missing"""
+    try:
+        with path.open() as f:
+            return json.load(f)
+    except (OSError, ValueError) as exc:
+        # The runner may exit before the end of the session
+        logging.debug(f"Unable to read the {path.stem} report: {exc}")
+        return None
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def _is_tracked(path: str, root: str) -> bool:
+    if path.endswith(IGNORED_SUFFIXES) or not path.startswith(root + os.sep):
+        return False
+
+    parts = os.path.relpath(path, root).split(os.sep)
+    # Caches, virtualenvs and VCS directories are not test inputs
+    if any(p.startswith(".") or p in ("__pycache__", "site-packages") for p in parts):
+        return False
+    return os.path.isfile(path)
+
+
+def pytest_sessionstart(session) -> None:
+    global _profiler, _results, _inputs, _audit_hook_added
+
+    if os.environ.get(RESULTS_OUTPUT_ENV):
+        _results = {"counts": Counter(), "failed": [], "passed": []}
+
+    if os.environ.get(INPUTS_OUTPUT_ENV):
+        _inputs = {}
+        _written.clear()
+        # Audit hooks can't be removed, `_audit` is inert outside the tests
+        if not _audit_hook_added:
+            sys.addaudithook(_audit)
+            _audit_hook_added = True
+
+    if os.environ.get(PROFILE_OUTPUT_ENV):
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def pytest_collectreport(report) -> None:
+    if _results is not None and report.failed:
+        _results["counts"]["error"] += 1
+        _results["failed"].append(report.nodeid)
+
+
+def pytest_runtest_logstart(nodeid, location) -> None:
+    global _current_file
+
+    if _inputs is not None:
+        _current_file = nodeid.split("::", 1)[0]
+
+
+def pytest_runtest_logfinish(nodeid, location) -> None:
+    global _current_file
+
+    _current_file = None
+
+
+def pytest_runtest_logreport(report) -> None:
+    if _results is None:
+        return
+
+    xfail = hasattr(report, "wasxfail")
+
+    if report.failed:
+        outcome = "failed" if report.when == "call" else "error"
+    elif report.skipped:
+        outcome = "xfailed" if xfail else "skipped"
+    elif report.when == "call":
+        outcome = "xpassed" if xfail else "passed"
+    else:
+        return
+
+    _results["counts"][outcome] += 1
+    if outcome in ("failed", "error"):
+        _results["failed"].append(report.nodeid)
+    elif outcome == "passed":
+        _results["passed"].append(report.nodeid)
+
+
+def pytest_sessionfinish(session, exitstatus) -> None:
+    global _profiler, _results, _inputs
+
+    if _profiler is not None:
+        _profiler.disable()
+        try:
+            _profiler.dump_stats(os.environ[PROFILE_OUTPUT_ENV])
+        except OSError as exc:
+            _report_write_error(exc)
+        _profiler = None
+
+    if _results is not None:
+        _results["collected"] = session.testscollected
+        _write_json(os.environ[RESULTS_OUTPUT_ENV], _results)
+        _results = None
+
+    if _inputs is not None:
+        inputs, _inputs = _inputs, None
+        root = os.path.normpath(str(session.config.rootpath))
+        # Read back by the tests that wrote them, or by others
+        written = {os.path.normpath(path) for path in _written}
+        _written.clear()
+        tracked = {}
+        for test_file, paths in inputs.items():
+            normalized = {os.path.normpath(path) for path in paths} - written
+            tracked[os.path.normpath(os.path.join(root, test_file))] = sorted(
+                path for path in normalized if _is_tracked(path, root)
+            )
+        _write_json(os.environ[INPUTS_OUTPUT_ENV], tracked)
+
+
+def _write_json(path: str, data: Any) -> None:
+    try:
+        with open(path, "w") as f:
+            json.dump(data, f)
+    except OSError as exc:
+        _report_write_error(exc)
+
+
+def _report_write_error(exc: OSError) -> None:
+    # A missing report must not fail a passing session
+    sys.stderr.write(f"[ptw] Unable to write the report for pytest-watcher: {exc}\n")
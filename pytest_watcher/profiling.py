@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import pstats
+import shutil
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .plugin import PROFILE_OUTPUT_ENV
+from .runner import is_pytest_command, with_plugin
+
+TOP_N = 10
+
+
+class ProfilerUnavailable(Exception):
+    pass
+
+
+@dataclass
+class Profile:
+    path: Path
+    unit: str
+    # Self time (or sample count) per function
+    hotspots: Dict[str, float]
+
+    @classmethod
+    def load(cls, path: Path) -> Profile:
+        if path.suffix == ".pstats":
+            return cls(path, "s", _load_pstats(path))
+        return cls(path, "samples", _load_collapsed(path))
+
+    def top(self, n: int = TOP_N) -> List[Tuple[str, float]]:
+        return sorted(self.hotspots.items(), key=lambda item: item[1], reverse=True)[:n]
+
+    def diff(self, previous: Profile) -> List[Tuple[str, float]]:
+        """Change of self time per function, biggest changes first"""
+        if previous.unit != self.unit:
+            return []
+
+        functions = self.hotspots.keys() | previous.hotspots.keys()
+        deltas = [
+            (func, self.hotspots.get(func, 0) - previous.hotspots.get(func, 0))
+            for func in functions
+        ]
+        deltas = [(func, delta) for func, delta in deltas if delta]
+        return sorted(deltas, key=lambda item: abs(item[1]), reverse=True)
+
+
+def _load_pstats(path: Path) -> Dict[str, float]:
+    stats = pstats.Stats(str(path)).stats  # type: ignore[attr-defined]
+    return {
+        f"{filename}:{line}({name})": tottime
+        for (filename, line, name), (_, _, tottime, _, _) in stats.items()
+    }
+
+
+def _load_collapsed(path: Path) -> Dict[str, float]:
+    hotspots: Counter[str] = Counter()
+
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip().rpartition(" ")
+            if stack:
+                hotspots[stack.rsplit(";", 1)[-1]] += int(count)
+
+    return dict(hotspots)
+
+
+class Profiler:
+    """
+    Runs the test runner under a profiler: cProfile via the injected pytest
+    plugin when the runner is pytest, or py-spy if it is installed.
+    """
+
+    def __init__(self) -> None:
+        self.previous: Optional[Profile] = None
+
+    def prepare(
+        self, command: List[str], output_dir: Path
+    ) -> Tuple[List[str], Dict[str, str], Path]:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        name = time.strftime("%Y%m%d-%H%M%S")
+
+        if is_pytest_command(command):
+            path = output_dir.joinpath(f"{name}.pstats")
+            command = with_plugin(command)
+            return command, {PROFILE_OUTPUT_ENV: str(path)}, path
+
+        py_spy = shutil.which("py-spy")
+        if py_spy:
+            path = output_dir.joinpath(f"{name}.collapsed")
+            command = [
+                py_spy,
+                *("record", "--format", "raw", "--subprocesses"),
+                *("--output", str(path), "--"),
+                *command,
+            ]
+            return command, {}, path
+
+        raise ProfilerUnavailable(
+            f"Unable to profile {command[0]}: install py-spy to profile runners "
+            "other than pytest"
+        )
+
+    def report(self, path: Path, n: int = TOP_N) -> str:
+        try:
+            profile = Profile.load(path)
+        except (OSError, ValueError, TypeError, EOFError) as exc:
+            return f"Unable to read profile {path}: {exc}\n"
+
+        lines = [f"\nProfile saved to {path}\n", f"Top {n} hotspots:\n"]
+        for func, value in profile.top(n):
+            lines.append(f"  {_format(value, profile.unit)}  {func}\n")
+
+        if self.previous is not None:
+            deltas = profile.diff(self.previous)[:n]
+            if deltas:
+                lines.append(f"Compared to {self.previous.path.name}:\n")
+            for func, delta in deltas:
+                lines.append(f"  {_format(delta, profile.unit, sign=True)}  {func}\n")
+
+        self.previous = profile
+        return "".join(lines)
+
+
+def _format(value: float, unit: str, sign: bool = False) -> str:
+    prefix = "+" if sign else ""
+    if unit == "s":
+        return f"{value:{prefix}9.4f}s"
+    return f"{value:{prefix}9.0f}"
@@ -0,0 +1,225 @@
+"""
+Recording of the file system events received by the watcher, and their
+replay through the event handler and the trigger on a simulated clock.
+
+A recording is a JSON lines file, gzip-compressed when its name ends with
+`.gz`. The first line is a header, the others are entries:
+
+- `["e", time, event_type, src_path, dest_path, is_directory]`: an event
+- `["o", time]`: an event queue overflow
+- `["r", time, duration]`: a test run
+
+Times are in seconds since the start of the recording.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any, Dict, List, Sequence, Tuple
+
+from .config import Config
+from .constants import LOOP_DELAY
+from .event_handler import EventHandler
+from .inotify import Event
+from .trigger import Trigger
+
+RECORDING_VERSION = 1
+
+
+def _open(path: Path, mode: str) -> IO[str]:
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")  # type: ignore[return-value]
+    return open(path, mode, encoding="utf-8")
+
+
+class Recorder:
+    """Writes the events and the runs of a session to a recording"""
+
+    def __init__(self, path: Path, root: Path):
+        self.path = path
+        self._file = _open(path, "w")
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._write(
+            {"version": RECORDING_VERSION, "root": str(root), "time": time.time()}
+        )
+
+    def record_event(self, event: Any) -> None:
+        self._write(
+            [
+                "e",
+                self._elapsed(),
+                event.event_type,
+                event.src_path,
+                getattr(event, "dest_path", "") or "",
+                event.is_directory,
+            ]
+        )
+
+    def record_overflow(self) -> None:
+        self._write(["o", self._elapsed()])
+
+    def record_run(self, duration: float) -> None:
+        # Runs are rare, the events before them are not lost on a crash
+        self._write(["r", self._elapsed() - duration, round(duration, 4)], flush=True)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def _elapsed(self) -> float:
+        return round(time.monotonic() - self._start, 4)
+
+    def _write(self, entry: Any, flush: bool = False) -> None:
+        line = json.dumps(entry, separators=(",", ":"))
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line + "\n")
+            if flush:
+                self._file.flush()
+
+
+class RecordingHandler:
+    """Records the events received by a handler, before it filters them"""
+
+    def __init__(self, handler: Any, recorder: Recorder):
+        self._handler = handler
+        self._recorder = recorder
+
+    def dispatch(self, event: Any) -> None:
+        self._recorder.record_event(event)
+        self._handler.dispatch(event)
+
+    def handle_overflow(self, roots: Sequence[Tuple[str, bool]], since: float) -> None:
+        self._recorder.record_overflow()
+        self._handler.handle_overflow(roots, since)
+
+
+def load(path: Path) -> Tuple[Dict[str, Any], List[list]]:
+    """The header and the entries of a recording"""
+    try:
+        with _open(path, "r") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError) as exc:
+        raise SystemExit(f"Unable to read the recording {path}: {exc}")
+
+    if not lines or not isinstance(lines[0], dict):
+        raise SystemExit(f"{path} is not a pytest-watcher recording")
+    if lines[0].get("version") != RECORDING_VERSION:
+        raise SystemExit(f"Unsupported recording version in {path}")
+
+    return lines[0], lines[1:]
+
+
+@dataclass
+class ReplayedRun:
+    # Seconds since the start of the recording
+    at: float
+    # Time between the first change the run covers and its start
+    latency: float
+    changes: int
+    duration: float
+
+
+@dataclass
+class ReplayReport:
+    events: int
+    runs: List[ReplayedRun] = field(default_factory=list)
+
+    def render(self) -> str:
+        lines = [f"{self.events} events, {len(self.runs)} runs"]
+
+        for run in self.runs:
+            lines.append(
+                f"  {run.at:8.3f}s  run of {run.changes} changes, "
+                f"latency {run.latency * 1000:.0f} ms, took {run.duration:.2f}s"
+            )
+
+        latencies = [run.latency for run in self.runs if run.changes]
+        if latencies:
+            lines.append(
+                f"Latency: median {statistics.median(latencies) * 1000:.0f} ms, "
+                f"max {max(latencies) * 1000:.0f} ms"
+            )
+
+        return "\n".join(lines) + "\n"
+
+
+def replay(path: Path, config: Config, speed: float = 0.0) -> ReplayReport:
+    """
+    Feed a recording through the event handler and the trigger, with the
+    delay and the patterns of `config`. Runs are simulated, they take as long
+    as the recorded ones. The clock is simulated too, so that the outcome
+    only depends on the recording. With a `speed`, the replay is paced at
+    that many times the real time, 0 runs it as fast as possible.
+    """
+    _, entries = load(path)
+    events = deque(entry for entry in entries if entry[0] in ("e", "o"))
+    durations = deque(entry[2] for entry in entries if entry[0] == "r")
+    report = ReplayReport(events=len(events))
+
+    now = 0.0
+    trigger = Trigger(delay=config.delay, clock=lambda: now)
+    handler = EventHandler(
+        trigger, patterns=config.patterns, ignore_patterns=config.ignore_patterns
+    )
+    handler.quiet_until = float("inf")
+    # Time of the first change not covered by a run yet
+    pending_since = None
+
+    def dispatch_until(until: float) -> None:
+        nonlocal now, pending_since
+
+        while events and events[0][1] <= until:
+            entry = events.popleft()
+            now = entry[1]
+            if entry[0] == "o":
+                trigger.emit()
+            else:
+                _, _, event_type, src_path, dest_path, is_directory = entry
+                event: Any = Event(event_type, src_path, dest_path, is_directory)
+                handler.dispatch(event)
+
+            if pending_since is None and trigger.is_active():
+                pending_since = now
+        now = until
+
+    while events or trigger.is_active():
+        if not speed and events and not trigger.is_active():
+            # Nothing happens until the next event
+            now = max(now, events[0][1])
+        dispatch_until(now)
+
+        if trigger.check():
+            request = trigger.take_request(config.runner_args)
+            assert request is not None
+
+            duration = durations.popleft() if durations else 0.0
+            latency = now - pending_since if pending_since is not None else 0.0
+            pending_since = None
+            report.runs.append(
+                ReplayedRun(round(now, 4), latency, len(request.changes), duration)
+            )
+
+            # Events keep coming during the run, then the trigger is released
+            # like in the main loop
+            if speed:
+                time.sleep(duration / speed)
+            dispatch_until(now + duration)
+            trigger.release()
+            if not trigger.changes:
+                pending_since = None
+
+        if speed:
+            time.sleep(LOOP_DELAY / speed)
+        now += LOOP_DELAY
+
+    return report
@@ -0,0 +1,126 @@
+"""
+Recovery from lost file system events: the watched trees are rescanned and
+compared against the file index to rebuild the set of changed files.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from .git import FileIndex
+
+# Directories scanned at once, hashing is mostly I/O bound
+MAX_WORKERS = 8
+
+# Modification times are not precise on every file system
+MTIME_SLACK = 1.0
+
+PRUNED_DIRS = {
+    "__pycache__",
+    ".git",
+    ".hg",
+    ".svn",
+    ".tox",
+    ".nox",
+    ".venv",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+    "node_modules",
+}
+
+
+def list_directories(roots: Sequence[Tuple[str, bool]]) -> List[str]:
+    """The directories of the (path, recursive) roots, skipping PRUNED_DIRS"""
+    directories: List[str] = []
+
+    for root, recursive in roots:
+        if not recursive:
+            directories.append(root)
+            continue
+
+        for directory, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d not in PRUNED_DIRS]
+            directories.append(directory)
+
+    return directories
+
+
+def rescan(
+    roots: Sequence[Tuple[str, bool]],
+    index: Optional[FileIndex],
+    is_watched: Callable[[str], bool],
+    since: float,
+    workers: int = MAX_WORKERS,
+) -> List[str]:
+    """
+    Find the watched files under `roots` that changed after `since`, the
+    time events were last known to be received. Only the files modified
+    after it, or missing from the index, are read. They are compared against
+    the index, if any, so that rewrites with the same content are left out.
+    """
+    directories = list_directories(roots)
+    workers = max(1, min(workers, os.cpu_count() or 1, len(directories)))
+    threshold = since - MTIME_SLACK
+
+    def scan(directory: str) -> List[str]:
+        changed: List[str] = []
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return changed
+
+        for entry in entries:
+            # A renamed or moved file keeps its mtime, but is new to the index
+            known = index is None or index.get(entry.path) is not None
+            try:
+                if not entry.is_file():
+                    continue
+                if known and entry.stat().st_mtime < threshold:
+                    continue
+            except OSError:
+                continue
+            if not is_watched(entry.path):
+                continue
+            if index is None or index.update(entry.path):
+                changed.append(entry.path)
+
+        return changed
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        changed = [path for paths in executor.map(scan, directories) for path in paths]
+
+    if index is not None:
+        changed.extend(_find_deleted(roots, index, is_watched))
+
+    return sorted(changed)
+
+
+def _find_deleted(
+    roots: Sequence[Tuple[str, bool]],
+    index: FileIndex,
+    is_watched: Callable[[str], bool],
+) -> List[str]:
+    deleted = []
+
+    for path in index.dump():
+        if not is_watched(path):
+            continue
+        if not any(_is_under(path, root, recursive) for root, recursive in roots):
+            continue
+        if not os.path.exists(path) and index.update(path):
+            deleted.append(path)
+
+    return deleted
+
+
+def _is_under(path: str, root: str, recursive: bool) -> bool:
+    if not recursive:
+        return os.path.dirname(path) == root
+
+    if not path.startswith(root + os.sep):
+        return False
+    parts = os.path.relpath(path, root).split(os.sep)[:-1]
+    return not any(part in PRUNED_DIRS for part in parts)
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, List, Optional, Tuple
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+HISTORY_SIZE = 50
+RSS_GROWTH_THRESHOLD = 100 * 1024 * 1024
+CPU_GROWTH_RATIO = 1.5
+CPU_GROWTH_MIN = 1.0
+
+MB = 1024 * 1024
+
+
+@dataclass
+class Usage:
+    duration: float = 0.0
+    user_time: float = 0.0
+    system_time: float = 0.0
+    max_rss: Optional[int] = None
+    read_blocks: int = 0
+    write_blocks: int = 0
+    voluntary_switches: int = 0
+    involuntary_switches: int = 0
+    rss_samples: List[Tuple[float, int]] = field(default_factory=list)
+
+    @classmethod
+    def from_rusage(cls, duration: float, rusage: Any = None) -> Usage:
+        """
+        The usage of a process from the rusage `os.wait4` returned for it, which
+        unlike RUSAGE_CHILDREN leaves out the other children running at the time
+        """
+        if rusage is None:
+            return cls(duration=duration)
+
+        return cls(
+            duration=duration,
+            user_time=rusage.ru_utime,
+            system_time=rusage.ru_stime,
+            max_rss=rusage.ru_maxrss * MAXRSS_UNIT,
+            read_blocks=rusage.ru_inblock,
+            write_blocks=rusage.ru_oublock,
+            voluntary_switches=rusage.ru_nvcsw,
+            involuntary_switches=rusage.ru_nivcsw,
+        )
+
+    @property
+    def cpu_time(self) -> float:
+        return self.user_time + self.system_time
+
+    @property
+    def peak_rss(self) -> Optional[int]:
+        sampled = max((rss for _, rss in self.rss_samples), default=None)
+        if self.max_rss is None:
+            return sampled
+        return max(self.max_rss, sampled or 0)
+
+    def summary(self) -> str:
+        parts = [
+            f"time {self.duration:.2f}s",
+            f"cpu {self.cpu_time:.2f}s "
+            f"(user {self.user_time:.2f}s, sys {self.system_time:.2f}s)",
+        ]
+        if self.peak_rss is not None:
+            parts.append(f"peak RSS {self.peak_rss / MB:.1f} MB")
+        parts.append(f"io {self.read_blocks}/{self.write_blocks} blocks")
+        parts.append(
+            f"ctx switches {self.voluntary_switches}/{self.involuntary_switches}"
+        )
+        return ", ".join(parts)
+
+
+class RSSSampler:
+    """Samples the resident set size of a running process from /proc"""
+
+    def __init__(self, pid: int, interval: float):
+        self._path = Path(f"/proc/{pid}/status")
+        self._interval = interval
+        self._started = time.monotonic()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.samples: List[Tuple[float, int]] = []
+
+    def start(self) -> RSSSampler:
+        self._thread.start()
+        return self
+
+    def stop(self) -> List[Tuple[float, int]]:
+        self._stopped.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            rss = read_rss(self._path)
+            if rss is None:
+                return
+            self.samples.append((time.monotonic() - self._started, rss))
+            self._stopped.wait(self._interval)
+
+
+def read_rss(status_path: Path) -> Optional[int]:
+    try:
+        content = status_path.read_text()
+    except OSError:
+        return None
+
+    for line in content.splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) * 1024
+    return None
+
+
+class SessionStats:
+    """Keeps resource usage of the recent runs and flags regressions"""
+
+    def __init__(self, size: int = HISTORY_SIZE):
+        self.runs: Deque[Usage] = deque(maxlen=size)
+
+    def add(self, usage: Usage) -> List[str]:
+        warnings = self.check_trends(usage)
+        self.runs.append(usage)
+        return warnings
+
+    def check_trends(self, usage: Usage) -> List[str]:
+        if not self.runs:
+            return []
+
+        warnings = []
+
+        previous_rss = [u.peak_rss for u in self.runs if u.peak_rss is not None]
+        if previous_rss and usage.peak_rss is not None:
+            baseline = statistics.median(previous_rss)
+            growth = usage.peak_rss - baseline
+            if growth >= RSS_GROWTH_THRESHOLD:
+                warnings.append(
+                    f"Peak RSS grew by {growth / MB:.0f} MB "
+                    f"(median of previous runs: {baseline / MB:.0f} MB)"
+                )
+
+        baseline_cpu = statistics.median(u.cpu_time for u in self.runs)
+        if (
+            usage.cpu_time - baseline_cpu >= CPU_GROWTH_MIN
+            and usage.cpu_time >= baseline_cpu * CPU_GROWTH_RATIO
+        ):
+            warnings.append(
+                f"CPU time grew to {usage.cpu_time:.2f}s "
+                f"(median of previous runs: {baseline_cpu:.2f}s)"
+            )
+
+        return warnings
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .resources import RSSSampler, Usage
+
+PLUGIN = "pytest_watcher.plugin"
+PYTEST_EXECUTABLES = {"pytest", "py.test"}
+# Options of pytest and common plugins taking their value as the next arg
+PYTEST_VALUE_OPTIONS = {
+    "-c",
+    "-k",
+    "-m",
+    "-n",
+    "-o",
+    "-p",
+    "-r",
+    "-W",
+    "--basetemp",
+    "--capture",
+    "--color",
+    "--confcutdir",
+    "--config-file",
+    "--cov",
+    "--cov-config",
+    "--cov-context",
+    "--cov-fail-under",
+    "--cov-report",
+    "--deselect",
+    "--dist",
+    "--doctest-glob",
+    "--durations",
+    "--durations-min",
+    "--html",
+    "--ignore",
+    "--ignore-glob",
+    "--import-mode",
+    "--junit-prefix",
+    "--junit-xml",
+    "--junitxml",
+    "--log-cli-level",
+    "--log-file",
+    "--log-file-level",
+    "--log-level",
+    "--maxfail",
+    "--numprocesses",
+    "--override-ini",
+    "--pythonwarnings",
+    "--randomly-seed",
+    "--reruns",
+    "--reruns-delay",
+    "--rootdir",
+    "--show-capture",
+    "--tb",
+    "--timeout",
+}
+
+
+@dataclass
+class RunResult:
+    command: List[str]
+    returncode: int
+    usage: Usage
+    # Failed tests that passed on retry, the run is flaky rather than failed
+    flaky: List[str] = field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return self.usage.duration
+
+
+def run(
+    command: List[str],
+    on_output: Optional[Callable[[str], None]] = None,
+    sample_interval: float = 0.0,
+    env: Optional[Dict[str, str]] = None,
+    base_env: Optional[Dict[str, str]] = None,
+    on_start: Optional[Callable[[subprocess.Popen], None]] = None,
+) -> RunResult:
+    """
+    Run the test runner and collect its resource usage.
+
+    If `on_output` is given, the runner output is captured and passed to it
+    line by line instead of being written to the terminal directly.
+    `env` is added on top of `base_env`, which defaults to the watcher environment.
+    `on_start` is called with the runner process once it is started.
+    """
+    capture = on_output is not None
+
+    child_env = base_env
+    if env:
+        child_env = {**(base_env if base_env is not None else os.environ), **env}
+
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE if capture else None,
+        stderr=subprocess.STDOUT if capture else None,
+        text=capture,
+        env=child_env,
+    )
+
+    sampler = RSSSampler(proc.pid, sample_interval).start() if sample_interval else None
+
+    if on_start is not None:
+        on_start(proc)
+
+    try:
+        if on_output is not None:
+            assert proc.stdout is not None
+            for line in proc.stdout:
+                on_output(line)
+
+        returncode, rusage = _wait(proc)
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        samples = sampler.stop() if sampler else []
+
+    usage = Usage.from_rusage(time.monotonic() - started, rusage)
+    usage.rss_samples = samples
+
+    return RunResult(command=command, returncode=returncode, usage=usage)
+
+
+def with_plugin(command: List[str]) -> List[str]:
+    """Load the pytest-watcher plugin into the pytest process"""
+    if PLUGIN in command:
+        return command
+    at = 3 if _is_module_run(command) else 1
+    return [*command[:at], "-p", PLUGIN, *command[at:]]
+
+
+def split_args(args: Sequence[str]) -> Tuple[List[str], List[str]]:
+    """
+    The options of pytest runner args, with their values, and the positional
+    args, which select the tests to run
+    """
+    options: List[str] = []
+    positional: List[str] = []
+    takes_value = False
+
+    for arg in args:
+        if takes_value:
+            options.append(arg)
+            takes_value = False
+        elif arg.startswith("-"):
+            options.append(arg)
+            takes_value = arg in PYTEST_VALUE_OPTIONS
+        else:
+            positional.append(arg)
+
+    return options, positional
+
+
+def is_pytest_command(command: List[str]) -> bool:
+    return is_pytest_runner(command[0]) or _is_module_run(command)
+
+
+def is_pytest_runner(runner: str) -> bool:
+    name = os.path.basename(runner)
+    if name.lower().endswith(".exe"):
+        name = name[:-4]
+    return name in PYTEST_EXECUTABLES
+
+
+def _is_module_run(command: List[str]) -> bool:
+    # python -m pytest ...
+    return command[1:3] == ["-m", "pytest"]
+
+
+def _wait(proc: subprocess.Popen) -> Tuple[int, Any]:
+    """The return code and the resource usage of the process, if available"""
+    if not hasattr(os, "wait4"):
+        return proc.wait(), None
+
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    return proc.returncode, rusage
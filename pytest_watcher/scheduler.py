@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .config import Config
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # type: ignore[assignment]
+
+MB = 1024 * 1024
+
+
+def get_lock_dir() -> Path:
+    # Shared by every user, unlike the per user runtime directory
+    return Path(tempfile.gettempdir(), "pytest-watcher-locks")
+
+
+def get_load() -> Optional[float]:
+    """One-minute load average per CPU"""
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+    return load / (os.cpu_count() or 1)
+
+
+def get_available_memory(meminfo: Path = Path("/proc/meminfo")) -> Optional[int]:
+    try:
+        content = meminfo.read_text()
+    except OSError:
+        return None
+
+    for line in content.splitlines():
+        if line.startswith("MemAvailable:"):
+            return int(line.split()[1]) * 1024
+    return None
+
+
+def on_battery(power_supply: Path = Path("/sys/class/power_supply")) -> bool:
+    try:
+        supplies = list(power_supply.iterdir())
+    except OSError:
+        return False
+
+    for supply in supplies:
+        try:
+            if supply.joinpath("status").read_text().strip() == "Discharging":
+                return True
+        except OSError:
+            continue
+    return False
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _open_slot(path: Path) -> int:
+    # flock needs no write access. Creating a file that exists is avoided, as
+    # it fails in sticky directories for the files of other users.
+    try:
+        return os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        pass
+    try:
+        return os.open(path, os.O_CREAT | os.O_EXCL | os.O_RDONLY, 0o444)
+    except FileExistsError:
+        return os.open(path, os.O_RDONLY)
+
+
+class Slot:
+    """A permission to launch the test runner, held until the run is over"""
+
+    def __init__(self, fd: Optional[int] = None):
+        self._fd = fd
+
+    def release(self) -> None:
+        if self._fd is not None and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
+
+
+class Scheduler:
+    """
+    Decides when a test run may start based on the system load, available
+    memory and the number of runs in progress across all pytest-watcher
+    instances on the host.
+
+    Instances coordinate through a lock directory: every run slot is a file
+    locked with flock, and every waiting instance leaves a ticket with the
+    time of its latest file change, so the most recently edited project
+    gets the next free slot. The directory is world-writable with the sticky
+    bit, like /tmp, and the slot files are opened read-only, so that the
+    instances of every user share the cap.
+    """
+
+    def __init__(self, lock_dir: Optional[Path] = None):
+        self.lock_dir = lock_dir or get_lock_dir()
+        self.reason: Optional[str] = None
+        self._warned = False
+        self._ticket = self.lock_dir.joinpath(f"waiting-{os.getpid()}.ticket")
+
+    @staticmethod
+    def is_enabled(config: Config) -> bool:
+        return bool(
+            config.max_load or config.min_free_memory or config.max_parallel_runs
+        )
+
+    def try_acquire(self, config: Config, last_change: float) -> Optional[Slot]:
+        if not self.is_enabled(config):
+            return Slot()
+
+        slot = None
+        reason = self._check_pressure(config)
+
+        if reason is None and config.max_parallel_runs and fcntl is not None:
+            try:
+                self._register(last_change)
+
+                if not self._has_priority(last_change):
+                    reason = "a more recently edited project is waiting"
+                else:
+                    slot = self._lock_slot(config.max_parallel_runs)
+                    if slot is None:
+                        reason = f"all {config.max_parallel_runs} run slots are busy"
+            except OSError as exc:
+                # Files left by another user, or a directory out of reach
+                if not self._warned:
+                    logging.warning(f"Running without a run slot: {exc}")
+                    self._warned = True
+                self.reason = None
+                return Slot()
+
+        if reason is not None:
+            if reason != self.reason:
+                logging.info(f"Test run deferred: {reason}")
+            self.reason = reason
+            return None
+
+        self.reason = None
+        self.cancel()
+        return slot or Slot()
+
+    def cancel(self) -> None:
+        """Withdraw from the queue of the waiting instances"""
+        self._ticket.unlink(missing_ok=True)
+
+    def _check_pressure(self, config: Config) -> Optional[str]:
+        if config.max_load:
+            max_load = config.max_load / 2 if on_battery() else config.max_load
+            load = get_load()
+            if load is not None and load > max_load:
+                return f"load average per CPU {load:.2f} is above {max_load:.2f}"
+
+        if config.min_free_memory:
+            available = get_available_memory()
+            if available is not None and available < config.min_free_memory * MB:
+                return (
+                    f"available memory {available // MB} MB is below "
+                    f"{config.min_free_memory} MB"
+                )
+
+        return None
+
+    def _register(self, last_change: float) -> None:
+        try:
+            self.lock_dir.mkdir(parents=True)
+        except FileExistsError:
+            pass
+        else:
+            self.lock_dir.chmod(0o1777)
+        self._ticket.write_text(repr(last_change))
+
+    def _waiting(self) -> List[Tuple[float, int]]:
+        tickets = []
+
+        for path in self.lock_dir.glob("waiting-*.ticket"):
+            try:
+                pid = int(path.stem.split("-", 1)[1])
+                last_change = float(path.read_text())
+            except (OSError, ValueError):
+                continue
+
+            if not _is_alive(pid):
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError:
+                    # Left by another user
+                    pass
+                continue
+
+            tickets.append((last_change, -pid))
+
+        return tickets
+
+    def _has_priority(self, last_change: float) -> bool:
+        waiting = self._waiting()
+        if not waiting:
+            return True
+        return max(waiting) <= (last_change, -os.getpid())
+
+    def _lock_slot(self, slots: int) -> Optional[Slot]:
+        assert fcntl is not None
+
+        for i in range(slots):
+            fd = _open_slot(self.lock_dir.joinpath(f"slot-{i}.lock"))
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            return Slot(fd)
+
+        return None
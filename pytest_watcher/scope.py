@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import configparser
+import importlib.util
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from .config import Config
+from .rescan import PRUNED_DIRS
+
+try:
+    import tomllib
+except ImportError:
+    import tomli as tomllib
+
+DEFAULT_PATTERNS = ["*.py"]
+
+# Files that pytest reads its configuration from, in the order of precedence
+PYTEST_INI_FILES = (
+    "pytest.ini",
+    ".pytest.ini",
+    "pyproject.toml",
+    "tox.ini",
+    "setup.cfg",
+)
+INI_SECTIONS = {"tox.ini": "pytest", "setup.cfg": "tool:pytest"}
+
+
+@dataclass
+class WatchScope:
+    """
+    Directories to watch recursively, each with the reason it is watched.
+    The files directly in `root` (conftest.py, ini files) are watched as well.
+    """
+
+    root: Path
+    paths: List[Tuple[Path, str]] = field(default_factory=list)
+    patterns: List[str] = field(default_factory=lambda: list(DEFAULT_PATTERNS))
+
+    @property
+    def is_narrowed(self) -> bool:
+        return [p for p, _ in self.paths] != [self.root]
+
+    def describe(self) -> str:
+        lines = [f"  {path.absolute()} ({reason})\n" for path, reason in self.paths]
+        if self.is_narrowed:
+            lines.append(f"  {self.root.absolute()} (top-level files only)\n")
+        return "".join(lines)
+
+
+def derive_scope(config: Config) -> WatchScope:
+    """
+    Find the directories worth watching: the paths given in `watch_paths`,
+    or the pytest `testpaths` along with the project packages. Without
+    either, the whole project path is watched.
+    """
+    root = config.path
+    scope = WatchScope(root=root)
+
+    if config.watch_paths:
+        scope.paths = [(root.joinpath(p), "watch_paths") for p in config.watch_paths]
+        return scope
+
+    ini = find_pytest_ini(root.absolute())
+    if ini is not None:
+        scope.patterns = [*DEFAULT_PATTERNS, ini.name]
+
+    testpaths = read_testpaths(ini) if ini is not None else []
+    # pytest collects from the whole rootdir when testpaths is not set
+    paths = [(p, "testpaths") for p in testpaths if _is_within(p, root)]
+    if not paths:
+        scope.paths = [(root, "project path")]
+        return scope
+
+    tests = [p for p, _ in paths]
+    for package in find_packages(root):
+        if not any(_is_within(package, t) for t in tests):
+            paths.append((package, f"package {package.name}"))
+
+    scope.paths = _remove_nested(paths)
+    return scope
+
+
+def find_pytest_ini(path: Path) -> Optional[Path]:
+    """Locate the pytest configuration file the way pytest does for `path`"""
+    for directory in (path, *path.parents):
+        for name in PYTEST_INI_FILES:
+            candidate = directory.joinpath(name)
+            if candidate.is_file() and _has_pytest_section(candidate):
+                return candidate
+    return None
+
+
+def read_ini_option(ini: Path, name: str) -> List[str]:
+    """Value of a pytest option that takes a list of arguments"""
+    if ini.name == "pyproject.toml":
+        options = _read_toml(ini).get("tool", {}).get("pytest", {})
+        value = options.get("ini_options", {}).get(name, [])
+        return value.split() if isinstance(value, str) else list(value)
+
+    parser = _read_ini(ini)
+    section = INI_SECTIONS.get(ini.name, "pytest")
+    return parser.get(section, name, fallback="").split()
+
+
+def read_testpaths(ini: Path) -> List[Path]:
+    paths: List[Path] = []
+    for name in read_ini_option(ini, "testpaths"):
+        if re.search(r"[*?\[]", name):
+            paths.extend(sorted(p for p in ini.parent.glob(name) if p.is_dir()))
+        else:
+            paths.append(ini.parent.joinpath(name))
+
+    return [p for p in paths if p.exists()]
+
+
+class PytestCache:
+    """
+    The values the pytest cacheprovider writes after every run, in the cache
+    directory of the rootdir pytest picks for `path`
+    """
+
+    def __init__(self, path: Path):
+        self.path = path.absolute()
+        ini = find_pytest_ini(self.path)
+        self.rootdir = ini.parent if ini is not None else self.path
+        cache_dir = read_ini_option(ini, "cache_dir") if ini is not None else []
+        self.directory = self.rootdir.joinpath(
+            os.path.expandvars(cache_dir[0]) if cache_dir else ".pytest_cache"
+        )
+
+    def file(self, key: str) -> Path:
+        return self.directory.joinpath("v", key)
+
+    def read(self, key: str) -> Any:
+        """The value of `key`, such as "cache/lastfailed", none if missing"""
+        try:
+            with self.file(key).open() as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def node_id(self, node_id: str) -> str:
+        """The node ID, relative to the rootdir, relative to `path` instead"""
+        if self.rootdir == self.path:
+            return node_id
+        file, sep, rest = node_id.partition("::")
+        file = os.path.relpath(self.rootdir.joinpath(file), self.path)
+        return file.replace(os.sep, "/") + sep + rest
+
+
+def find_packages(root: Path) -> List[Path]:
+    """
+    Import locations of the project packages that are inside `root`. Without
+    packaging metadata or a src layout, every top-level directory that may
+    hold sources, namespace packages and plain directories included.
+    """
+    name = _read_toml(root.joinpath("pyproject.toml")).get("project", {}).get("name")
+    if name:
+        location = _find_package_location(re.sub(r"[-.]+", "_", name))
+        if location is not None and _is_within(location, root):
+            return [location]
+
+    base = root.joinpath("src")
+    if base.is_dir():
+        return [base]
+
+    directories = sorted(
+        p
+        for p in root.iterdir()
+        if p.is_dir() and not p.name.startswith(".") and p.name not in PRUNED_DIRS
+    )
+    logging.info(
+        "No package found in the packaging metadata, watching the top-level "
+        f"directories: {', '.join(p.name for p in directories) or 'none'}"
+    )
+    return directories
+
+
+def _find_package_location(name: str) -> Optional[Path]:
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    return Path(next(iter(spec.submodule_search_locations))).absolute()
+
+
+def _has_pytest_section(path: Path) -> bool:
+    if path.name in ("pytest.ini", ".pytest.ini"):
+        return True
+    if path.name == "pyproject.toml":
+        return "ini_options" in _read_toml(path).get("tool", {}).get("pytest", {})
+    return _read_ini(path).has_section(INI_SECTIONS[path.name])
+
+
+def _read_toml(path: Path) -> dict:
+    try:
+        with path.open("rb") as f:
+            return tomllib.load(f)
+    except (OSError, tomllib.TOMLDecodeError):
+        return {}
+
+
+def _read_ini(path: Path) -> configparser.ConfigParser:
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        parser.read(path)
+    except configparser.Error:
+        pass
+    return parser
+
+
+def _is_within(path: Path, parent: Path) -> bool:
+    path, parent = Path(os.path.abspath(path)), Path(os.path.abspath(parent))
+    return path == parent or parent in path.parents
+
+
+def _remove_nested(paths: List[Tuple[Path, str]]) -> List[Tuple[Path, str]]:
+    result: List[Tuple[Path, str]] = []
+    for path, reason in paths:
+        if any(_is_within(path, p) for p, _ in result):
+            continue
+        result = [(p, r) for p, r in result if not _is_within(p, path)]
+        result.append((path, reason))
+    return result
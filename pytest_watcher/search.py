@@ -0,0 +1,134 @@
+"""
+Search index of the test node IDs, narrowing runs by test name.
+
+The IDs are the ones pytest keeps in its cache from the previous runs, so
+that the index is ready without collecting the tests.
+"""
+
+from __future__ import annotations
+
+import bisect
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .scope import PytestCache
+
+NODE_IDS_KEY = "cache/nodeids"
+
+_load_cache: Dict[Path, Tuple[Tuple[int, int], TestIndex]] = {}
+
+
+class TestIndex:
+    """Substring and fuzzy matching over node IDs"""
+
+    # Not a test class
+    __test__ = False
+
+    def __init__(self, node_ids: Sequence[str]):
+        self.node_ids = list(node_ids)
+        # Searched on every keystroke, lowercased and joined once
+        self._keys = [node_id.lower() for node_id in self.node_ids]
+        self._text = "\n".join(self._keys)
+        self._offsets: List[int] = []
+        offset = 0
+        for key in self._keys:
+            self._offsets.append(offset)
+            offset += len(key) + 1
+
+        self._file_sizes: Dict[str, int] = {}
+        for node_id in self.node_ids:
+            path = _file_of(node_id)
+            self._file_sizes[path] = self._file_sizes.get(path, 0) + 1
+
+        # The matches of the previous query, narrowed down as it is typed
+        self._last: Optional[Tuple[str, List[int]]] = None
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    @classmethod
+    def load(cls, root: Path) -> TestIndex:
+        """The index of the node IDs in the pytest cache of the project at `root`"""
+        cache = PytestCache(root)
+        path = cache.file(NODE_IDS_KEY)
+        try:
+            stat = path.stat()
+        except OSError:
+            return cls([])
+
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = _load_cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        data = cache.read(NODE_IDS_KEY)
+        node_ids = [cache.node_id(n) for n in data] if isinstance(data, list) else []
+
+        # The cache keeps the tests of the files removed since
+        existing: Dict[str, bool] = {}
+        for node_id in node_ids:
+            file = _file_of(node_id)
+            if file not in existing:
+                existing[file] = cache.path.joinpath(file).exists()
+
+        index = cls([node_id for node_id in node_ids if existing[_file_of(node_id)]])
+        _load_cache[path] = (key, index)
+        return index
+
+    def search(self, query: str) -> List[str]:
+        """
+        The node IDs containing every word of the query. When there are none,
+        the ones with the letters of every word in order, within a part of the
+        ID: a directory, the file, the class or the function.
+        """
+        terms = query.lower().split()
+        if not terms:
+            return []
+
+        matches = self._search_substrings(" ".join(terms), terms)
+        if not matches:
+            matches = self._search_fuzzy(terms)
+        return [self.node_ids[i] for i in matches]
+
+    def resolve(self, node_ids: Sequence[str]) -> List[str]:
+        """Runner args selecting the tests, whole files by their path"""
+        per_file: Dict[str, List[str]] = {}
+        for node_id in node_ids:
+            per_file.setdefault(_file_of(node_id), []).append(node_id)
+
+        args: List[str] = []
+        for path, file_node_ids in per_file.items():
+            if len(file_node_ids) == self._file_sizes.get(path):
+                args.append(path)
+            else:
+                args.extend(file_node_ids)
+        return args
+
+    def _search_substrings(self, query: str, terms: List[str]) -> List[int]:
+        candidates: Sequence[int] = range(len(self._keys))
+        # A longer query only matches a subset of the previous matches
+        if self._last is not None and query.startswith(self._last[0]):
+            candidates = self._last[1]
+
+        matches = [i for i in candidates if all(term in self._keys[i] for term in terms)]
+        self._last = (query, matches)
+        return matches
+
+    def _search_fuzzy(self, terms: List[str]) -> List[int]:
+        matches: Optional[set] = None
+
+        for term in terms:
+            pattern = re.compile("[^\n/:]*?".join(re.escape(char) for char in term))
+            found = {
+                bisect.bisect_right(self._offsets, match.start()) - 1
+                for match in pattern.finditer(self._text)
+            }
+            matches = found if matches is None else matches & found
+
+        return sorted(matches or ())
+
+
+def _file_of(node_id: str) -> str:
+    return node_id.split("::", 1)[0].replace("/", os.sep)
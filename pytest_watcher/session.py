@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Set
+
+from . import runner
+from .agent import RemoteRunner
+from .config import Config
+from .datadeps import DataDependencies
+from .environment import PreparedRunner, RunnerEnvironment
+from .flaky import FlakyTracker
+from .git import FileIndex
+from .hooks import PluginManager
+from .pipeline import StageRun, parse_stages, run_stages
+from .profiling import Profiler
+from .replay import Recorder
+from .resources import HISTORY_SIZE, SessionStats, Usage
+from .runner import RunResult
+from .scheduler import Scheduler
+from .state import StateStore
+from .tiers import Classifier
+
+RESULTS_HISTORY_SIZE = 1000
+
+
+@dataclass
+class Session:
+    """State kept by the watcher between test runs"""
+
+    stats: SessionStats = field(default_factory=SessionStats)
+    profiler: Profiler = field(default_factory=Profiler)
+    scheduler: Scheduler = field(default_factory=Scheduler)
+    # Paths changed since the previous run, for the run in progress
+    changes: Set[str] = field(default_factory=set)
+    index: FileIndex = field(default_factory=FileIndex)
+    # Decides which tests a change set affects, set up with the observer
+    classifier: Optional[Classifier] = None
+    last_result: Optional[RunResult] = None
+    last_finished: float = 0.0
+    # Persisted state of the project, none when nothing is kept across restarts
+    state: Optional[StateStore] = None
+    environment: RunnerEnvironment = field(default_factory=RunnerEnvironment)
+    plugins: PluginManager = field(default_factory=PluginManager)
+    # Outcome history of the tests, with --retry-flaky
+    flaky: FlakyTracker = field(default_factory=FlakyTracker)
+    # Files read by the tests, with --learn-test-inputs
+    data_deps: Optional[DataDependencies] = None
+    # Changes made while focused on a single test, run once it passes
+    focus_changes: Set[str] = field(default_factory=set)
+    # Agent running the tests elsewhere, none to run them locally
+    remote: Optional[RemoteRunner] = None
+    # Events and runs are written to it with --record
+    recorder: Optional[Recorder] = None
+
+    @classmethod
+    def restore(cls, path: Path) -> Session:
+        """Create a session resuming from the state saved by the previous one"""
+        state = StateStore.for_project(path)
+        session = cls(state=state, plugins=PluginManager.discover())
+
+        session.index.restore(state.get("file_index", {}))
+        session.flaky = FlakyTracker(state.get("test_history", {}))
+        session.data_deps = DataDependencies(path, state.get("test_inputs"))
+
+        for entry in state.get("results", [])[-HISTORY_SIZE:]:
+            session.stats.runs.append(Usage(**entry["usage"]))
+
+        return session
+
+    def prepare_runner(self, config: Config) -> PreparedRunner:
+        if self.remote is not None:
+            # The runner is resolved in the environment of the agent
+            return PreparedRunner([config.runner], {})
+        return self.environment.prepare(config)
+
+    def run(self, command: List[str], **kwargs: Any) -> RunResult:
+        """Run the command with the agent if there is one, `runner.run` otherwise"""
+        if self.remote is not None:
+            return self.remote.run(command, **kwargs)
+        return runner.run(command, **kwargs)
+
+    def run_stages(
+        self, config: Config, changes: Set[str], write: Callable[[str], Any]
+    ) -> Optional[StageRun]:
+        """
+        Run the pipeline stages of the config, writing their output and outcome.
+        Returns the stage that failed, if any.
+        """
+        stages = parse_stages(config.stages)
+        prepared = self.prepare_runner(config)
+
+        def run(command, on_output, on_start) -> RunResult:
+            return self.run(
+                command, on_output=on_output, on_start=on_start, base_env=prepared.env
+            )
+
+        def on_finished(stage_run: StageRun) -> None:
+            assert stage_run.command is not None and stage_run.result is not None
+            write("".join(stage_run.output))
+            write(
+                f"[ptw] {stage_run.stage.name} {stage_run.status} in "
+                f"{stage_run.result.duration:.2f}s: {' '.join(stage_run.command)}\n"
+            )
+
+        # The agent runs one command at a time
+        workers = 1 if self.remote is not None else len(stages)
+        stage_runs = run_stages(
+            stages, changes, run, workers, on_finished, root=str(config.path)
+        )
+
+        skipped = [r.stage.name for r in stage_runs if r.status == "skipped"]
+        if skipped:
+            write(f"[ptw] Skipped, no relevant change: {', '.join(skipped)}\n")
+
+        failed = next((r for r in stage_runs if r.status == "failed"), None)
+        if failed is None:
+            return None
+
+        assert failed.result is not None
+        write(f"\n[ptw] Stage {failed.stage.name} failed, the tests did not run\n")
+        # The outcome of the run, but not a test run to keep in the history
+        self.last_result = failed.result
+        self.last_finished = time.time()
+        return failed
+
+    def record(self, result: RunResult) -> List[str]:
+        """Add the result to the history. Returns the resource usage warnings"""
+        warnings = self.stats.add(result.usage) + self.plugins.take_warnings()
+        if self.recorder is not None:
+            self.recorder.record_run(result.duration)
+        self.last_result = result
+        self.last_finished = time.time()
+
+        if self.state is not None:
+            usage = asdict(result.usage)
+            usage["rss_samples"] = []
+
+            results = self.state.get("results", [])
+            results.append(
+                {
+                    "time": time.time(),
+                    "returncode": result.returncode,
+                    "changes": len(self.changes),
+                    "usage": usage,
+                }
+            )
+            self.state.set("results", results[-RESULTS_HISTORY_SIZE:])
+            self.state.save()
+
+        return warnings
+
+    def save(self) -> None:
+        if self.state is None:
+            return
+
+        self.state.set("file_index", self.index.dump())
+        if self.flaky.history:
+            self.state.set("test_history", self.flaky.dump())
+        if self.data_deps is not None and self.data_deps.dirty:
+            self.state.set("test_inputs", self.data_deps.dump())
+        self.state.save()
+
+    def close(self) -> None:
+        self.save()
+        if self.remote is not None:
+            self.remote.close()
+        if self.recorder is not None:
+            self.recorder.close()
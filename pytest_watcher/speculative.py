@@ -0,0 +1,106 @@
+"""
+Speculative runs: a file-triggered run starts on the first change instead
+of once the delay is over. Changes arriving within the delay that affect
+the run cancel it, so that it restarts with them. The others leave it
+running and get a run of their own.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import subprocess
+import threading
+import time
+from typing import List, Optional, Set
+
+from .constants import LOOP_DELAY
+from .tiers import Classifier
+from .trigger import RunRequest, Trigger
+
+
+class SpeculativeGuard:
+    """
+    Watches the changes made while a speculative run is in progress, until
+    the delay of the changes that started it is over.
+    """
+
+    def __init__(
+        self,
+        trigger: Trigger,
+        request: RunRequest,
+        classifier: Optional[Classifier] = None,
+        affected: bool = False,
+        interval: float = LOOP_DELAY,
+    ):
+        self._trigger = trigger
+        self._classifier = classifier
+        self._interval = interval
+        self._until = time.time() + trigger.delay
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Tests run by the speculative run, None for the whole suite
+        self._targets: Optional[Set[str]] = None
+        if affected and classifier is not None:
+            selected = classifier.select(request.changes)
+            if selected is not None:
+                self._targets = {os.path.abspath(t) for t in selected}
+
+        self.cancelled_by: Optional[str] = None
+        # Changes within the delay that do not affect the run
+        self.unrelated: Set[str] = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancelled_by is not None
+
+    def affects(self, path: str) -> bool:
+        if self._targets is None or self._classifier is None:
+            return True
+
+        change = self._classifier.classify(path)
+        if change.targets is None:
+            return True
+        return any(
+            _overlaps(t, target) for t in change.targets for target in self._targets
+        )
+
+    def on_start(self, proc: subprocess.Popen) -> None:
+        self._thread = threading.Thread(
+            target=self._watch, args=(proc,), name="ptw-speculative", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _watch(self, proc: subprocess.Popen) -> None:
+        while not self._stopped.wait(self._interval):
+            affecting = self._check(self._trigger.changes)
+            if affecting:
+                self.cancelled_by = affecting[0]
+                proc.terminate()
+                return
+
+            if time.time() > self._until:
+                return
+
+    def _check(self, changes: Set[str]) -> List[str]:
+        affecting = []
+        for path in sorted(changes - self.unrelated):
+            if self.affects(path):
+                affecting.append(path)
+            else:
+                self.unrelated.add(path)
+
+        if affecting:
+            logging.debug(f"Speculative run affected by {', '.join(affecting)}")
+        return affecting
+
+
+def _overlaps(a: str, b: str) -> bool:
+    """Whether the paths are the same, or one contains the other"""
+    return a == b or a.startswith(b + os.sep) or b.startswith(a + os.sep)
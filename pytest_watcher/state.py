@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+import struct
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Set
+
+from .cache import get_cache_dir
+
+# Bump when the layout of any section changes, older state is then discarded
+STATE_VERSION = 1
+
+MAGIC = b"PTWSTATE"
+HEADER = struct.Struct("<8sH")
+
+
+class StateStore:
+    """
+    Watcher state persisted between restarts, under the project cache directory.
+
+    Every section is stored in its own file and loaded on first access, so
+    that a section that is not needed does not slow down the startup.
+    Sections that fail to load (corrupted, written by another version)
+    are discarded and rebuilt from scratch.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._sections: Dict[str, Any] = {}
+        self._dirty: Set[str] = set()
+
+    @classmethod
+    def for_project(cls, path: Path) -> StateStore:
+        return cls(get_cache_dir(path).joinpath("state"))
+
+    def get(self, name: str, default: Any = None) -> Any:
+        if name not in self._sections:
+            self._sections[name] = self._load(name, default)
+        return self._sections[name]
+
+    def set(self, name: str, value: Any) -> None:
+        self._sections[name] = value
+        self._dirty.add(name)
+
+    def save(self) -> None:
+        """Write the sections modified since the last save"""
+        for name in sorted(self._dirty):
+            try:
+                self._write(name, self._sections[name])
+            except OSError as exc:
+                logging.warning(f"Unable to save watcher state {name!r}: {exc}")
+        self._dirty.clear()
+
+    def clear(self) -> None:
+        self._sections.clear()
+        self._dirty.clear()
+
+        for path in self.directory.glob("*.state"):
+            path.unlink(missing_ok=True)
+
+    def _path(self, name: str) -> Path:
+        return self.directory.joinpath(f"{name}.state")
+
+    def _load(self, name: str, default: Any) -> Any:
+        path = self._path(name)
+
+        try:
+            with path.open("rb") as f:
+                data = f.read()
+        except OSError:
+            return default
+
+        try:
+            magic, version = HEADER.unpack_from(data)
+            if magic != MAGIC:
+                raise ValueError("not a state file")
+            if version != STATE_VERSION:
+                logging.debug(f"Discarding state {name!r} of version {version}")
+                return default
+            return pickle.loads(data[HEADER.size :])
+        except Exception as exc:
+            # Unpickling a damaged file may raise nearly any exception
+            logging.warning(f"Discarding corrupted watcher state {name!r}: {exc!r}")
+            path.unlink(missing_ok=True)
+            return default
+
+    def _write(self, name: str, value: Any) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f".{name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(HEADER.pack(MAGIC, STATE_VERSION))
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # The rename is atomic, readers see either the old or the new state
+            os.replace(tmp, self._path(name))
+        except BaseException:
+            os.unlink(tmp)
+            raise
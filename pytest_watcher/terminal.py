@@ -1,9 +1,15 @@
 import abc
 import logging
 import os
-import select
+import shutil
 import sys
-from typing import List, Optional
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
+
+from .keys import KeyReader, LineEditor, is_printable
+from .trigger import RunRequest
 
 try:
     import termios
@@ -13,6 +19,125 @@ except ImportError:
 
 BEL_SYMBOL: str = "\a"
 
+# Move the cursor home and erase the display, cheaper than a full reset
+CLEAR_SCREEN = "\033[H\033[2J"
+ERASE_LINE_END = "\033[K"
+
+# Minimal interval between two redraws of the status line, in seconds
+STATUS_INTERVAL = 0.25
+
+
+def format_elapsed(seconds: float) -> str:
+    seconds = int(max(seconds, 0))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m"
+    return f"{seconds // 3600}h"
+
+
+@dataclass
+class Status:
+    state: str = "watching"
+    runner_args: List[str] = field(default_factory=list)
+    test_filter: str = ""
+    returncode: Optional[int] = None
+    flaky: bool = False
+    duration: float = 0.0
+    finished: float = 0.0
+    queued: int = 0
+
+    def render(self, now: float) -> str:
+        parts = [f"[ptw] {self.state}"]
+
+        if self.returncode is not None:
+            result = "passed" if self.returncode == 0 else "failed"
+            if self.flaky:
+                result = "flaky"
+            parts.append(
+                f"last run {result} in {self.duration:.1f}s, "
+                f"{format_elapsed(now - self.finished)} ago"
+            )
+        if self.queued:
+            parts.append(f"{self.queued} queued")
+        if self.runner_args:
+            parts.append(f"args: {' '.join(self.runner_args)}")
+        if self.test_filter:
+            parts.append(f"filter: {self.test_filter}")
+
+        parts.append("w: menu")
+        return " | ".join(parts)
+
+
+class StatusLine:
+    """
+    A line kept below the output and redrawn in place.
+
+    Only the part that differs from the line on the screen is written,
+    and redraws are rate limited, so that it stays cheap over slow links.
+    """
+
+    def __init__(self, stream: TextIO, interval: float = STATUS_INTERVAL):
+        self._stream = stream
+        self._interval = interval
+        self._text: Optional[str] = None
+        self._cursor: Optional[int] = None
+        self._drawn_at = 0.0
+        # Log records are written from the observer threads
+        self._lock = threading.Lock()
+
+    def draw(self, text: str, cursor: Optional[int] = None, force: bool = False) -> None:
+        """
+        Draw the line, leaving the cursor at the `cursor` column if given.
+        `force` bypasses the rate limit, for the echo of the typed keys.
+        """
+        width = shutil.get_terminal_size().columns
+        # Never fill the last column, the line would wrap on some terminals
+        text = text[: max(width - 1, 0)]
+        if cursor is not None and cursor >= len(text):
+            cursor = None
+
+        with self._lock:
+            if text == self._text and cursor == self._cursor:
+                return
+
+            now = time.monotonic()
+            if (
+                not force
+                and self._text is not None
+                and now - self._drawn_at < self._interval
+            ):
+                return
+
+            common = 0
+            if self._text is not None:
+                common = len(os.path.commonprefix([self._text, text]))
+
+            move = f"\033[{common}C" if common else ""
+            position = ""
+            if cursor is not None:
+                position = f"\r\033[{cursor}C" if cursor else "\r"
+            self._stream.write(f"\r{move}{text[common:]}{ERASE_LINE_END}{position}")
+            self._stream.flush()
+
+            self._text = text
+            self._cursor = cursor
+            self._drawn_at = now
+
+    def erase(self) -> None:
+        with self._lock:
+            if self._text is None:
+                return
+
+            self._stream.write(f"\r{ERASE_LINE_END}")
+            self._stream.flush()
+            self._text = None
+
+    def erase_before_log(self, record: logging.LogRecord) -> bool:
+        """Logging filter that makes room for the record on the screen"""
+        self.erase()
+        return True
+
 
 class Terminal(abc.ABC):
     def clear(self):
@@ -38,13 +163,40 @@ class Terminal(abc.ABC):
             if command.show_in_menu:
                 self.print(f"> {command.caption.ljust(5)} : {command.description}\n")
 
+    def print_pending(self, requests: List[RunRequest]) -> None:
+        if not requests:
+            return
+
+        self.print("\n[ptw] Pending runs:\n")
+        for request in requests:
+            self.print(f"> {request.describe()}\n")
+
     def print_bell(self) -> None:
         pass
 
+    def update_status(self, status: Status) -> None:
+        pass
+
     def enter_capturing_mode(self) -> None:
         pass
 
-    def capture_keystroke(self) -> Optional[str]:
+    def read_keys(self) -> List[str]:
+        """The keys pressed since the previous call, except those typed in a line"""
+        return []
+
+    def edit_line(
+        self,
+        prompt: str,
+        on_submit: Callable[[str], None],
+        text: str = "",
+        history: str = "",
+        hint: Optional[Callable[[str], str]] = None,
+    ) -> None:
+        """
+        Let the user enter a line, without blocking. `on_submit` is called with
+        it from `read_keys`. Lines sharing a `history` name are recalled with
+        the arrow keys. `hint` gives the text shown after the line as it is typed.
+        """
         pass
 
     def reset(self) -> None:
@@ -54,14 +206,33 @@ class Terminal(abc.ABC):
 class PosixTerminal(Terminal):
     def __init__(self) -> None:
         self._initial_state = termios.tcgetattr(sys.stdin.fileno())
+        self._status_line = StatusLine(sys.stdout)
+        self._reader = KeyReader(sys.stdin.fileno())
+        self._editor: Optional[LineEditor] = None
+        self._on_submit: Optional[Callable[[str], None]] = None
+        self._hint: Optional[Callable[[str], str]] = None
+        self._hint_cache: Optional[Tuple[str, str]] = None
+        self._histories: Dict[str, List[str]] = {}
+
+        for handler in logging.getLogger().handlers:
+            handler.addFilter(self._status_line.erase_before_log)
 
     def print(self, msg: str) -> None:
+        self._status_line.erase()
         sys.stdout.write(msg)
 
     def clear(self) -> None:
-        sys.stdout.write("\033c")
+        self._status_line.erase()
+        sys.stdout.write(CLEAR_SCREEN)
         sys.stdout.flush()
 
+    def update_status(self, status: Status) -> None:
+        if self._editor is not None:
+            # The line being edited takes the place of the status
+            self._draw_editor(force=False)
+            return
+        self._status_line.draw(status.render(time.time()))
+
     def print_bell(self) -> None:
         sys.stdout.write(BEL_SYMBOL)
         sys.stdout.flush()
@@ -70,12 +241,59 @@ class PosixTerminal(Terminal):
         sys.stdin.flush()
         tty.setcbreak(sys.stdin.fileno())
 
-    def capture_keystroke(self) -> Optional[str]:
-        if select.select([sys.stdin], [], [], 0)[0]:
-            return sys.stdin.read(1)
-        return None
+    def read_keys(self) -> List[str]:
+        keys = self._reader.read()
+
+        if self._editor is None:
+            if sum(1 for key in keys if is_printable(key)) > 1:
+                # Pasted text, or keys typed during a run: not meant as commands
+                logging.debug(f"Ignored input: {''.join(keys)!r}")
+                return []
+            return keys
+
+        for key in keys:
+            line = self._editor.feed(key)
+            if self._editor.done:
+                on_submit = self._on_submit
+                self._editor = self._on_submit = self._hint = None
+                self._status_line.erase()
+                if line is not None and on_submit is not None:
+                    on_submit(line)
+                # The rest belongs to whatever comes after the line
+                break
+        else:
+            self._draw_editor()
+
+        return []
+
+    def edit_line(
+        self,
+        prompt: str,
+        on_submit: Callable[[str], None],
+        text: str = "",
+        history: str = "",
+        hint: Optional[Callable[[str], str]] = None,
+    ) -> None:
+        self._editor = LineEditor(prompt, self._histories.setdefault(history, []), text)
+        self._on_submit = on_submit
+        self._hint = hint
+        self._hint_cache = None
+        self._draw_editor()
+
+    def _draw_editor(self, force: bool = True) -> None:
+        assert self._editor is not None
+        line, cursor = self._editor.render()
+        if self._hint is not None:
+            # Redraws without a key pressed reuse the hint of the same text
+            text = self._editor.text
+            if self._hint_cache is None or self._hint_cache[0] != text:
+                self._hint_cache = (text, self._hint(text))
+            line += self._hint_cache[1]
+        self._status_line.draw(line, cursor, force=force)
 
     def reset(self) -> None:
+        # The runner output starts on a clean line
+        self._status_line.erase()
         termios.tcsetattr(sys.stdin, termios.TCSADRAIN, self._initial_state)
 
 
@@ -84,6 +302,9 @@ class DummyTerminal(Terminal):
 
 
 def get_terminal() -> Terminal:
+    if not sys.stdout.isatty():
+        return DummyTerminal()
+
     if os.name == "posix":
         try:
             return PosixTerminal()
@@ -0,0 +1,164 @@
+"""
+Classification of the changed files by how much of the test suite they
+can affect, and selection of the tests to rerun for a change set.
+"""
+
+from __future__ import annotations
+
+import enum
+import fnmatch
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from .config import Config
+from .datadeps import DataDependencies
+from .hooks import PluginManager
+from .runner import is_pytest_runner, split_args
+from .scope import PYTEST_INI_FILES, find_pytest_ini, read_ini_option
+from .trigger import SOURCE_FILE, RunRequest
+
+DEFAULT_PYTHON_FILES = ["test_*.py", "*_test.py"]
+
+
+class Tier(enum.Enum):
+    TEST = "test file"
+    SOURCE = "source module"
+    CONFTEST = "conftest"
+    CONFIG = "global config"
+    RESOURCE = "test input"
+    OTHER = "other"
+
+
+@dataclass(frozen=True)
+class Change:
+    path: str
+    tier: Tier
+    # Tests to rerun, None when the whole suite is affected
+    targets: Optional[Tuple[str, ...]]
+
+
+class Classifier:
+    """
+    Assigns a tier to every changed file:
+
+    - a test file affects only itself
+    - a conftest.py affects the tests in its directory, all of them at the root
+    - pytest configuration files affect the whole suite
+    - a test input declared in `test_inputs`, or learned from the runs,
+      affects the tests reading it
+    - source modules and anything else affect the whole suite, as there is
+      no way to tell which tests import them
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        test_inputs: Optional[Mapping[str, Sequence[str]]] = None,
+        python_files: Optional[List[str]] = None,
+        plugins: Optional[PluginManager] = None,
+        data_deps: Optional[DataDependencies] = None,
+    ):
+        self.root = Path(os.path.abspath(root))
+        self.test_inputs = {
+            os.path.join(self.root, pattern): [os.path.join(self.root, t) for t in tests]
+            for pattern, tests in (test_inputs or {}).items()
+        }
+        self.python_files = python_files or DEFAULT_PYTHON_FILES
+        self.plugins = plugins
+        self.data_deps = data_deps
+
+    @classmethod
+    def create(
+        cls,
+        root: Path,
+        test_inputs: Mapping[str, Sequence[str]],
+        plugins: Optional[PluginManager] = None,
+        data_deps: Optional[DataDependencies] = None,
+    ) -> Classifier:
+        ini = find_pytest_ini(Path(os.path.abspath(root)))
+        python_files = read_ini_option(ini, "python_files") if ini else None
+        return cls(root, test_inputs, python_files, plugins, data_deps)
+
+    def is_test_input(self, path: str) -> bool:
+        return bool(self._input_targets(os.path.abspath(path)))
+
+    def classify(self, path: str) -> Change:
+        path = os.path.abspath(path)
+        name = os.path.basename(path)
+
+        targets = self._input_targets(path)
+        if targets:
+            return Change(path, Tier.RESOURCE, tuple(targets))
+
+        if name in PYTEST_INI_FILES:
+            return Change(path, Tier.CONFIG, None)
+
+        if name == "conftest.py":
+            directory = os.path.dirname(path)
+            if Path(directory) in (self.root, *self.root.parents):
+                return Change(path, Tier.CONFTEST, None)
+            return Change(path, Tier.CONFTEST, (directory,))
+
+        if any(fnmatch.fnmatch(name, p) for p in self.python_files):
+            return Change(path, Tier.TEST, (path,))
+
+        if name.endswith(".py"):
+            return Change(path, Tier.SOURCE, None)
+
+        return Change(path, Tier.OTHER, None)
+
+    def select(self, paths: Iterable[str]) -> Optional[List[str]]:
+        """
+        Tests to rerun after the given changes, relative to the current
+        directory. None stands for the whole suite.
+        """
+        targets: Set[str] = set()
+
+        for path in paths:
+            selected = self.plugins.select_tests(path) if self.plugins else None
+            if selected is not None:
+                targets.update(os.path.abspath(t) for t in selected)
+                continue
+
+            change = self.classify(path)
+            if change.targets is None:
+                return None
+            targets.update(change.targets)
+
+        # Removed test files have nothing left to run
+        existing = [t for t in targets if os.path.exists(t)]
+        if not existing:
+            return None
+
+        return sorted(os.path.relpath(t) for t in existing)
+
+    def _input_targets(self, path: str) -> List[str]:
+        targets: List[str] = []
+        for pattern, tests in self.test_inputs.items():
+            if fnmatch.fnmatch(path, pattern):
+                targets.extend(tests)
+        if self.data_deps is not None:
+            targets.extend(self.data_deps.targets(path))
+        return targets
+
+
+def select_tests(
+    config: Config, request: RunRequest, classifier: Optional[Classifier]
+) -> List[str]:
+    """Test paths to append to the runner args of a file-triggered run"""
+    if (
+        not config.affected
+        or classifier is None
+        or request.source != SOURCE_FILE
+        or not is_pytest_runner(config.runner)
+    ):
+        return []
+
+    # Paths given by the user already select the tests to run
+    _, positional = split_args(request.args or ())
+    if positional:
+        return []
+
+    return classifier.select(request.changes) or []
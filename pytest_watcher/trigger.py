@@ -1,30 +1,175 @@
+from __future__ import annotations
+
 import threading
 import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional, Sequence, Set, Tuple
+
+SOURCE_FILE = "file"
+SOURCE_MANUAL = "manual"
+SOURCE_CLIENT = "client"
+
+
+@dataclass
+class RunRequest:
+    # None stands for the runner args in effect when the run starts
+    args: Optional[Tuple[str, ...]]
+    source: str
+    changes: Set[str] = field(default_factory=set)
+
+    def describe(self) -> str:
+        parts = [self.source]
+        if self.args:
+            parts.append(f"[{' '.join(self.args)}]")
+        if self.changes:
+            parts.append(f"{len(self.changes)} changed files")
+        return " ".join(parts)
+
+
+class RunQueue:
+    """
+    Explicitly requested runs in the order of execution.
+
+    Requests with the same args are merged, as one run covers both.
+    """
+
+    def __init__(self) -> None:
+        self._requests: List[RunRequest] = []
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def __iter__(self):
+        return iter(list(self._requests))
+
+    def push(self, request: RunRequest) -> RunRequest:
+        for queued in self._requests:
+            if queued.args == request.args:
+                queued.changes |= request.changes
+                return queued
+
+        self._requests.append(request)
+        return request
+
+    def pop(self) -> Optional[RunRequest]:
+        if not self._requests:
+            return None
+        return self._requests.pop(0)
 
 
 class Trigger:
+    """
+    Collects file changes, which start a run once no further change arrives
+    within `delay`, and explicit run requests, which start a run immediately
+    and take priority over the file changes.
+    """
+
     _value: float
     _lock: threading.Lock
 
-    def __init__(self, delay: float = 0.0):
+    def __init__(self, delay: float = 0.0, clock: Optional[Callable[[], float]] = None):
         self._lock = threading.Lock()
+        # Replays run on a simulated clock
+        self._clock = clock
         self._value = 0
         self._delay = delay
+        self.last_event = 0.0
+        self._changes: Set[str] = set()
+        self._queue = RunQueue()
+
+    @property
+    def delay(self) -> float:
+        return self._delay
+
+    @delay.setter
+    def delay(self, value: float) -> None:
+        with self._lock:
+            self._delay = value
 
-    def emit(self):
+    def emit(self, path: Optional[str] = None):
         with self._lock:
-            self._value = time.time() + self._delay
+            self.last_event = self._now()
+            self._value = self.last_event + self._delay
+            if path is not None:
+                self._changes.add(path)
 
-    def emit_now(self):
+    def emit_many(self, paths: Iterable[str]):
         with self._lock:
-            self._value = time.time()
+            self.last_event = self._now()
+            self._value = self.last_event + self._delay
+            self._changes.update(paths)
+
+    def add_changes(self, paths: Iterable[str]):
+        """Extend the change set without scheduling a run"""
+        with self._lock:
+            self._changes.update(paths)
+
+    def emit_now(
+        self, args: Optional[Sequence[str]] = None, source: str = SOURCE_MANUAL
+    ):
+        """Request a run with the given runner args, bypassing the delay"""
+        with self._lock:
+            self.last_event = self._now()
+            self._queue.push(
+                RunRequest(tuple(args) if args is not None else None, source)
+            )
+
+    @property
+    def changes(self) -> Set[str]:
+        return set(self._changes)
+
+    def take_changes(self) -> Set[str]:
+        """Return the paths changed since the last call and start a new change set"""
+        with self._lock:
+            changes, self._changes = self._changes, set()
+        return changes
+
+    def take_request(
+        self, runner_args: Sequence[str], early: bool = False
+    ) -> Optional[RunRequest]:
+        """
+        Return the next run to execute. A requested run also covers
+        the pending file changes, as they are already on the disk.
+        With `early`, file changes are taken before their delay is over.
+        """
+        with self._lock:
+            request = self._queue.pop()
+
+            if request is None:
+                if not (self._value > 0 if early else self._is_due()):
+                    return None
+                request = RunRequest(None, SOURCE_FILE)
+
+            if request.args is None:
+                request.args = tuple(runner_args)
+
+            request.changes |= self._changes
+            self._changes = set()
+            self._value = 0
+
+        return request
+
+    def pending(self) -> List[RunRequest]:
+        pending = list(self._queue)
+        if self._value:
+            pending.append(RunRequest(None, SOURCE_FILE, self.changes))
+        return pending
 
     def is_active(self):
-        return self._value != 0
+        return self._value != 0 or len(self._queue) > 0
 
     def release(self):
+        """Cancel the pending file-triggered run, requested runs stay queued"""
         with self._lock:
             self._value = 0
 
-    def check(self):
-        return self._value > 0 and time.time() > self._value
+    def check(self, early: bool = False):
+        if early:
+            return self.is_active()
+        return len(self._queue) > 0 or self._is_due()
+
+    def _now(self) -> float:
+        return self._clock() if self._clock is not None else time.time()
+
+    def _is_due(self) -> bool:
+        return self._value > 0 and self._now() > self._value
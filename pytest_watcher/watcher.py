@@ -1,66 +1,137 @@
 from __future__ import annotations
 
+import dataclasses
 import logging
 import subprocess
 import sys
 import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 from watchdog.observers import Observer
 
-from . import commands
+from . import batch, commands, daemon, inotify, runner
+from .agent import RemoteRunner
+from .cache import get_cache_dir
 from .config import Config
 from .constants import LOOP_DELAY, VERSION
-from .event_handler import EventHandler
+from .datadeps import read_test_inputs, runs_whole_suite
+from .environment import PreparedRunner
+from .event_handler import ConfigEventHandler, EventHandler
+from .flaky import MAX_RETRY_WORKERS, read_outcomes, relevance, retry
+from .focus import focused_args
+from .git import FileIndex, GitEventHandler, GitRepo, seed_changes
 from .parse import parse_arguments
-from .terminal import Terminal, get_terminal
-from .trigger import Trigger
+from .plugin import INPUTS_OUTPUT_ENV, RESULTS_OUTPUT_ENV, report_path
+from .profiling import ProfilerUnavailable
+from .replay import Recorder, RecordingHandler, replay
+from .scope import WatchScope, derive_scope
+from .session import Session
+from .speculative import SpeculativeGuard
+from .terminal import Status, Terminal, get_terminal
+from .tiers import Classifier, select_tests
+from .trigger import SOURCE_FILE, RunRequest, Trigger
 
 logging.basicConfig(level=logging.INFO, format="[ptw] %(message)s")
 
 
-def main_loop(trigger: Trigger, config: Config, term: Terminal) -> None:
-    if trigger.check():
-        term.reset()
+def main_loop(
+    trigger: Trigger,
+    config: Config,
+    term: Terminal,
+    session: Optional[Session] = None,
+) -> None:
+    if session is None:
+        session = Session()
 
-        if config.clear:
-            term.clear()
+    if trigger.check(early=config.speculative):
+        slot = session.scheduler.try_acquire(config, trigger.last_event)
 
-        try:
-            subprocess.run([config.runner, *config.runner_args], check=True)
-        except subprocess.CalledProcessError:
-            if config.notify_on_failure:
-                term.print_bell()
-        finally:
-            term.enter_capturing_mode()
+        if slot is not None:
+            request = trigger.take_request(config.runner_args, early=config.speculative)
+            assert request is not None
+
+            guard = None
+            if config.speculative and request.source == SOURCE_FILE:
+                guard = SpeculativeGuard(
+                    trigger, request, session.classifier, config.affected
+                )
+
+            session.changes = request.changes
+
+            term.reset()
+
+            if config.clear:
+                term.clear()
+
+            try:
+                result = _run_tests(config, term, session, request, guard)
+            finally:
+                slot.release()
+                term.enter_capturing_mode()
+
+            if guard is not None and guard.cancelled:
+                # The changes that cancelled the run are pending, it restarts
+                # right away with all of them
+                trigger.add_changes(request.changes)
+            else:
+                if (
+                    result.returncode != 0
+                    and not result.flaky
+                    and config.notify_on_failure
+                ):
+                    term.print_bell()
 
-        term.print_short_menu(config.runner_args)
+                # Unrelated changes made during a speculative run get their own
+                if guard is None or not guard.unrelated:
+                    trigger.release()
 
-        trigger.release()
+                if config.focus is None and session.focus_changes:
+                    # The focused test passed, widen to the tests affected by the
+                    # changes made in the meantime
+                    trigger.emit_many(session.focus_changes)
+                    session.focus_changes = set()
 
-    key = term.capture_keystroke()
-    if key:
+                term.print_pending(trigger.pending())
+
+    term.update_status(_get_status(trigger, config, session))
+
+    for key in term.read_keys():
         commands.Manager.run_command(key, trigger, term, config)
 
     time.sleep(LOOP_DELAY)
 
 
 def run():
-    term = get_terminal()
-    trigger = Trigger()
-
     namespace, runner_args = parse_arguments(sys.argv[1:])
 
     config = Config.create(namespace=namespace, extra_args=runner_args)
 
-    event_handler = EventHandler(
-        trigger, patterns=config.patterns, ignore_patterns=config.ignore_patterns
-    )
+    if namespace.replay:
+        report = replay(Path(namespace.replay), config, namespace.replay_speed)
+        sys.stdout.write(report.render())
+        return
 
-    observer = Observer()
-    observer.schedule(event_handler, config.path, recursive=True)
-    observer.start()
+    if not namespace.daemon and not config.json and daemon.is_running(config.path):
+        return daemon.attach(config.path)
+
+    trigger = Trigger(delay=config.delay)
 
-    _print_intro(config)
+    if namespace.daemon:
+        return _run_daemon(trigger, config)
+
+    if config.json:
+        return _run_batch(trigger, config)
+
+    term = get_terminal()
+
+    session = _create_session(config)
+
+    scope = derive_scope(config)
+
+    observer = _start_observer(trigger, config, session, scope)
+
+    _print_intro(config, scope)
 
     term.enter_capturing_mode()
 
@@ -71,15 +142,363 @@ def run():
 
     try:
         while True:
-            main_loop(trigger, config, term)
+            main_loop(trigger, config, term, session)
     finally:
         observer.stop()
         observer.join()
 
+        session.scheduler.cancel()
+        session.close()
         term.reset()
 
 
-def _print_intro(config: Config) -> None:
+def _run_daemon(trigger: Trigger, config: Config) -> None:
+    server = daemon.Server(config.path, trigger)
+    server.start()
+
+    session = _create_session(config)
+
+    scope = derive_scope(config)
+
+    observer = _start_observer(trigger, config, session, scope)
+
+    _print_intro(config, scope)
+    sys.stdout.write(f"Accepting clients on {server.socket_path}\n")
+
+    if config.now:
+        trigger.emit()
+
+    try:
+        while True:
+            daemon.main_loop(trigger, config, server, session)
+    finally:
+        session.scheduler.cancel()
+        session.close()
+        observer.stop()
+        observer.join()
+
+        server.stop()
+
+
+def _run_batch(trigger: Trigger, config: Config) -> int:
+    session = _create_session(config)
+
+    scope = derive_scope(config)
+
+    observer = _start_observer(trigger, config, session, scope)
+
+    # stdout is reserved for the records
+    logging.info(f"Waiting for file changes in:\n{scope.describe()}")
+
+    if config.now:
+        trigger.emit()
+
+    try:
+        return batch.run(trigger, config, session)
+    finally:
+        session.scheduler.cancel()
+        observer.stop()
+        observer.join()
+
+        session.close()
+
+
+def _create_session(config: Config) -> Session:
+    session = Session.restore(config.path)
+    if config.remote:
+        session.remote = RemoteRunner.connect(config.remote)
+    if config.record:
+        session.recorder = Recorder(Path(config.record), config.path)
+    return session
+
+
+def _start_observer(
+    trigger: Trigger, config: Config, session: Session, scope: WatchScope
+) -> Any:
+    repo = GitRepo.discover(config.path)
+    index = session.index
+
+    session.classifier = Classifier.create(
+        config.path, config.test_inputs, session.plugins, session.data_deps
+    )
+
+    event_handler = EventHandler(
+        trigger,
+        patterns=config.patterns,
+        ignore_patterns=config.ignore_patterns,
+        index=index,
+        default_patterns=scope.patterns,
+        classifier=session.classifier,
+        plugins=session.plugins,
+    )
+
+    handler: Any = event_handler
+    if session.recorder is not None:
+        handler = RecordingHandler(event_handler, session.recorder)
+
+    observer = _create_observer(config)
+    for path, _ in scope.paths:
+        observer.schedule(handler, path, recursive=True)
+
+    if scope.is_narrowed:
+        # conftest.py and the ini files next to the watched directories
+        observer.schedule(handler, scope.root, recursive=False)
+
+    ConfigEventHandler(config, trigger, event_handler).schedule(observer)
+
+    if repo is not None:
+        _seed_from_git(repo, index, event_handler, config)
+        GitEventHandler(repo, trigger, event_handler).schedule(observer)
+
+    observer.start()
+
+    return observer
+
+
+def _create_observer(config: Config) -> Any:
+    if config.observer == "inotify":
+        if inotify.is_available():
+            return inotify.InotifyObserver()
+        logging.warning("inotify is not available on this platform, using watchdog")
+
+    return Observer()
+
+
+def _seed_from_git(
+    repo: GitRepo, index: FileIndex, event_handler: EventHandler, config: Config
+) -> None:
+    """
+    Pick up the changes made while the watcher was not running and prefill
+    the file index from the git index, so that unchanged files are not read.
+    """
+    try:
+        index.seed_from_git(repo)
+    except subprocess.CalledProcessError as exc:
+        logging.debug(f"Unable to read the git index: {exc.stderr}")
+
+    count = event_handler.handle_changes(
+        seed_changes(repo, config.since), trigger_run=False
+    )
+    if count:
+        logging.info(f"{count} watched files changed since {config.since}")
+
+
+def _run_tests(
+    config: Config,
+    term: Terminal,
+    session: Session,
+    request: RunRequest,
+    guard: Optional[SpeculativeGuard] = None,
+) -> runner.RunResult:
+    prepared = session.prepare_runner(config)
+
+    if config.stages:
+        failed = session.run_stages(config, request.changes, term.print)
+        if failed is not None:
+            if guard is not None:
+                guard.stop()
+            assert failed.result is not None
+            return failed.result
+
+    focus = config.focus
+    tests: List[str] = []
+    if focus is not None:
+        session.focus_changes |= request.changes
+        command = [*prepared.argv, *focused_args(request.args or (), focus)]
+    elif config.test_filter:
+        session.focus_changes = set()
+        command = [
+            *prepared.argv,
+            *focused_args(request.args or (), *config.test_filter),
+        ]
+    else:
+        session.focus_changes = set()
+        tests = select_tests(config, request, session.classifier)
+        command = [*prepared.argv, *(request.args or ()), *tests]
+    env = None
+    profile_path = None
+
+    if config.profile and session.remote is not None:
+        config.profile = False
+        term.print("[ptw] Profiling is not available with --remote\n")
+    elif config.profile:
+        config.profile = False
+        output_dir = get_cache_dir(config.path).joinpath("profiles")
+        try:
+            command, env, profile_path = session.profiler.prepare(command, output_dir)
+        except ProfilerUnavailable as exc:
+            term.print(f"[ptw] {exc}\n")
+
+    results_path = None
+    # The plugin writes to the host cache directory, out of reach of the agent
+    if (
+        config.retry_flaky
+        and session.remote is None
+        and runner.is_pytest_command(command)
+    ):
+        results_path = report_path(get_cache_dir(config.path), "results")
+        command = runner.with_plugin(command)
+        env = {**(env or {}), RESULTS_OUTPUT_ENV: str(results_path)}
+
+    inputs_path = None
+    if (
+        config.learn_test_inputs
+        and session.data_deps is not None
+        and session.remote is None
+        and runner.is_pytest_command(command)
+        and focus is None
+        and not config.test_filter
+        and not tests
+        and runs_whole_suite(request.args or ())
+    ):
+        inputs_path = report_path(get_cache_dir(config.path), "inputs")
+        command = runner.with_plugin(command)
+        env = {**(env or {}), INPUTS_OUTPUT_ENV: str(inputs_path)}
+
+    command = session.plugins.modify_command(command, request)
+
+    try:
+        result = session.run(
+            command,
+            sample_interval=config.rss_sample_interval,
+            env=env,
+            base_env=prepared.env,
+            on_start=guard.on_start if guard is not None else None,
+        )
+    finally:
+        if guard is not None:
+            guard.stop()
+
+    if guard is not None and guard.cancelled:
+        term.print(f"\n[ptw] {guard.cancelled_by} changed, restarting the run\n")
+        # The profile is taken on the run that completes
+        config.profile = config.profile or profile_path is not None
+        return result
+
+    if inputs_path is not None:
+        _learn_test_inputs(session, result, inputs_path)
+
+    if results_path is not None:
+        result = _check_flaky(
+            config, term, session, request, prepared, result, results_path
+        )
+
+    term.print(f"\n[ptw] {result.usage.summary()}\n")
+    for warning in session.record(result):
+        term.print(f"[ptw] {warning}\n")
+
+    if focus is not None and result.returncode == 0 and config.focus == focus:
+        term.print(f"[ptw] {focus} passed, leaving focus\n")
+        config.focus = None
+
+    if profile_path is not None:
+        term.print(session.profiler.report(profile_path))
+
+    session.plugins.run_finished(result, request)
+
+    return result
+
+
+def _learn_test_inputs(
+    session: Session, result: runner.RunResult, inputs_path: Path
+) -> None:
+    assert session.data_deps is not None
+    inputs = read_test_inputs(inputs_path)
+    # Exit codes other than passed and failed mean that not every test ran
+    if inputs is None or result.returncode not in (0, 1):
+        return
+
+    session.data_deps.replace(inputs)
+    logging.debug(f"Learned {len(session.data_deps)} test inputs")
+
+
+def _check_flaky(
+    config: Config,
+    term: Terminal,
+    session: Session,
+    request: RunRequest,
+    prepared: PreparedRunner,
+    result: runner.RunResult,
+    results_path: Path,
+) -> runner.RunResult:
+    """
+    Add the outcomes to the history, and retry the failed tests if they are
+    all flaky. Returns the result, marked as flaky if they passed on retry.
+    """
+    outcomes = read_outcomes(results_path)
+    session.flaky.update(
+        outcomes, relevance(request.changes, session.classifier, config.path)
+    )
+
+    failed = sorted(
+        node_id for node_id, outcome in outcomes.items() if outcome == "failed"
+    )
+    # Exit code 1 is for test failures, not for errors of the runner
+    if result.returncode != 1 or not failed:
+        return result
+    if not all(session.flaky.is_flaky(node_id) for node_id in failed):
+        return result
+
+    term.print(f"\n[ptw] Retrying flaky tests: {', '.join(failed)}\n")
+    outputs: Dict[str, List[str]] = {}
+
+    def run_one(node_id: str) -> runner.RunResult:
+        command = [*prepared.argv, *focused_args(request.args or (), node_id)]
+        outputs[node_id] = []
+        return session.run(
+            session.plugins.modify_command(command, request),
+            on_output=outputs[node_id].append,
+            base_env=prepared.env,
+        )
+
+    retried = retry(failed, run_one, MAX_RETRY_WORKERS)
+
+    session.flaky.update(
+        {
+            node_id: "passed" if retry_result.returncode == 0 else "failed"
+            for node_id, retry_result in retried.items()
+        },
+        lambda _: False,
+    )
+
+    still_failing = [n for n, r in retried.items() if r.returncode != 0]
+    if still_failing:
+        for node_id in still_failing:
+            term.print("".join(outputs[node_id]))
+        term.print(f"[ptw] Failed again on retry: {', '.join(still_failing)}\n")
+        return result
+
+    term.print("[ptw] The run failed only on flaky tests, they passed on retry\n")
+    return dataclasses.replace(result, flaky=failed)
+
+
+def _get_status(trigger: Trigger, config: Config, session: Session) -> Status:
+    state = "watching"
+    if trigger.check() and session.scheduler.reason:
+        state = f"deferred: {session.scheduler.reason}"
+    elif trigger.is_active():
+        state = "run pending"
+
+    status = Status(
+        state=state,
+        runner_args=config.runner_args,
+        test_filter=config.test_filter_query,
+        queued=len(trigger.pending()),
+    )
+
+    if session.last_result is not None:
+        status.returncode = session.last_result.returncode
+        status.flaky = bool(session.last_result.flaky)
+        status.duration = session.last_result.duration
+        status.finished = session.last_finished
+
+    return status
+
+
+def _print_intro(config: Config, scope: WatchScope) -> None:
     sys.stdout.write(f"pytest-watcher version {VERSION}\n")
     sys.stdout.write(f"Runner command: {config.runner}\n")
-    sys.stdout.write(f"Waiting for file changes in {config.path.absolute()}\n")
+    if scope.is_narrowed:
+        sys.stdout.write(f"Waiting for file changes in:\n{scope.describe()}")
+    else:
+        sys.stdout.write(f"Waiting for file changes in {config.path.absolute()}\n")
@@ -1,10 +1,14 @@
+import shutil
 from pathlib import Path
 from unittest.mock import MagicMock
 
 import pytest
 from pytest_mock import MockerFixture
 
+from pytest_watcher import config as config_module
 from pytest_watcher.config import Config
+from pytest_watcher.resources import Usage
+from pytest_watcher.runner import RunResult
 from pytest_watcher.terminal import Terminal
 from pytest_watcher.trigger import Trigger
 
@@ -15,8 +19,16 @@ def trigger():
 
 
 @pytest.fixture()
-def mock_subprocess_run(mocker: MockerFixture):
-    return mocker.patch("pytest_watcher.watcher.subprocess.run", autospec=True)
+def mock_runner_run(mocker: MockerFixture):
+    mock = mocker.patch("pytest_watcher.watcher.runner.run", autospec=True)
+    mock.return_value = RunResult(command=[], returncode=0, usage=Usage())
+    return mock
+
+
+@pytest.fixture(autouse=True)
+def mock_which(mocker: MockerFixture):
+    # Keep the runner commands independent of the executables on the host
+    return mocker.patch("pytest_watcher.environment.shutil.which", return_value=None)
 
 
 @pytest.fixture(autouse=True)
@@ -46,6 +58,24 @@ def create_tmp_dir(tmp_path: Path):
     tmp_path.mkdir(exist_ok=True)
 
 
+@pytest.fixture(autouse=True)
+def _isolate_cache_dir(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    cache_dir = tmp_path.joinpath("cache").absolute()
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache_dir))
+
+    yield cache_dir
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def _clear_config_cache():
+    yield
+
+    config_module._find_cache.clear()
+    config_module._parse_cache.clear()
+
+
 @pytest.fixture
 def pyproject_toml_path(tmp_path: Path):
     path = tmp_path.joinpath("pyproject.toml")
@@ -0,0 +1,141 @@
+import shutil
+import socket
+import sys
+import threading
+from pathlib import Path
+from typing import List
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from pytest_watcher.agent import AGENT_ERROR_RETURNCODE, Agent, RemoteRunner
+from pytest_watcher.resources import Usage
+from pytest_watcher.runner import RunResult
+from pytest_watcher.session import Session
+
+
+@pytest.fixture
+def project(tmp_path_factory: pytest.TempPathFactory):
+    # Outside of the repository, so that its conftest is not collected
+    path = tmp_path_factory.mktemp("agent")
+
+    yield path
+
+    shutil.rmtree(path)
+
+
+@pytest.fixture
+def remote():
+    host, container = socket.socketpair()
+    agent = Agent(container.makefile("rb"), container.makefile("wb"))
+    thread = threading.Thread(target=agent.serve, daemon=True)
+    thread.start()
+
+    remote = RemoteRunner(host.makefile("rb"), host.makefile("wb"), "test", host.close)
+
+    yield remote
+
+    remote.close()
+    container.close()
+    thread.join(5)
+
+
+def test_ping(remote: RemoteRunner):
+    assert remote.ping() >= 0
+
+
+def test_run_forks_pytest(remote: RemoteRunner, project: Path):
+    project.joinpath("test_sample.py").write_text("def test_ok():\n    print('hi')\n")
+    output: List[str] = []
+    on_start = MagicMock()
+
+    result = remote.run(
+        ["pytest", "-q", "-s", "-p", "no:cacheprovider", str(project)],
+        on_output=output.append,
+        on_start=on_start,
+    )
+
+    assert result.returncode == 0, "".join(output)
+    assert "1 passed" in "".join(output)
+    on_start.assert_called_once()
+    assert remote.overhead is not None
+    assert result.usage.duration > 0
+
+
+def test_run_reports_failures(remote: RemoteRunner, project: Path):
+    project.joinpath("test_sample.py").write_text("def test_fail():\n    assert 0\n")
+
+    result = remote.run(
+        ["python", "-m", "pytest", "-q", "-p", "no:cacheprovider", str(project)],
+        on_output=lambda _: None,
+    )
+
+    assert result.returncode == 1
+
+
+def test_run_other_commands(remote: RemoteRunner):
+    output: List[str] = []
+
+    result = remote.run(
+        [sys.executable, "-c", "import os; print(os.environ['PTW_TEST'])"],
+        on_output=output.append,
+        env={"PTW_TEST": "value"},
+    )
+
+    assert result.returncode == 0
+    assert output == ["value\n"]
+
+
+def test_run_cancelled(remote: RemoteRunner):
+    result = remote.run(
+        [sys.executable, "-c", "import time; time.sleep(30)"],
+        on_start=lambda process: process.terminate(),
+    )
+
+    assert result.returncode != 0
+
+
+def test_connect_stdio():
+    remote = RemoteRunner.connect(
+        f"stdio:{sys.executable} -m pytest_watcher.agent --stdio"
+    )
+    try:
+        output: List[str] = []
+        result = remote.run([sys.executable, "-c", "print(1)"], on_output=output.append)
+    finally:
+        remote.close()
+
+    assert result.returncode == 0
+    assert output == ["1\n"]
+    assert remote.round_trip is not None
+
+
+@pytest.mark.parametrize("address", ["tcp:localhost:1234", "unix:/nonexistent.sock"])
+def test_connect_error(address: str):
+    with pytest.raises(SystemExit):
+        RemoteRunner.connect(address)
+
+
+def test_session_runs_with_remote(mocker: MockerFixture):
+    run = mocker.patch("pytest_watcher.session.runner.run", autospec=True)
+    remote = MagicMock(spec=RemoteRunner)
+    remote.run.return_value = RunResult(["pytest"], 0, Usage())
+    session = Session(remote=remote)
+
+    session.run(["pytest"], env=None)
+
+    remote.run.assert_called_once_with(["pytest"], env=None)
+    run.assert_not_called()
+
+
+def test_runs_back_to_back(remote: RemoteRunner):
+    for _ in range(5):
+        result = remote.run([sys.executable, "-c", "pass"], on_output=lambda _: None)
+        assert result.returncode == 0
+
+
+def test_run_error_does_not_exit(remote: RemoteRunner):
+    result = remote.run(["/nonexistent/runner"], on_output=lambda _: None)
+
+    assert result.returncode == AGENT_ERROR_RETURNCODE
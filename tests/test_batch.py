@@ -0,0 +1,209 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from pytest_watcher import batch
+from pytest_watcher.config import Config
+from pytest_watcher.plugin import RESULTS_OUTPUT_ENV
+from pytest_watcher.resources import Usage
+from pytest_watcher.runner import RunResult
+from pytest_watcher.session import Session
+from pytest_watcher.trigger import SOURCE_MANUAL, RunRequest, Trigger
+
+
+@pytest.fixture(autouse=True)
+def mock_loads_plugin(mocker: MockerFixture) -> MagicMock:
+    return mocker.patch(
+        "pytest_watcher.environment._loads_plugin", autospec=True, return_value=True
+    )
+
+
+@pytest.fixture
+def mock_run(mocker: MockerFixture) -> MagicMock:
+    mock = mocker.patch("pytest_watcher.batch.runner.run", autospec=True)
+    mock.return_value = RunResult(command=[], returncode=1, usage=Usage(duration=1.5))
+    return mock
+
+
+def records(capsys: pytest.CaptureFixture):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+@pytest.mark.parametrize(
+    ("returncode", "pytest", "outcome"),
+    [
+        (0, True, "passed"),
+        (1, True, "failed"),
+        (5, True, "no-tests"),
+        (-9, True, "error"),
+        (0, False, "passed"),
+        (2, False, "failed"),
+    ],
+)
+def test_get_outcome(returncode: int, pytest: bool, outcome: str):
+    assert batch.get_outcome(returncode, pytest) == outcome
+
+
+def test_run_tests_reports_results(mock_run: MagicMock, config: Config):
+    def run(command, on_output, sample_interval, env, base_env):
+        with open(env[RESULTS_OUTPUT_ENV], "w") as f:
+            json.dump({"counts": {"passed": 2, "failed": 1}, "failed": ["t::a"]}, f)
+        return mock_run.return_value
+
+    mock_run.side_effect = run
+    request = RunRequest(("-x",), SOURCE_MANUAL, {"b.py", "a.py"})
+
+    record = batch.run_tests(config, Session(), request)
+
+    assert record["command"] == ["pytest", "-p", "pytest_watcher.plugin", "-x"]
+    assert record["changes"] == ["a.py", "b.py"]
+    assert record["source"] == SOURCE_MANUAL
+    assert record["outcome"] == "failed"
+    assert record["duration"] == 1.5
+    assert record["counts"] == {"passed": 2, "failed": 1}
+    assert record["failed"] == ["t::a"]
+    assert not Path(mock_run.call_args[1]["env"][RESULTS_OUTPUT_ENV]).exists()
+
+
+def test_run_tests_remote_without_plugin(config: Config):
+    remote = MagicMock()
+    remote.run.return_value = RunResult(["pytest"], 0, Usage())
+    session = Session(remote=remote)
+
+    record = batch.run_tests(config, session, RunRequest(("-x",), SOURCE_MANUAL))
+
+    assert record["command"] == ["pytest", "-x"]
+    assert remote.run.call_args[1]["env"] is None
+
+
+def test_run_tests_without_results(mock_run: MagicMock, config: Config):
+    request = RunRequest(("-x",), SOURCE_MANUAL)
+
+    record = batch.run_tests(config, Session(), request)
+
+    assert record["counts"] == {}
+    assert record["failed"] == []
+
+
+def test_run_tests_without_loadable_plugin(
+    mock_run: MagicMock, mock_loads_plugin: MagicMock, config: Config
+):
+    mock_loads_plugin.return_value = False
+    session = Session()
+
+    record = batch.run_tests(config, session, RunRequest(("-x",), SOURCE_MANUAL))
+    batch.run_tests(config, session, RunRequest(("-x",), SOURCE_MANUAL))
+
+    assert record["command"] == ["pytest", "-x"]
+    assert record["counts"] == {}
+    assert mock_run.call_args[1]["env"] is None
+    # Once per prepared runner
+    mock_loads_plugin.assert_called_once()
+
+
+def test_run_tests_other_runner(mock_run: MagicMock, config: Config):
+    config.runner = "tox"
+
+    record = batch.run_tests(config, Session(), RunRequest((), SOURCE_MANUAL))
+
+    assert record["command"] == ["tox"]
+    assert mock_run.call_args[1]["env"] is None
+
+
+def test_run_tests_stage_failure(mock_run: MagicMock, config: Config):
+    config.stages = [{"name": "types", "runner": "mypy", "pass_changes": True}]
+    mock_run.return_value = RunResult(["mypy", "."], 1, Usage(duration=0.5))
+    session = Session()
+
+    record = batch.run_tests(config, session, RunRequest((), SOURCE_MANUAL))
+
+    assert [c[0][0] for c in mock_run.call_args_list] == [["mypy", str(config.path)]]
+    assert record["stage"] == "types"
+    assert record["command"] == ["mypy", str(config.path)]
+    assert record["outcome"] == "failed"
+    assert record["duration"] == 0.5
+    # Not a test run
+    assert len(session.stats.runs) == 0
+    assert session.last_result is mock_run.return_value
+
+
+def test_run_stops_after_max_runs(
+    mock_run: MagicMock, config: Config, trigger: Trigger, capsys: pytest.CaptureFixture
+):
+    config.max_runs = 2
+    trigger.emit_now(["-x"])
+    trigger.emit_now(["--lf"])
+    trigger.emit_now(["-v"])
+
+    assert batch.run(trigger, config, Session()) == 1
+
+    run_records = records(capsys)
+    assert [r["type"] for r in run_records] == ["run", "run", "exit"]
+    assert run_records[-1] == {"type": "exit", "reason": "max-runs", "runs": 2}
+    assert trigger.is_active()
+
+
+def test_run_exits_on_idle(
+    mock_run: MagicMock, config: Config, trigger: Trigger, capsys: pytest.CaptureFixture
+):
+    config.exit_on_idle = 0.01
+
+    assert batch.run(trigger, config, Session()) == 0
+
+    assert records(capsys) == [{"type": "exit", "reason": "idle", "runs": 0}]
+    mock_run.assert_not_called()
+
+
+def test_plugin_writes_results(tmp_path: Path):
+    test_file = tmp_path.joinpath("test_plugin_results.py")
+    test_file.write_text(
+        "import pytest\n"
+        "def test_ok(): pass\n"
+        "def test_fail(): assert False\n"
+        "@pytest.mark.skip\n"
+        "def test_skip(): pass\n"
+        "@pytest.mark.xfail\n"
+        "def test_xfail(): assert False\n"
+    )
+    output = tmp_path.joinpath("results.json")
+
+    subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "pytest_watcher.plugin"]
+        + ["-p", "no:cacheprovider", str(test_file)],
+        env={**os.environ, RESULTS_OUTPUT_ENV: str(output)},
+        capture_output=True,
+    )
+
+    results = json.loads(output.read_text())
+
+    assert results["counts"] == {"passed": 1, "failed": 1, "skipped": 1, "xfailed": 1}
+    assert results["failed"] == [f"{test_file.as_posix()}::test_fail"]
+    assert results["passed"] == [f"{test_file.as_posix()}::test_ok"]
+    assert results["collected"] == 4
+
+    test_file.unlink()
+    output.unlink()
+
+
+def test_plugin_unwritable_results(tmp_path: Path):
+    test_file = tmp_path.joinpath("test_plugin_unwritable.py")
+    test_file.write_text("def test_ok(): pass\n")
+
+    process = subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "pytest_watcher.plugin"]
+        + ["-p", "no:cacheprovider", str(test_file)],
+        env={**os.environ, RESULTS_OUTPUT_ENV: "/nonexistent/results.json"},
+        capture_output=True,
+        text=True,
+    )
+
+    assert process.returncode == 0, process.stdout + process.stderr
+    assert "Unable to write the report" in process.stderr
+
+    test_file.unlink()
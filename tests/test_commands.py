@@ -1,5 +1,11 @@
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
 from pytest_watcher import commands
 from pytest_watcher.config import Config
+from pytest_watcher.search import TestIndex
 from pytest_watcher.terminal import Terminal
 from pytest_watcher.trigger import Trigger
 
@@ -55,3 +61,126 @@ def test_multiple_characters(trigger: Trigger, config: Config, mock_terminal: Te
     commands.Manager.run_command("2", trigger, mock_terminal, config)
 
     assert command.invoke_count == 2
+
+
+def test_profile_command(trigger: Trigger, config: Config, mock_terminal: Terminal):
+    commands.Manager.run_command("P", trigger, mock_terminal, config)
+
+    assert config.profile is True
+    assert trigger.is_active()
+
+
+def test_command_requests_run_with_updated_args(
+    trigger: Trigger, config: Config, mock_terminal: Terminal
+):
+    config.runner_args = ["-x"]
+
+    commands.Manager.run_command("f", trigger, mock_terminal, config)
+    commands.Manager.run_command("f", trigger, mock_terminal, config)
+
+    assert [r.args for r in trigger.pending()] == [("-x", "--lf")]
+
+
+def test_focus_command(
+    trigger: Trigger, config: Config, mock_terminal: Terminal, mocker: MockerFixture
+):
+    mocker.patch(
+        "pytest_watcher.commands.read_last_failed",
+        return_value=["tests/test_a.py::test_one", "tests/test_a.py::test_two"],
+    )
+
+    commands.Manager.run_command("F", trigger, mock_terminal, config)
+
+    assert config.focus == "tests/test_a.py::test_one"
+    assert trigger.is_active()
+
+    commands.Manager.run_command("F", trigger, mock_terminal, config)
+
+    assert config.focus is None
+
+
+def test_focus_command_without_failures(
+    trigger: Trigger, config: Config, mock_terminal: Terminal, mocker: MockerFixture
+):
+    mocker.patch("pytest_watcher.commands.read_last_failed", return_value=[])
+
+    commands.Manager.run_command("F", trigger, mock_terminal, config)
+
+    assert config.focus is None
+    assert not trigger.is_active()
+
+
+def test_filter_tests_command(
+    trigger: Trigger, config: Config, mock_terminal: MagicMock, mocker: MockerFixture
+):
+    index = TestIndex(["t.py::test_one", "t.py::test_two", "u.py::test_one"])
+    mocker.patch("pytest_watcher.commands.TestIndex.load", return_value=index)
+
+    commands.Manager.run_command("/", trigger, mock_terminal, config)
+
+    _, submit = mock_terminal.edit_line.call_args[0]
+    hint = mock_terminal.edit_line.call_args[1]["hint"]
+    assert hint("") == "  (3 tests)"
+    assert hint("one") == "  (2 tests)"
+
+    submit("one")
+
+    assert config.test_filter == ["t.py::test_one", "u.py"]
+    assert config.test_filter_query == "one"
+    assert trigger.is_active()
+
+    submit("three")
+
+    assert config.test_filter == ["t.py::test_one", "u.py"]
+    assert len(trigger.pending()) == 1
+
+    submit(" ")
+
+    assert config.test_filter == []
+    assert config.test_filter_query == ""
+    assert trigger.is_active()
+
+
+def test_filter_tests_command_without_index(
+    trigger: Trigger, config: Config, mock_terminal: MagicMock, mocker: MockerFixture
+):
+    mocker.patch("pytest_watcher.commands.TestIndex.load", return_value=TestIndex([]))
+
+    commands.Manager.run_command("/", trigger, mock_terminal, config)
+
+    mock_terminal.edit_line.assert_not_called()
+
+
+def test_change_runner_args_command(
+    trigger: Trigger, config: Config, mock_terminal: MagicMock
+):
+    config.runner_args = ["-x"]
+
+    commands.Manager.run_command("c", trigger, mock_terminal, config)
+
+    prompt, submit = mock_terminal.edit_line.call_args[0]
+    assert mock_terminal.edit_line.call_args[1]["text"] == "-x"
+    assert not trigger.is_active()
+
+    submit("-v  --lf")
+
+    assert config.runner_args == ["-v", "--lf"]
+    assert trigger.is_active()
+
+
+@pytest.mark.parametrize("args", [["-x", "-k", "old"], ["-x", "-k=old"]])
+def test_keyword_filter_command(
+    trigger: Trigger, config: Config, mock_terminal: MagicMock, args
+):
+    config.runner_args = args
+
+    commands.Manager.run_command("k", trigger, mock_terminal, config)
+
+    _, submit = mock_terminal.edit_line.call_args[0]
+    assert mock_terminal.edit_line.call_args[1]["text"] == "old"
+
+    submit("new and not slow")
+    assert config.runner_args == ["-x", "-k", "new and not slow"]
+
+    submit("")
+    assert config.runner_args == ["-x"]
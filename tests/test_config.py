@@ -4,6 +4,7 @@ from pathlib import Path
 import pytest
 from pytest_mock import MockerFixture
 
+from pytest_watcher import config as config_module
 from pytest_watcher.config import (
     CLI_FIELDS,
     CONFIG_SECTION_NAME,
@@ -31,6 +32,24 @@ def empty_namespace(tmp_path: Path):
         runner=None,
         patterns=None,
         ignore_patterns=None,
+        rss_sample_interval=None,
+        max_load=None,
+        min_free_memory=None,
+        max_parallel_runs=None,
+        since=None,
+        json=None,
+        max_runs=None,
+        exit_on_idle=None,
+        watch_paths=None,
+        affected=None,
+        env_file=None,
+        venv=None,
+        observer=None,
+        speculative=None,
+        remote=None,
+        retry_flaky=None,
+        record=None,
+        learn_test_inputs=None,
     )
 
 
@@ -66,6 +85,24 @@ def namespace(tmp_path: Path) -> Namespace:
         runner="tox",
         patterns=["*.py", ".env"],
         ignore_patterns=["main.py"],
+        rss_sample_interval=0.5,
+        max_load=2.5,
+        min_free_memory=512,
+        max_parallel_runs=2,
+        since="main",
+        json=True,
+        max_runs=3,
+        exit_on_idle=1.5,
+        watch_paths=["src", "tests"],
+        affected=True,
+        env_file=".env",
+        venv=".venv",
+        observer="inotify",
+        speculative=True,
+        remote="unix:/tmp/agent.sock",
+        retry_flaky=True,
+        record="events.jsonl.gz",
+        learn_test_inputs=True,
     )
 
 
@@ -100,6 +137,24 @@ def test_cli_args_none_values_are_skipped(tmp_path: Path):
         runner=None,
         patterns=None,
         ignore_patterns=None,
+        rss_sample_interval=None,
+        max_load=None,
+        min_free_memory=None,
+        max_parallel_runs=None,
+        since=None,
+        json=None,
+        max_runs=None,
+        exit_on_idle=None,
+        watch_paths=None,
+        affected=None,
+        env_file=None,
+        venv=None,
+        observer=None,
+        speculative=None,
+        remote=None,
+        retry_flaky=None,
+        record=None,
+        learn_test_inputs=None,
     )
 
     config = Config.create(namespace=namespace, extra_args=None)
@@ -178,3 +233,116 @@ def test_parse_config_unrecognized_option(pyproject_toml_path: Path):
 
     with pytest.raises(SystemExit, match="Unrecognized option"):
         parse_config(pyproject_toml_path)
+
+
+@pytest.mark.parametrize(
+    ("option", "value"),
+    [
+        ("delay", "'fast'"),
+        ("delay", "true"),
+        ("now", "1"),
+        ("runner", "['pytest']"),
+        ("patterns", "'*.py'"),
+        ("runner_args", "[1, 2]"),
+        ("observer", "'kqueue'"),
+        ("stages", "'ruff'"),
+        ("test_inputs", "['data/*.csv']"),
+        ("test_inputs", "{ 'data/*.csv' = 'tests/test_data.py' }"),
+        ("test_inputs", "{ 'data/*.csv' = [1] }"),
+    ],
+)
+def test_parse_config_invalid_value(pyproject_toml_path: Path, option: str, value: str):
+    pyproject_toml_path.write_text(f"[tool.{CONFIG_SECTION_NAME}]\n{option} = {value}\n")
+
+    with pytest.raises(SystemExit, match=f"Invalid value for {option}"):
+        parse_config(pyproject_toml_path)
+
+
+def test_parse_config_test_inputs(pyproject_toml_path: Path):
+    pyproject_toml_path.write_text(
+        f"[tool.{CONFIG_SECTION_NAME}.test_inputs]\n"
+        "'data/*.csv' = ['tests/test_data.py']\n"
+    )
+
+    parsed = parse_config(pyproject_toml_path)
+
+    assert parsed["test_inputs"] == {"data/*.csv": ["tests/test_data.py"]}
+
+
+def test_parse_config_invalid_stage(pyproject_toml_path: Path):
+    pyproject_toml_path.write_text(
+        f"[[tool.{CONFIG_SECTION_NAME}.stages]]\nname = 'lint'\nrunner = 'ruff'"
+        "\nneeds = ['types']\n"
+    )
+
+    with pytest.raises(SystemExit, match="Stage lint needs types"):
+        parse_config(pyproject_toml_path)
+
+
+def test_parse_config_is_cached(pyproject_toml: Path, mocker: MockerFixture):
+    spy = mocker.spy(config_module, "_parse_config")
+
+    first = parse_config(pyproject_toml)
+    second = parse_config(pyproject_toml)
+
+    assert first is second
+    spy.assert_called_once()
+
+
+def test_parse_config_cache_invalidated_on_change(pyproject_toml: Path):
+    assert parse_config(pyproject_toml)["delay"] == 999
+
+    pyproject_toml.write_text(f"[tool.{CONFIG_SECTION_NAME}]\ndelay = 5\n")
+
+    assert parse_config(pyproject_toml) == {"delay": 5}
+
+
+def test_cached_values_are_not_shared(pyproject_toml: Path, empty_namespace: Namespace):
+    config = Config.create(empty_namespace, extra_args=["-x"])
+
+    assert config.runner_args == ["--lf", "--nf", "-x"]
+    assert parse_config(pyproject_toml)["runner_args"] == ["--lf", "--nf"]
+
+
+def test_reload(pyproject_toml: Path, empty_namespace: Namespace):
+    config = Config.create(empty_namespace, extra_args=["-x"])
+
+    pyproject_toml.write_text(
+        f"[tool.{CONFIG_SECTION_NAME}]\n"
+        "now = true\n"
+        "notify_on_failure = true\n"
+        "delay = 1\n"
+        "runner_args = ['-vv']\n"
+        "patterns = ['*.py', '.env']\n"
+    )
+
+    changed = config.reload()
+
+    assert changed == {"delay", "runner", "runner_args", "ignore_patterns"}
+    assert config.delay == 1
+    assert config.runner == "pytest"
+    assert config.runner_args == ["-vv", "-x"]
+    assert config.ignore_patterns == []
+
+
+def test_reload_keeps_cli_options(pyproject_toml: Path, namespace: Namespace):
+    config = Config.create(namespace)
+
+    pyproject_toml.write_text(
+        f"[tool.{CONFIG_SECTION_NAME}]\n"
+        "delay = 1\n"
+        "runner = 'nox'\n"
+        "runner_args = ['-k']\n"
+    )
+
+    assert config.reload() == {"runner_args"}
+    assert config.delay == namespace.delay
+    assert config.runner == namespace.runner
+    assert config.runner_args == ["-k"]
+
+
+def test_reload_without_changes(pyproject_toml: Path, config: Config):
+    config.runner_args.append("--pdb")
+
+    assert config.reload() == set()
+    assert config.runner_args == ["--lf", "--nf", "--pdb"]
@@ -0,0 +1,195 @@
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from pytest_watcher import daemon, watcher
+from pytest_watcher.config import Config
+from pytest_watcher.session import Session
+from pytest_watcher.trigger import Trigger
+
+
+@pytest.fixture(autouse=True)
+def _runtime_dir(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+
+
+@pytest.fixture
+def server(trigger: Trigger):
+    server = daemon.Server(Path("."), trigger)
+    server.start()
+
+    yield server
+
+    server.stop()
+
+
+def wait_for(condition, timeout: float = 2.0) -> None:
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise TimeoutError
+        time.sleep(0.01)
+
+
+def test_socket_path_is_stable_per_project(tmp_path: Path):
+    assert daemon.get_socket_path(Path(".")) == daemon.get_socket_path(Path("./"))
+    assert daemon.get_socket_path(Path(".")) != daemon.get_socket_path(Path("tests"))
+    assert daemon.get_socket_path(Path(".")).parent == tmp_path
+
+
+def test_is_running(server: daemon.Server):
+    assert daemon.is_running(Path("."))
+    assert not daemon.is_running(Path("tests"))
+
+
+def test_stale_socket_is_replaced(trigger: Trigger):
+    socket_path = daemon.get_socket_path(Path("."))
+    socket_path.touch()
+
+    server = daemon.Server(Path("."), trigger)
+    server.start()
+
+    assert daemon.is_running(Path("."))
+
+    server.stop()
+    assert not socket_path.exists()
+
+
+def test_second_daemon_is_refused(server: daemon.Server, trigger: Trigger):
+    with pytest.raises(SystemExit, match="already watching"):
+        daemon.Server(Path("."), trigger).start()
+
+
+def test_run_request_emits_trigger(server: daemon.Server, trigger: Trigger):
+    sock = daemon.connect(Path("."))
+    assert sock is not None
+
+    daemon.send(sock, {"cmd": "run"})
+    wait_for(trigger.is_active)
+
+    sock.close()
+
+
+def test_status_returns_latest_result(server: daemon.Server):
+    server.publish_result({"returncode": 1})
+
+    sock = daemon.connect(Path("."))
+    assert sock is not None
+
+    daemon.send(sock, {"cmd": "status"})
+    message = next(daemon.read_messages(sock))
+
+    assert message == {"type": "status", "result": {"returncode": 1}}
+    sock.close()
+
+
+def test_attached_clients_receive_output(server: daemon.Server, config: Config):
+    clients = [daemon.connect(Path(".")) for _ in range(2)]
+
+    for sock in clients:
+        assert sock is not None
+        daemon.send(sock, {"cmd": "attach"})
+
+    wait_for(lambda: len(server._clients) == 2)
+
+    config.runner = sys.executable
+    config.runner_args = ["-c", "print('hello')"]
+
+    assert daemon.run_tests(config, server) == 0
+
+    for sock in clients:
+        assert sock is not None
+        messages = daemon.read_messages(sock)
+
+        assert next(messages)["type"] == "start"
+        assert next(messages) == {"type": "output", "data": "hello\n"}
+        assert next(messages)["returncode"] == 0
+
+        sock.close()
+
+    assert server.latest is not None
+    assert server.latest["returncode"] == 0
+
+
+def test_stalled_clients_are_dropped(
+    server: daemon.Server, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(daemon, "SEND_TIMEOUT", 0.1)
+    stalled = daemon.connect(Path("."))
+    assert stalled is not None
+    daemon.send(stalled, {"cmd": "attach"})
+    wait_for(lambda: len(server._clients) == 1)
+
+    started = time.monotonic()
+    # More than the socket buffers hold, for a client that never reads
+    server.broadcast({"type": "output", "data": "x" * 4_000_000})
+
+    assert time.monotonic() - started < 2
+    assert server._clients == []
+    stalled.close()
+
+
+def test_attach_ignores_unknown_messages(capsys: pytest.CaptureFixture[str]):
+    socket_path = daemon.get_socket_path(Path("."))
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(socket_path))
+    listener.listen()
+
+    def serve():
+        conn, _ = listener.accept()
+        assert next(daemon.read_messages(conn)) == {"cmd": "attach"}
+        conn.sendall(b'{"cmd": "attach"}\n[1]\n{"type": "output", "data": "hi\\n"}\n')
+        conn.close()
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    try:
+        assert daemon.attach(Path(".")) == 0
+    finally:
+        thread.join()
+        listener.close()
+        socket_path.unlink()
+
+    assert capsys.readouterr().out.endswith("hi\n")
+
+
+def test_stage_failure_skips_tests(server: daemon.Server, config: Config):
+    config.stages = [
+        {"name": "lint", "runner": sys.executable, "args": ["-c", "exit(1)"]}
+    ]
+
+    assert daemon.run_tests(config, server, Session()) == 1
+
+    assert server.latest is not None
+    assert server.latest["stage"] == "lint"
+    assert server.latest["command"] == [sys.executable, "-c", "exit(1)"]
+
+
+def test_unknown_command(server: daemon.Server):
+    sock = daemon.connect(Path("."))
+    assert isinstance(sock, socket.socket)
+
+    daemon.send(sock, {"cmd": "foo"})
+
+    assert next(daemon.read_messages(sock))["type"] == "error"
+    sock.close()
+
+
+def test_run_attaches_to_running_daemon(
+    mocker: MockerFixture, mock_observer: MagicMock, mock_main_loop: MagicMock
+):
+    mocker.patch.object(sys, "argv", ["ptw", "."])
+    mocker.patch("pytest_watcher.watcher.daemon.is_running", return_value=True)
+    mock_attach = mocker.patch("pytest_watcher.watcher.daemon.attach", return_value=0)
+
+    assert watcher.run() == 0
+
+    mock_attach.assert_called_once_with(Path("."))
+    mock_observer.assert_not_called()
+    mock_main_loop.assert_not_called()
@@ -0,0 +1,137 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from pytest_watcher.datadeps import DataDependencies, read_test_inputs, runs_whole_suite
+from pytest_watcher.plugin import INPUTS_OUTPUT_ENV
+
+ROOT = Path("/project")
+
+
+def test_targets():
+    deps = DataDependencies(ROOT)
+    deps.replace(
+        {
+            "/project/tests/test_a.py": ["/project/tests/data/a.json", "/etc/hosts"],
+            "/project/tests/test_b.py": ["/project/tests/data/a.json"],
+            "/elsewhere/test_c.py": ["/project/tests/data/c.json"],
+        }
+    )
+
+    assert deps.targets("/project/tests/data/a.json") == [
+        "/project/tests/test_a.py",
+        "/project/tests/test_b.py",
+    ]
+    # Paths outside the root are left out
+    assert deps.targets("/etc/hosts") == []
+    assert deps.targets("/project/tests/data/c.json") == []
+    assert len(deps) == 1
+    assert deps.dirty
+
+
+def test_replace_drops_previous_inputs():
+    deps = DataDependencies(ROOT)
+    deps.replace({"/project/tests/test_a.py": ["/project/tests/data/a.json"]})
+    deps.replace({"/project/tests/test_a.py": ["/project/tests/data/b.json"]})
+
+    assert deps.targets("/project/tests/data/a.json") == []
+    assert deps.targets("/project/tests/data/b.json") == ["/project/tests/test_a.py"]
+
+
+def test_dump_and_load():
+    deps = DataDependencies(ROOT)
+    deps.replace(
+        {
+            "/project/tests/test_a.py": ["/project/a.sql", "/project/b.sql"],
+            "/project/tests/test_b.py": ["/project/b.sql"],
+        }
+    )
+
+    data = deps.dump()
+
+    # Test files are stored once
+    assert data == {
+        "tests": [
+            os.path.join("tests", "test_a.py"),
+            os.path.join("tests", "test_b.py"),
+        ],
+        "inputs": {"a.sql": [0], "b.sql": [0, 1]},
+    }
+
+    loaded = DataDependencies(ROOT, json.loads(json.dumps(data)))
+
+    assert loaded.targets("/project/b.sql") == deps.targets("/project/b.sql")
+    assert not loaded.dirty
+
+
+@pytest.mark.parametrize(
+    ("args", "expected"),
+    [
+        ([], True),
+        (["-x", "-v"], True),
+        (["tests"], True),
+        (["-k", "slow"], False),
+        (["--lf"], False),
+        (["--deselect=tests/test_a.py::test_one"], False),
+        (["tests/test_a.py::test_one"], False),
+        ([__file__], False),
+        (["--junitxml", __file__], True),
+    ],
+)
+def test_runs_whole_suite(args, expected: bool):
+    assert runs_whole_suite(args) is expected
+
+
+def test_read_test_inputs(tmp_path: Path):
+    path = tmp_path.joinpath("inputs.json")
+    path.write_text(json.dumps({"/p/test_a.py": ["/p/a.json"]}))
+
+    assert read_test_inputs(path) == {"/p/test_a.py": ["/p/a.json"]}
+    assert not path.exists()
+    assert read_test_inputs(path) is None
+
+
+def test_plugin_records_test_inputs(tmp_path_factory: pytest.TempPathFactory):
+    # Outside of the repository, the pytest subprocess has its own root
+    root = tmp_path_factory.mktemp("inputs")
+    root.joinpath("data").mkdir()
+    root.joinpath("data", "a.json").write_text("{}")
+    root.joinpath("data", "b.sql").write_text("")
+    root.joinpath("pytest.ini").write_text("[pytest]\n")
+    root.joinpath("test_a.py").write_text(
+        "import json, os\n"
+        "def test_read(tmp_path):\n"
+        "    json.load(open('data/a.json'))\n"
+        "    os.close(os.open('data/b.sql', os.O_RDONLY))\n"
+        "    open('data/out.txt', 'w').close()\n"
+        "    open('data/out.txt').read()\n"
+        "    with open('data/log.txt', 'a') as f: f.write('')\n"
+        "    tmp_path.joinpath('x').write_text('')\n"
+        "    tmp_path.joinpath('x').read_text()\n"
+    )
+    root.joinpath("test_b.py").write_text(
+        "def test_read_output(): open('data/log.txt').read()\n"
+    )
+    output = root.joinpath("inputs.json")
+
+    process = subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "pytest_watcher.plugin"],
+        cwd=root,
+        env={**os.environ, INPUTS_OUTPUT_ENV: str(output)},
+        capture_output=True,
+        text=True,
+    )
+
+    assert process.returncode == 0, process.stdout
+    # The files written by the tests are left out, even when read back
+    assert json.loads(output.read_text()) == {
+        str(root.joinpath("test_a.py")): [
+            str(root.joinpath("data", "a.json")),
+            str(root.joinpath("data", "b.sql")),
+        ],
+        str(root.joinpath("test_b.py")): [],
+    }
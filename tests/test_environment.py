@@ -0,0 +1,180 @@
+import os
+import shutil
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from pytest_watcher.config import Config
+from pytest_watcher.environment import (
+    PreparedRunner,
+    RunnerEnvironment,
+    _loads_plugin,
+    is_shim,
+    parse_env_file,
+)
+
+
+@pytest.fixture
+def project(tmp_path: Path):
+    path = tmp_path.joinpath("project").absolute()
+    path.mkdir()
+
+    yield path
+
+    shutil.rmtree(path)
+
+
+def make_script(path: Path, shebang: str) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"{shebang}\n")
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_parse_env_file(project: Path):
+    path = project.joinpath(".env")
+    path.write_text(
+        "# comment\n"
+        "A=1\n"
+        "export B = two\n"
+        "C='quoted # value'\n"
+        'D="x"\n'
+        "E=value # comment\n"
+        "invalid line\n"
+    )
+
+    assert parse_env_file(path) == {
+        "A": "1",
+        "B": "two",
+        "C": "quoted # value",
+        "D": "x",
+        "E": "value",
+    }
+
+
+@pytest.mark.parametrize(
+    "shebang, expected",
+    [
+        ("#!/bin/sh", True),
+        ("#!/usr/bin/env bash", True),
+        ("#!/usr/bin/python3", False),
+        ("#!/usr/bin/env python", False),
+        ("no shebang", False),
+    ],
+)
+def test_is_shim(project: Path, shebang: str, expected: bool):
+    assert is_shim(make_script(project.joinpath("pytest"), shebang)) is expected
+
+
+def test_is_shim_by_location(project: Path):
+    path = make_script(project.joinpath("shims", "pytest"), "#!/usr/bin/python3")
+
+    assert is_shim(path) is True
+
+
+def test_prepare_resolves_runner(project: Path, mock_which: MagicMock):
+    mock_which.return_value = make_script(
+        project.joinpath("bin", "pytest"), "#!/usr/bin/python3"
+    )
+
+    prepared = RunnerEnvironment().prepare(Config(path=project))
+
+    assert prepared.argv == [mock_which.return_value]
+    assert prepared.env["PATH"] == os.environ["PATH"]
+
+
+def test_prepare_keeps_unknown_shim(project: Path, mock_which: MagicMock):
+    mock_which.return_value = make_script(project.joinpath("bin", "pytest"), "#!/bin/sh")
+
+    prepared = RunnerEnvironment().prepare(Config(path=project))
+
+    # The interpreter it runs is unknown
+    assert prepared.argv == [mock_which.return_value]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+def test_prepare_resolves_version_manager_shim(project: Path, mock_which: MagicMock):
+    target = make_script(
+        project.joinpath(".pyenv", "versions", "3.12", "bin", "pytest"),
+        "#!/usr/bin/python3",
+    )
+    mock_which.return_value = make_script(
+        project.joinpath(".pyenv", "shims", "pytest"), "#!/usr/bin/env bash"
+    )
+    # Resolves in the project directory, where .python-version is read
+    make_script(
+        project.joinpath(".pyenv", "bin", "pyenv"),
+        f'#!/bin/sh\n[ "$1 $2 $PWD" = "which pytest {project}" ] && echo {target}',
+    )
+
+    prepared = RunnerEnvironment().prepare(Config(path=project))
+
+    assert prepared.argv == [target]
+
+
+def test_prepare_keeps_shim_of_other_runners(project: Path, mock_which: MagicMock):
+    mock_which.return_value = make_script(project.joinpath("bin", "tox"), "#!/bin/sh")
+
+    prepared = RunnerEnvironment().prepare(Config(path=project, runner="tox"))
+
+    assert prepared.argv == [mock_which.return_value]
+
+
+def test_prepare_venv(project: Path, mock_which: MagicMock):
+    mock_which.return_value = make_script(
+        project.joinpath("bin", "pytest"), "#!/usr/bin/env sh"
+    )
+    python = project.joinpath(".venv", "bin", "python")
+    python.parent.mkdir(parents=True)
+    python.symlink_to(sys.executable)
+
+    prepared = RunnerEnvironment().prepare(Config(path=project, venv=".venv"))
+
+    assert prepared.argv == [str(python), "-m", "pytest"]
+    assert prepared.env["VIRTUAL_ENV"] == str(project.joinpath(".venv"))
+    assert prepared.env["PATH"].startswith(str(project.joinpath(".venv", "bin")))
+    mock_which.assert_called_once_with("pytest", path=prepared.env["PATH"])
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="requires a POSIX shell")
+def test_prepare_venv_without_pytest(project: Path, mock_which: MagicMock):
+    mock_which.return_value = make_script(project.joinpath("bin", "pytest"), "#!/bin/sh")
+    make_script(project.joinpath(".venv", "bin", "python"), "#!/bin/sh\nexit 1")
+
+    prepared = RunnerEnvironment().prepare(Config(path=project, venv=".venv"))
+
+    assert prepared.argv == [mock_which.return_value]
+
+
+def test_prepare_is_cached_until_env_file_changes(project: Path, mock_which: MagicMock):
+    env_file = project.joinpath(".env")
+    env_file.write_text("A=1\n")
+    config = Config(path=project, env_file=".env")
+    environment = RunnerEnvironment()
+
+    prepared = environment.prepare(config)
+    assert prepared.env["A"] == "1"
+    assert environment.prepare(config) is prepared
+    assert mock_which.call_count == 1
+
+    env_file.write_text("A=22\n")
+
+    assert environment.prepare(config).env["A"] == "22"
+    assert mock_which.call_count == 2
+
+
+def test_prepare_missing_env_file(project: Path, caplog: pytest.LogCaptureFixture):
+    prepared = RunnerEnvironment().prepare(Config(path=project, env_file=".env"))
+
+    assert prepared.argv == ["pytest"]
+    assert "Unable to read env file" in caplog.text
+
+
+def test_loads_plugin():
+    env = dict(os.environ)
+
+    assert _loads_plugin(PreparedRunner([sys.executable, "-m", "pytest"], env))
+    assert not _loads_plugin(PreparedRunner([sys.executable, "-c", "exit(1)"], env))
+    assert not _loads_plugin(PreparedRunner(["missing-pytest"], env))
@@ -1,9 +1,16 @@
+from argparse import Namespace
+from pathlib import Path
 from typing import List
+from unittest.mock import MagicMock
 
 import pytest
+from pytest_mock import MockerFixture
 from watchdog import events
 
 from pytest_watcher import watcher
+from pytest_watcher.config import Config
+from pytest_watcher.event_handler import ConfigEventHandler
+from pytest_watcher.hooks import PluginManager
 
 
 @pytest.fixture
@@ -131,3 +138,99 @@ def test_patterns_ignore_not_watched(
     handler.dispatch(event)
 
     assert not trigger.is_active()
+
+
+@pytest.fixture
+def watched_config(pyproject_toml_path: Path) -> Config:
+    pyproject_toml_path.write_text("[tool.pytest-watcher]\ndelay = 1\n")
+
+    return Config.create(
+        Namespace(
+            path=pyproject_toml_path.parent,
+            now=None,
+            clear=None,
+            notify_on_failure=None,
+            delay=None,
+            runner=None,
+            patterns=None,
+            ignore_patterns=None,
+        )
+    )
+
+
+def test_config_reload(trigger: watcher.Trigger, watched_config: Config):
+    handler = watcher.EventHandler(trigger)
+    config_handler = ConfigEventHandler(watched_config, trigger, handler)
+
+    assert watched_config.config_path
+    watched_config.config_path.write_text(
+        "[tool.pytest-watcher]\ndelay = 3\npatterns = ['*.txt']\n"
+    )
+
+    config_handler.dispatch(events.FileModifiedEvent(str(watched_config.config_path)))
+
+    assert trigger.delay == 3
+    assert handler.patterns == ["*.txt"]
+
+
+def test_config_reload_other_files_ignored(
+    trigger: watcher.Trigger, watched_config: Config, mocker: MockerFixture
+):
+    mock_reload = mocker.patch.object(watched_config, "reload")
+    handler = ConfigEventHandler(watched_config, trigger, watcher.EventHandler(trigger))
+
+    handler.dispatch(events.FileModifiedEvent("setup.cfg"))
+    handler.dispatch(events.FileClosedEvent(str(watched_config.config_path)))
+
+    mock_reload.assert_not_called()
+
+
+def test_config_reload_invalid_config_is_kept(
+    trigger: watcher.Trigger, watched_config: Config
+):
+    handler = ConfigEventHandler(watched_config, trigger, watcher.EventHandler(trigger))
+
+    assert watched_config.config_path
+    watched_config.config_path.write_text("[tool.pytest-watcher]\ndelay = 'a'\n")
+
+    handler.dispatch(events.FileModifiedEvent(str(watched_config.config_path)))
+
+    assert watched_config.delay == 1
+
+
+def test_handle_overflow_triggers_single_run(
+    trigger: watcher.Trigger, mocker: MockerFixture
+):
+    mock_rescan = mocker.patch(
+        "pytest_watcher.event_handler.rescan", return_value=["a.py", "b.py"]
+    )
+    handler = watcher.EventHandler(trigger)
+
+    handler.handle_overflow([("/project", True)], since=1.0)
+
+    assert mock_rescan.call_args[0][0] == [("/project", True)]
+    assert trigger.is_active()
+    assert trigger.changes == {"a.py", "b.py"}
+
+
+def test_handle_overflow_without_changes(
+    trigger: watcher.Trigger, mocker: MockerFixture
+):
+    mocker.patch("pytest_watcher.event_handler.rescan", return_value=[])
+    handler = watcher.EventHandler(trigger)
+
+    handler.handle_overflow([("/project", True)], since=1.0)
+
+    assert not trigger.is_active()
+
+
+def test_plugins_filter_changes(trigger: watcher.Trigger):
+    plugin = MagicMock(spec=["filter_change"])
+    plugin.filter_change.side_effect = lambda path: {
+        "api.proto": True,
+        "generated.py": False,
+    }.get(path)
+    handler = watcher.EventHandler(trigger, plugins=PluginManager([("p", plugin)]))
+
+    assert handler.handle_changes(["api.proto", "generated.py", "main.py"]) == 2
+    assert trigger.changes == {"api.proto", "main.py"}
@@ -0,0 +1,85 @@
+import json
+import shutil
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from pytest_watcher.flaky import (
+    FLAKY_FLIPS,
+    FlakyTracker,
+    read_outcomes,
+    relevance,
+    retry,
+)
+from pytest_watcher.resources import Usage
+from pytest_watcher.runner import RunResult
+from pytest_watcher.tiers import Classifier
+
+
+@pytest.fixture
+def project(tmp_path: Path):
+    path = tmp_path.joinpath("flaky").absolute()
+    path.mkdir()
+
+    yield path
+
+    shutil.rmtree(path)
+
+
+def test_tracker_counts_irrelevant_flips():
+    tracker = FlakyTracker()
+
+    for outcome in ("passed", "failed", "passed"):
+        tracker.update({"t::a": outcome, "t::b": outcome}, lambda n: n == "t::b")
+
+    assert tracker.history["t::a"] == ["passed", FLAKY_FLIPS]
+    assert tracker.is_flaky("t::a")
+    assert not tracker.is_flaky("t::b")
+    assert not tracker.is_flaky("t::unknown")
+
+
+def test_read_outcomes(project: Path):
+    path = project.joinpath("results.json")
+    path.write_text(json.dumps({"failed": ["t::a"], "passed": ["t::b"]}))
+
+    assert read_outcomes(path) == {"t::a": "failed", "t::b": "passed"}
+    assert not path.exists()
+
+
+def test_read_outcomes_missing(project: Path):
+    assert read_outcomes(project.joinpath("results.json")) == {}
+
+
+def test_relevance(project: Path):
+    classifier = MagicMock(spec=Classifier)
+    classifier.select.return_value = [str(project.joinpath("tests", "test_a.py"))]
+
+    relevant = relevance({"src/a.py"}, classifier, project)
+
+    assert relevant("tests/test_a.py::test_one")
+    assert not relevant("tests/test_b.py::test_one")
+
+
+def test_relevance_without_changes(project: Path):
+    assert not relevance(set(), None, project)("tests/test_a.py::test_one")
+
+
+@pytest.mark.parametrize("targets", [None, ["tests"]])
+def test_relevance_unknown_targets(project: Path, targets):
+    classifier = MagicMock(spec=Classifier)
+    classifier.select.return_value = targets
+
+    relevant = relevance({"a.py"}, classifier, Path("."))
+
+    assert relevant("tests/test_a.py::test_one")
+    assert relevance({"a.py"}, None, project)("tests/test_a.py::test_one")
+
+
+def test_retry():
+    def run(node_id: str) -> RunResult:
+        return RunResult([node_id], 0 if node_id == "t::a" else 1, Usage())
+
+    results = retry(["t::a", "t::b"], run, workers=2)
+
+    assert {n: r.returncode for n, r in results.items()} == {"t::a": 0, "t::b": 1}
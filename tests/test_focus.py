@@ -0,0 +1,74 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from pytest_watcher.focus import LAST_FAILED_KEY, focused_args, read_last_failed
+from pytest_watcher.scope import PytestCache
+
+
+@pytest.fixture
+def project(tmp_path: Path):
+    path = tmp_path.joinpath("focus").absolute()
+    path.mkdir()
+    # The rootdir, rather than the repository
+    path.joinpath("pytest.ini").write_text("[pytest]\n")
+
+    yield path
+
+    shutil.rmtree(path)
+
+
+def write_last_failed(root: Path, data) -> None:
+    path = PytestCache(root).file(LAST_FAILED_KEY)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data))
+
+
+def test_read_last_failed(project: Path):
+    write_last_failed(
+        project, {"tests/test_a.py::test_one": True, "tests/test_a.py::test_two": False}
+    )
+
+    assert read_last_failed(project) == ["tests/test_a.py::test_one"]
+
+
+@pytest.mark.parametrize("content", [None, "not json", "[]"])
+def test_read_last_failed_invalid(project: Path, content):
+    if content is not None:
+        path = PytestCache(project).file(LAST_FAILED_KEY)
+        path.parent.mkdir(parents=True)
+        path.write_text(content)
+
+    assert read_last_failed(project) == []
+
+
+def test_read_last_failed_from_rootdir(project: Path):
+    project.joinpath("pkg").mkdir()
+    write_last_failed(project, {"pkg/test_a.py::test_one": True})
+
+    # Relative to the project, run from a subdirectory of the rootdir
+    assert read_last_failed(project.joinpath("pkg")) == ["test_a.py::test_one"]
+
+
+def test_focused_args_keep_option_values():
+    args = ["--cov", "pytest_watcher", "-x", "pytest_watcher"]
+
+    assert focused_args(args, "tests/test_a.py::test_one") == [
+        "--cov",
+        "pytest_watcher",
+        "-x",
+        "tests/test_a.py::test_one",
+    ]
+
+
+def test_focused_args_drop_test_paths():
+    args = ["-x", "tests", "-k", "expr", "tests/test_a.py::test_one"]
+
+    assert focused_args(args, "tests/test_b.py::test_two") == [
+        "-x",
+        "-k",
+        "expr",
+        "tests/test_b.py::test_two",
+    ]
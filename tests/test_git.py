@@ -0,0 +1,189 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+from watchdog import events
+
+from pytest_watcher.event_handler import EventHandler
+from pytest_watcher.git import (
+    FileIndex,
+    GitEventHandler,
+    GitRepo,
+    blob_hash,
+    seed_changes,
+)
+from pytest_watcher.trigger import Trigger
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="requires git")
+
+
+def git(root: Path, *args: str) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=root, check=True, capture_output=True, text=True
+    ).stdout
+
+
+@pytest.fixture
+def repo_path(tmp_path: Path):
+    path = tmp_path.joinpath("repo").absolute()
+    path.mkdir()
+
+    git(path, "init", "-q", "-b", "main")
+    git(path, "config", "user.email", "test@example.com")
+    git(path, "config", "user.name", "test")
+    git(path, "config", "commit.gpgsign", "false")
+
+    path.joinpath("main.py").write_text("print('main')\n")
+    path.joinpath("test_main.py").write_text("def test(): pass\n")
+    git(path, "add", ".")
+    git(path, "commit", "-q", "-m", "init")
+
+    yield path
+
+    shutil.rmtree(path)
+
+
+@pytest.fixture
+def repo(repo_path: Path) -> GitRepo:
+    repo = GitRepo.discover(repo_path)
+    assert repo is not None
+    return repo
+
+
+def test_discover(repo: GitRepo, repo_path: Path):
+    assert repo.root == repo_path
+    assert repo.git_dir == repo_path.joinpath(".git")
+
+
+def test_discover_outside_repository(tmp_path: Path):
+    assert GitRepo.discover(Path("/")) is None
+
+
+def test_blob_hash_matches_git(repo_path: Path):
+    path = repo_path.joinpath("main.py")
+
+    assert blob_hash(path) == git(repo_path, "hash-object", str(path)).strip()
+
+
+def test_changed_files(repo: GitRepo, repo_path: Path):
+    assert repo.changed_files() == set()
+
+    repo_path.joinpath("main.py").write_text("print('changed')\n")
+    repo_path.joinpath("new.py").write_text("")
+
+    assert repo.changed_files() == {
+        repo_path.joinpath("main.py"),
+        repo_path.joinpath("new.py"),
+    }
+
+
+def test_changed_files_since_base(repo: GitRepo, repo_path: Path):
+    repo_path.joinpath("main.py").write_text("print('changed')\n")
+    git(repo_path, "commit", "-q", "-am", "change")
+
+    assert repo.changed_files("HEAD~1") == {repo_path.joinpath("main.py")}
+    assert seed_changes(repo, "HEAD~1") == [str(repo_path.joinpath("main.py"))]
+
+
+def test_seed_changes_invalid_base(repo: GitRepo):
+    assert seed_changes(repo, "no-such-revision") == []
+
+
+def test_file_index_seeded_from_git(repo: GitRepo, repo_path: Path):
+    modified = repo_path.joinpath("main.py")
+    modified.write_text("print('changed')\n")
+
+    index = FileIndex()
+    index.seed_from_git(repo)
+
+    assert len(index) == 2
+    assert index.get(str(modified)) == blob_hash(modified)
+
+    clean = repo_path.joinpath("test_main.py")
+    assert index.get(str(clean)) == blob_hash(clean)
+
+
+def test_file_index_update(repo_path: Path):
+    path = repo_path.joinpath("main.py")
+    index = FileIndex()
+
+    assert index.update(str(path)) is True
+    assert index.update(str(path)) is False
+
+    path.write_text("print('changed')\n")
+    assert index.update(str(path)) is True
+
+    path.unlink()
+    assert index.update(str(path)) is True
+    assert index.update(str(path)) is False
+
+
+def test_unchanged_content_is_ignored(repo: GitRepo, repo_path: Path):
+    trigger = Trigger()
+    index = FileIndex()
+    index.seed_from_git(repo)
+    handler = EventHandler(trigger, index=index)
+
+    path = str(repo_path.joinpath("main.py"))
+    handler.dispatch(events.FileModifiedEvent(path))
+
+    assert not trigger.is_active()
+
+    Path(path).write_text("print('changed')\n")
+    handler.dispatch(events.FileModifiedEvent(path))
+
+    assert trigger.is_active()
+    assert trigger.changes == {path}
+
+
+def test_head_move_is_a_bulk_change(repo: GitRepo, repo_path: Path):
+    git(repo_path, "checkout", "-q", "-b", "feature")
+    repo_path.joinpath("main.py").write_text("print('feature')\n")
+    repo_path.joinpath("README").write_text("")
+    git(repo_path, "add", ".")
+    git(repo_path, "commit", "-q", "-m", "feature")
+
+    trigger = Trigger()
+    event_handler = EventHandler(trigger)
+    handler = GitEventHandler(repo, trigger, event_handler)
+
+    git(repo_path, "checkout", "-q", "main")
+    handler.dispatch(events.FileModifiedEvent(str(repo.git_dir.joinpath("HEAD"))))
+
+    assert trigger.is_active()
+    assert trigger.changes == {str(repo_path.joinpath("main.py"))}
+    assert event_handler.quiet_until > 0
+
+
+def test_commit_of_unchanged_tree_does_not_run(repo: GitRepo, repo_path: Path):
+    trigger = Trigger()
+    index = FileIndex()
+    index.seed_from_git(repo)
+    event_handler = EventHandler(trigger, index=index)
+    handler = GitEventHandler(repo, trigger, event_handler)
+
+    path = repo_path.joinpath("main.py")
+    path.write_text("print('edited')\n")
+    # Recorded by the event of the edit, whose run already took place
+    index.update(str(path))
+
+    git(repo_path, "commit", "-q", "-am", "edit")
+    handler.dispatch(events.FileModifiedEvent(str(repo.git_dir.joinpath("HEAD"))))
+
+    assert not trigger.is_active()
+    assert trigger.changes == set()
+
+    git(repo_path, "checkout", "-q", "HEAD~1")
+    handler.dispatch(events.FileModifiedEvent(str(repo.git_dir.joinpath("HEAD"))))
+
+    assert trigger.changes == {str(path)}
+
+
+def test_no_change_without_head_move(repo: GitRepo):
+    trigger = Trigger()
+    handler = GitEventHandler(repo, trigger, EventHandler(trigger))
+
+    handler.dispatch(events.FileModifiedEvent(str(repo.git_dir.joinpath("index"))))
+
+    assert not trigger.is_active()
@@ -0,0 +1,130 @@
+import os
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from pytest_watcher import hooks
+from pytest_watcher.hooks import PluginManager
+from pytest_watcher.resources import Usage
+from pytest_watcher.runner import RunResult
+from pytest_watcher.tiers import Classifier
+from pytest_watcher.trigger import SOURCE_FILE, RunRequest
+
+
+class CodegenPlugin:
+    def filter_change(self, path):
+        if path.endswith(".proto"):
+            return True
+        return None
+
+    def select_tests(self, path):
+        if path.endswith(".proto"):
+            return ["tests/api"]
+        return None
+
+    def modify_command(self, command, request):
+        return [*command, "--no-header"]
+
+
+class BrokenPlugin:
+    def filter_change(self, path):
+        raise RuntimeError("broken")
+
+
+@pytest.fixture(autouse=True)
+def _reset_discovery(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(hooks, "_discovered", None)
+
+
+def test_empty_manager():
+    plugins = PluginManager()
+
+    assert not plugins
+    assert plugins.filter_change("a.py") is None
+    assert plugins.select_tests("a.py") is None
+    assert plugins.modify_command(["pytest"], MagicMock()) == ["pytest"]
+
+
+def test_hooks():
+    plugins = PluginManager([("codegen", CodegenPlugin())])
+    request = RunRequest((), SOURCE_FILE)
+
+    assert plugins.filter_change("api.proto") is True
+    assert plugins.filter_change("a.py") is None
+    assert plugins.select_tests("api.proto") == ["tests/api"]
+    assert plugins.modify_command(["pytest"], request) == ["pytest", "--no-header"]
+    assert plugins.timings[("codegen", "filter_change")].calls == 2
+
+
+def test_run_finished():
+    plugin = MagicMock(spec=["run_finished"])
+    plugins = PluginManager([("hook", plugin)])
+    result = RunResult(command=[], returncode=0, usage=Usage())
+
+    plugins.run_finished(result, None)
+
+    plugin.run_finished.assert_called_once_with(result, None)
+
+
+def test_failing_plugin_is_skipped(caplog: pytest.LogCaptureFixture):
+    plugins = PluginManager([("broken", BrokenPlugin()), ("codegen", CodegenPlugin())])
+
+    assert plugins.filter_change("api.proto") is True
+    assert "Plugin broken failed in filter_change" in caplog.text
+
+
+def test_slow_hooks_are_reported(mocker: MockerFixture):
+    mocker.patch.object(hooks.time, "perf_counter", side_effect=[0.0, 0.2, 1.0, 1.01])
+    plugins = PluginManager([("codegen", CodegenPlugin())])
+
+    plugins.filter_change("a.py")
+    plugins.select_tests("a.py")
+
+    assert plugins.take_warnings() == ["Plugin codegen took 200 ms in filter_change"]
+    assert plugins.take_warnings() == []
+    assert plugins.timings[("codegen", "filter_change")].slowest == 0.2
+
+
+def test_discover_is_cached(mocker: MockerFixture):
+    entry_point = MagicMock()
+    entry_point.name = "codegen"
+    entry_point.load.return_value = CodegenPlugin
+    mock_entry_points = mocker.patch.object(
+        hooks, "_entry_points", return_value=[entry_point]
+    )
+
+    plugins = PluginManager.discover()
+    PluginManager.discover()
+
+    assert plugins.names == ["codegen"]
+    assert plugins.filter_change("api.proto") is True
+    mock_entry_points.assert_called_once_with()
+
+
+def test_discover_skips_broken_entry_points(
+    mocker: MockerFixture, caplog: pytest.LogCaptureFixture
+):
+    entry_point = MagicMock()
+    entry_point.name = "broken"
+    entry_point.load.side_effect = ImportError("missing")
+    mocker.patch.object(hooks, "_entry_points", return_value=[entry_point])
+
+    assert hooks.discover() == []
+    assert "Unable to load plugin broken" in caplog.text
+
+
+def test_plugin_selection_in_classifier(tmp_path):
+    target = tmp_path.joinpath("api")
+    target.mkdir()
+    try:
+        plugin = MagicMock(spec=["select_tests"])
+        plugin.select_tests.side_effect = lambda p: (
+            [str(target)] if p.endswith(".proto") else None
+        )
+        classifier = Classifier(tmp_path, plugins=PluginManager([("p", plugin)]))
+
+        assert classifier.select(["api.proto"]) == [os.path.relpath(target)]
+        assert classifier.select(["api.proto", "module.py"]) is None
+    finally:
+        target.rmdir()
@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+from pytest_watcher.keys import (
+    CTRL_U,
+    KEY_BACKSPACE,
+    KEY_DELETE,
+    KEY_DOWN,
+    KEY_ENTER,
+    KEY_ESCAPE,
+    KEY_HOME,
+    KEY_LEFT,
+    KEY_UP,
+    KeyReader,
+    LineEditor,
+    parse_keys,
+)
+
+
+@pytest.mark.parametrize(
+    ("text", "keys", "pending"),
+    [
+        ("ab", ["a", "b"], ""),
+        ("\x1b[A\x1bOB", [KEY_UP, KEY_DOWN], ""),
+        ("\x1b[3~\x1b[1;5D", [KEY_DELETE, KEY_LEFT], ""),
+        # F1 and an unknown sequence are not taken for commands
+        ("\x1bOP\x1b[15~w", ["w"], ""),
+        ("\r\n\r\x7f", [KEY_ENTER, KEY_ENTER, KEY_BACKSPACE], ""),
+        ("a\x1b[1", ["a"], "\x1b[1"),
+        ("\x1b", [], "\x1b"),
+        ("\x1bx", [], ""),
+    ],
+)
+def test_parse_keys(text, keys, pending):
+    assert parse_keys(text) == (keys, pending)
+
+
+@pytest.fixture
+def pipe():
+    read_fd, write_fd = os.pipe()
+
+    yield read_fd, write_fd
+
+    os.close(read_fd)
+    os.close(write_fd)
+
+
+def test_key_reader_drains_available_input(pipe):
+    read_fd, write_fd = pipe
+    reader = KeyReader(read_fd)
+
+    os.write(write_fd, "ké\x1b[".encode())
+
+    assert reader.read() == ["k", "é"]
+
+    os.write(write_fd, b"A")
+
+    assert reader.read() == [KEY_UP]
+    assert reader.read() == []
+
+
+def test_key_reader_lone_escape(pipe):
+    read_fd, write_fd = pipe
+    reader = KeyReader(read_fd)
+
+    os.write(write_fd, b"\x1b")
+
+    assert reader.read() == []
+    assert reader.read() == [KEY_ESCAPE]
+
+
+def feed(editor: LineEditor, keys):
+    result = None
+    for key in keys:
+        result = editor.feed(key)
+    return result
+
+
+def test_line_editor():
+    editor = LineEditor("> ", [], text="-x")
+
+    feed(editor, [KEY_HOME, "a", KEY_DELETE, " ", "y", KEY_BACKSPACE, KEY_LEFT])
+
+    assert editor.render() == ("> a x", 3)
+
+    assert feed(editor, [KEY_ENTER]) == "a x"
+    assert editor.done
+
+
+def test_line_editor_cancel():
+    editor = LineEditor("> ", [])
+
+    assert feed(editor, ["a", KEY_ESCAPE]) is None
+    assert editor.done
+
+
+def test_line_editor_history():
+    history = ["-x", "-v"]
+    editor = LineEditor("> ", history, text="draft")
+
+    feed(editor, [KEY_UP, KEY_UP, KEY_UP])
+    assert editor.text == "-x"
+
+    feed(editor, [KEY_DOWN, KEY_DOWN])
+    assert editor.text == "draft"
+
+    feed(editor, [CTRL_U, "-", "q", KEY_ENTER])
+    assert history == ["-x", "-v", "-q"]
@@ -92,3 +92,42 @@ def test_version(capsys: pytest.CaptureFixture):
 
     captured = capsys.readouterr()
     assert captured.out == f"{VERSION}\n"
+
+
+def test_daemon():
+    parsed, _ = parse_arguments([".", "--daemon"])
+    assert parsed.daemon is True
+
+
+@pytest.mark.parametrize("flag", ["--json", "--batch"])
+def test_json(flag: str):
+    parsed, _ = parse_arguments([".", flag, "--max-runs", "3", "--exit-on-idle", "5"])
+
+    assert parsed.json is True
+    assert parsed.max_runs == 3
+    assert parsed.exit_on_idle == 5.0
+
+
+def test_runner_environment():
+    parsed, _ = parse_arguments([".", "--env-file", ".env", "--venv", ".venv"])
+
+    assert parsed.env_file == ".env"
+    assert parsed.venv == ".venv"
+
+
+def test_speculative():
+    parsed, _ = parse_arguments([".", "--speculative"])
+    assert parsed.speculative is True
+
+
+def test_learn_test_inputs():
+    parsed, _ = parse_arguments([".", "--learn-test-inputs"])
+    assert parsed.learn_test_inputs is True
+
+
+def test_record_and_replay():
+    parsed, _ = parse_arguments([".", "--record", "a.jsonl", "--replay", "b.jsonl"])
+
+    assert parsed.record == "a.jsonl"
+    assert parsed.replay == "b.jsonl"
+    assert parsed.replay_speed == 0.0
@@ -0,0 +1,213 @@
+import sys
+import threading
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from pytest_watcher import runner
+from pytest_watcher.pipeline import (
+    NOT_STARTED_RETURNCODE,
+    Stage,
+    StageRun,
+    parse_stages,
+    run_stages,
+)
+from pytest_watcher.resources import Usage
+from pytest_watcher.runner import RunResult
+
+
+class FakeRunner:
+    """Runs the stages by name, failing the ones listed"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.slow_started = threading.Event()
+        self.started: List[str] = []
+        self.terminated: List[str] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, command, on_output, on_start) -> RunResult:
+        name = command[0]
+        terminated = threading.Event()
+
+        class Process:
+            def terminate(_):
+                self.terminated.append(name)
+                terminated.set()
+
+        with self._lock:
+            self.started.append(name)
+        on_start(Process())
+        on_output(f"{name} output\n")
+
+        if name == "slow":
+            self.slow_started.set()
+            terminated.wait(5)
+            return RunResult(command, -15, Usage())
+        return RunResult(command, 1 if name in self.failing else 0, Usage())
+
+
+def make_stages(*specs) -> List[Stage]:
+    return [Stage(name=name, runner=name, needs=list(needs)) for name, needs in specs]
+
+
+def test_stage_command(tmp_path: Path):
+    path = tmp_path.joinpath("a.py").absolute()
+    path.touch()
+    try:
+        stage = Stage(name="lint", runner="ruff", args=["check"], patterns=["*.py"])
+        changes = {str(path), "/deleted.py", "/docs/index.md"}
+
+        assert stage.command(changes) == ["ruff", "check"]
+        assert stage.command({"/docs/index.md"}) is None
+        # Runs not started by a change check everything
+        assert stage.command(set()) == ["ruff", "check"]
+
+        stage.pass_changes = True
+
+        assert stage.command(changes) == ["ruff", "check", str(path)]
+        assert stage.command({"/deleted.py"}) is None
+        # Rather than a command without any file
+        assert stage.command(set(), "src") == ["ruff", "check", "src"]
+    finally:
+        path.unlink()
+
+
+def test_stage_command_without_patterns():
+    stage = Stage(name="docs", runner="mkdocs", args=["build"])
+
+    assert stage.command({"/docs/index.md"}) == ["mkdocs", "build"]
+
+
+def test_parse_stages():
+    data = [
+        {"name": "lint", "runner": "ruff", "args": ["check"], "pass_changes": True},
+        {"name": "types", "runner": "mypy", "patterns": ["*.py"], "needs": ["lint"]},
+    ]
+
+    stages = parse_stages(data)
+
+    assert stages == [
+        Stage(name="lint", runner="ruff", args=["check"], pass_changes=True),
+        Stage(name="types", runner="mypy", patterns=["*.py"], needs=["lint"]),
+    ]
+    assert stages[0].args is not data[0]["args"]
+
+
+@pytest.mark.parametrize(
+    ("data", "error"),
+    [
+        (["ruff"], "Invalid stage"),
+        ([{"name": "lint", "runner": "ruff", "foo": 1}], "Unrecognized stage option"),
+        ([{"name": "lint", "runner": "ruff", "args": "check"}], "Invalid value"),
+        ([{"name": "lint", "runner": "ruff", "args": [1]}], "Invalid value"),
+        ([{"name": "lint", "runner": "ruff", "pass_changes": 1}], "Invalid value"),
+        ([{"name": "lint"}], "needs a name and a runner"),
+        ([{"name": "a", "runner": "a"}, {"name": "a", "runner": "b"}], "Duplicate"),
+        ([{"name": "a", "runner": "a", "needs": ["b"]}], "not defined before"),
+    ],
+)
+def test_parse_stages_invalid(data, error: str):
+    with pytest.raises(SystemExit, match=error):
+        parse_stages(data)
+
+
+def test_run_stages_in_order():
+    run = FakeRunner()
+    stages = make_stages(("lint", []), ("types", ["lint"]), ("docs", []))
+    finished: List[str] = []
+
+    runs = run_stages(stages, set(), run, 4, lambda r: finished.append(r.stage.name))
+
+    assert [r.status for r in runs] == ["passed", "passed", "passed"]
+    assert run.started.index("lint") < run.started.index("types")
+    assert sorted(finished) == ["docs", "lint", "types"]
+    assert runs[0].output == ["lint output\n"]
+
+
+def test_run_stages_skips_unconcerned_stages():
+    run = FakeRunner()
+    stages = [
+        Stage(name="lint", runner="lint", patterns=["*.py"]),
+        Stage(name="types", runner="types", patterns=["*.py"], needs=["lint"]),
+        Stage(name="docs", runner="docs", patterns=["*.md"]),
+    ]
+
+    runs = run_stages(stages, {"/docs/index.md"}, run, 4)
+
+    assert [r.status for r in runs] == ["skipped", "skipped", "passed"]
+    assert run.started == ["docs"]
+
+
+def test_run_stages_stops_on_failure():
+    run = FakeRunner(failing=["lint"])
+    stages = make_stages(("slow", []), ("lint", []), ("types", ["lint"]))
+
+    original = run.__call__
+
+    def run_after_slow(command, on_output, on_start):
+        if command[0] != "slow":
+            run.slow_started.wait(5)
+        return original(command, on_output, on_start)
+
+    runs = run_stages(stages, set(), run_after_slow, 4)
+
+    assert [r.status for r in runs] == ["cancelled", "failed", "cancelled"]
+    assert run.terminated == ["slow"]
+    assert "types" not in run.started
+
+
+def test_run_stages_cancels_queued_stages():
+    run = FakeRunner(failing=["lint"])
+    stages = make_stages(("lint", []), ("types", []))
+
+    runs = run_stages(stages, set(), run, 1)
+
+    assert [r.status for r in runs] == ["failed", "cancelled"]
+    assert run.started == ["lint"]
+
+
+def test_run_stages_with_processes():
+    def run(command, on_output, on_start):
+        return runner.run(command, on_output=on_output, on_start=on_start)
+
+    stages = [
+        Stage(
+            name="sleep",
+            runner=sys.executable,
+            args=["-c", "import time; time.sleep(30)"],
+        ),
+        Stage(name="fail", runner=sys.executable, args=["-c", "print('bad'); exit(3)"]),
+    ]
+
+    runs = run_stages(stages, set(), run, 2)
+
+    assert [r.status for r in runs] == ["cancelled", "failed"]
+    assert runs[1].output == ["bad\n"]
+    assert runs[0].result is not None and runs[0].result.duration < 30
+
+
+def test_run_stages_with_missing_runner(tmp_path: Path):
+    def run(command, on_output, on_start):
+        return runner.run(command, on_output=on_output, on_start=on_start)
+
+    missing = str(tmp_path.absolute() / "missing-linter")
+    stages = [
+        Stage(name="lint", runner=missing),
+        Stage(name="types", runner=sys.executable, args=["-c", ""], needs=["lint"]),
+    ]
+
+    runs = run_stages(stages, set(), run, 2)
+
+    assert [r.status for r in runs] == ["failed", "cancelled"]
+    assert runs[0].result is not None
+    assert runs[0].result.returncode == NOT_STARTED_RETURNCODE
+    assert runs[0].output[0].startswith(f"[ptw] Unable to run {missing}: ")
+
+
+def test_stage_run_status():
+    stage = Stage(name="lint", runner="ruff")
+
+    assert StageRun(stage, None).status == "skipped"
+    assert StageRun(stage, ["ruff"]).status == "cancelled"
@@ -0,0 +1,134 @@
+import cProfile
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from pytest_watcher.plugin import PROFILE_OUTPUT_ENV
+from pytest_watcher.profiling import Profile, Profiler, ProfilerUnavailable
+
+
+def busy():
+    return sum(i * i for i in range(10000))
+
+
+@pytest.fixture
+def pstats_path(tmp_path: Path):
+    path = tmp_path.joinpath("run.pstats")
+
+    profiler = cProfile.Profile()
+    profiler.runcall(busy)
+    profiler.dump_stats(str(path))
+
+    yield path
+
+    path.unlink()
+
+
+@pytest.fixture
+def collapsed_path(tmp_path: Path):
+    path = tmp_path.joinpath("run.collapsed")
+    path.write_text(
+        "main (a.py:1);test_foo (test_a.py:3);slow (a.py:9) 30\n"
+        "main (a.py:1);test_bar (test_a.py:7);slow (a.py:9) 12\n"
+        "main (a.py:1);test_bar (test_a.py:7) 5\n"
+    )
+
+    yield path
+
+    path.unlink()
+
+
+def test_load_pstats(pstats_path: Path):
+    profile = Profile.load(pstats_path)
+
+    assert profile.unit == "s"
+    assert any("busy" in func for func in profile.hotspots)
+
+
+def test_load_collapsed(collapsed_path: Path):
+    profile = Profile.load(collapsed_path)
+
+    assert profile.unit == "samples"
+    assert profile.top(2) == [("slow (a.py:9)", 42), ("test_bar (test_a.py:7)", 5)]
+
+
+def test_diff():
+    previous = Profile(Path("a"), "s", {"foo": 1.0, "bar": 2.0, "baz": 0.5})
+    current = Profile(Path("b"), "s", {"foo": 1.5, "bar": 0.5, "baz": 0.5, "new": 0.1})
+
+    assert current.diff(previous) == [("bar", -1.5), ("foo", 0.5), ("new", 0.1)]
+
+
+def test_diff_different_units():
+    previous = Profile(Path("a"), "samples", {"foo": 1})
+    current = Profile(Path("b"), "s", {"foo": 2.0})
+
+    assert current.diff(previous) == []
+
+
+def test_prepare_pytest(tmp_path: Path):
+    command, env, path = Profiler().prepare(["pytest", "-x"], tmp_path)
+
+    assert command == ["pytest", "-p", "pytest_watcher.plugin", "-x"]
+    assert env == {PROFILE_OUTPUT_ENV: str(path)}
+    assert path.parent == tmp_path
+    assert path.suffix == ".pstats"
+
+
+def test_prepare_py_spy(tmp_path: Path, mocker: MockerFixture):
+    mocker.patch("pytest_watcher.profiling.shutil.which", return_value="/bin/py-spy")
+
+    command, env, path = Profiler().prepare(["tox", "-e", "py"], tmp_path)
+
+    assert command[0] == "/bin/py-spy"
+    assert command[-4:] == ["--", "tox", "-e", "py"]
+    assert str(path) in command
+    assert env == {}
+
+
+def test_prepare_unavailable(tmp_path: Path, mocker: MockerFixture):
+    mocker.patch("pytest_watcher.profiling.shutil.which", return_value=None)
+
+    with pytest.raises(ProfilerUnavailable):
+        Profiler().prepare(["tox"], tmp_path)
+
+
+def test_report_compares_with_previous_run(collapsed_path: Path, tmp_path: Path):
+    profiler = Profiler()
+
+    first = profiler.report(collapsed_path)
+    assert "Top 10 hotspots" in first
+    assert "Compared to" not in first
+
+    collapsed_path.write_text("main (a.py:1);slow (a.py:9) 10\n")
+    second = profiler.report(collapsed_path)
+
+    assert "Compared to run.collapsed" in second
+    assert "-32  slow (a.py:9)" in second
+
+
+def test_report_unreadable_profile(tmp_path: Path):
+    assert "Unable to read profile" in Profiler().report(tmp_path / "missing.pstats")
+
+
+def test_plugin_writes_profile(tmp_path: Path):
+    test_file = tmp_path.joinpath("test_plugin_profile.py")
+    test_file.write_text("def test_ok():\n    assert sum(range(10)) == 45\n")
+    output = tmp_path.joinpath("plugin.pstats")
+
+    subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "pytest_watcher.plugin"]
+        + ["-p", "no:cacheprovider", str(test_file)],
+        env={**os.environ, PROFILE_OUTPUT_ENV: str(output)},
+        check=True,
+        capture_output=True,
+    )
+
+    assert any("test_ok" in func for func in Profile.load(output).hotspots)
+
+    test_file.unlink()
+    output.unlink()
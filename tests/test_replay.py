@@ -0,0 +1,103 @@
+import json
+import shutil
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from watchdog import events
+
+from pytest_watcher.config import Config
+from pytest_watcher.inotify import Event
+from pytest_watcher.replay import Recorder, RecordingHandler, load, replay
+
+
+@pytest.fixture
+def recordings(tmp_path: Path):
+    path = tmp_path.joinpath("recordings").absolute()
+    path.mkdir()
+
+    yield path
+
+    shutil.rmtree(path)
+
+
+def write_recording(path: Path, entries) -> Path:
+    lines = [{"version": 1, "root": "/project", "time": 0.0}, *entries]
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    return path
+
+
+def modified(at: float, path: str) -> list:
+    return ["e", at, events.EVENT_TYPE_MODIFIED, path, "", False]
+
+
+@pytest.mark.parametrize("name", ["events.jsonl", "events.jsonl.gz"])
+def test_recorder(recordings: Path, name: str):
+    path = recordings.joinpath(name)
+    recorder = Recorder(path, Path("/project"))
+    handler = MagicMock()
+    recording_handler = RecordingHandler(handler, recorder)
+    event = Event(events.EVENT_TYPE_MOVED, "/project/a.py", "/project/b.py")
+
+    recording_handler.dispatch(event)
+    recording_handler.handle_overflow([("/project", True)], 0.0)
+    recorder.record_run(0.0)
+    recorder.close()
+
+    handler.dispatch.assert_called_once_with(event)
+    handler.handle_overflow.assert_called_once_with([("/project", True)], 0.0)
+
+    header, entries = load(path)
+    assert header["root"] == "/project"
+    assert [entry[0] for entry in entries] == ["e", "o", "r"]
+    assert entries[0][2:] == ["moved", "/project/a.py", "/project/b.py", False]
+
+
+def test_load_invalid(recordings: Path):
+    path = recordings.joinpath("events.jsonl")
+    path.write_text("[]\n")
+
+    with pytest.raises(SystemExit):
+        load(path)
+
+
+def test_replay_coalesces_events(recordings: Path):
+    path = write_recording(
+        recordings.joinpath("events.jsonl"),
+        [
+            modified(0.0, "/project/a.py"),
+            modified(0.1, "/project/b.py"),
+            modified(0.15, "/project/a.py"),
+            modified(0.5, "/project/notes.txt"),
+            modified(5.0, "/project/c.py"),
+        ],
+    )
+
+    report = replay(path, Config(path=Path(), delay=0.2))
+
+    assert report.events == 5
+    assert [run.changes for run in report.runs] == [2, 1]
+    first, second = report.runs
+    assert 0.35 < first.at < 0.45
+    assert first.latency == pytest.approx(first.at)
+    assert 5.2 < second.at <= 5.3
+
+
+def test_replay_releases_changes_made_during_a_run(recordings: Path):
+    path = write_recording(
+        recordings.joinpath("events.jsonl"),
+        [
+            modified(0.0, "/project/a.py"),
+            ["r", 0.25, 1.0],
+            modified(0.5, "/project/b.py"),
+            modified(3.0, "/project/c.py"),
+        ],
+    )
+
+    report = replay(path, Config(path=Path(), delay=0.2))
+
+    assert [run.duration for run in report.runs] == [1.0, 0.0]
+    # Like in the main loop, the change made during the run waits for the next one
+    assert [run.changes for run in report.runs] == [1, 2]
+    assert report.runs[1].latency > 2.5
+    assert "2 runs" in report.render()
@@ -0,0 +1,92 @@
+import os
+import shutil
+import time
+from pathlib import Path
+
+import pytest
+
+from pytest_watcher.git import FileIndex
+from pytest_watcher.rescan import list_directories, rescan
+
+
+@pytest.fixture
+def root(tmp_path: Path):
+    path = tmp_path.joinpath("rescan").absolute()
+    path.joinpath("pkg", "__pycache__").mkdir(parents=True)
+
+    yield path
+
+    shutil.rmtree(path)
+
+
+def write(path: Path, content: str, age: float = 0) -> str:
+    path.write_text(content)
+    if age:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def is_python(path: str) -> bool:
+    return path.endswith(".py")
+
+
+def test_list_directories(root: Path):
+    assert list_directories([(str(root), True)]) == [str(root), str(root / "pkg")]
+    assert list_directories([(str(root), False)]) == [str(root)]
+
+
+def test_rescan_compares_with_index(root: Path):
+    index = FileIndex()
+    unchanged = write(root / "unchanged.py", "1")
+    modified = write(root / "pkg" / "modified.py", "1")
+    old = write(root / "old.py", "1", age=3600)
+    removed = write(root / "removed.py", "1")
+    for path in (unchanged, modified, old, removed):
+        index.update(path)
+
+    since = time.time() - 60
+    write(root / "unchanged.py", "1")
+    write(root / "pkg" / "modified.py", "2")
+    created = write(root / "created.py", "1")
+    write(root / "pkg" / "__pycache__" / "cached.py", "1")
+    write(root / "notes.txt", "1")
+    os.unlink(removed)
+
+    changed = rescan([(str(root), True)], index, is_python, since)
+
+    assert changed == sorted([modified, created, removed])
+    assert index.get(removed) is None
+    assert index.get(created) is not None
+
+
+def test_rescan_finds_renamed_files(root: Path):
+    index = FileIndex()
+    before = write(root / "before.py", "1", age=3600)
+    index.update(before)
+
+    after = str(root / "after.py")
+    os.rename(before, after)
+
+    changed = rescan([(str(root), True)], index, is_python, time.time() - 60)
+
+    # The mtime is kept by the rename
+    assert changed == sorted([before, after])
+
+
+def test_rescan_skips_files_modified_before_since(root: Path):
+    write(root / "old.py", "1", age=3600)
+    recent = write(root / "recent.py", "1")
+
+    changed = rescan([(str(root), True)], None, is_python, time.time() - 60)
+
+    assert changed == [recent]
+
+
+def test_rescan_non_recursive(root: Path):
+    top = write(root / "conftest.py", "1")
+    write(root / "pkg" / "a.py", "1")
+
+    changed = rescan([(str(root), False)], None, is_python, time.time() - 60)
+
+    assert changed == [top]
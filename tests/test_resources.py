@@ -0,0 +1,94 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+from pytest_watcher import resources
+from pytest_watcher.resources import MB, SessionStats, Usage
+
+
+def test_peak_rss_uses_samples():
+    usage = Usage(max_rss=None, rss_samples=[(0.1, 10 * MB), (0.2, 30 * MB)])
+    assert usage.peak_rss == 30 * MB
+
+    usage.max_rss = 50 * MB
+    assert usage.peak_rss == 50 * MB
+
+
+def test_summary():
+    usage = Usage(duration=2, user_time=1.5, system_time=0.25, max_rss=64 * MB)
+
+    summary = usage.summary()
+
+    assert "time 2.00s" in summary
+    assert "cpu 1.75s (user 1.50s, sys 0.25s)" in summary
+    assert "peak RSS 64.0 MB" in summary
+
+
+def test_summary_without_rss():
+    assert "RSS" not in Usage().summary()
+
+
+def test_usage_from_rusage():
+    rusage = SimpleNamespace(
+        ru_utime=1.5,
+        ru_stime=0.5,
+        ru_maxrss=1024,
+        ru_inblock=8,
+        ru_oublock=16,
+        ru_nvcsw=3,
+        ru_nivcsw=4,
+    )
+
+    usage = Usage.from_rusage(2.0, rusage)
+
+    assert usage.duration == 2.0
+    assert usage.cpu_time == 2.0
+    assert usage.max_rss == 1024 * resources.MAXRSS_UNIT
+    assert (usage.read_blocks, usage.write_blocks) == (8, 16)
+    assert (usage.voluntary_switches, usage.involuntary_switches) == (3, 4)
+
+    assert Usage.from_rusage(2.0) == Usage(duration=2.0)
+
+
+def test_read_rss(tmp_path: Path):
+    status = tmp_path.joinpath("status")
+    status.write_text("Name:\tpython\nVmPeak:\t 2048 kB\nVmRSS:\t 1024 kB\n")
+
+    assert resources.read_rss(status) == 1024 * 1024
+
+    status.unlink()
+    assert resources.read_rss(status) is None
+
+
+def test_stats_no_warnings_for_first_run():
+    stats = SessionStats()
+
+    assert stats.add(Usage(max_rss=500 * MB, user_time=100)) == []
+    assert len(stats.runs) == 1
+
+
+def test_stats_rss_growth_is_flagged():
+    stats = SessionStats()
+    stats.add(Usage(max_rss=100 * MB))
+    stats.add(Usage(max_rss=110 * MB))
+
+    warnings = stats.add(Usage(max_rss=400 * MB))
+
+    assert len(warnings) == 1
+    assert "Peak RSS grew by 295 MB" in warnings[0]
+
+
+def test_stats_cpu_growth_is_flagged():
+    stats = SessionStats()
+    stats.add(Usage(user_time=2))
+
+    assert stats.add(Usage(user_time=2.5)) == []
+    assert "CPU time grew" in stats.add(Usage(user_time=5))[0]
+
+
+def test_stats_history_is_bounded():
+    stats = SessionStats(size=2)
+
+    for _ in range(5):
+        stats.add(Usage())
+
+    assert len(stats.runs) == 2
@@ -0,0 +1,85 @@
+import os
+import sys
+
+import pytest
+
+from pytest_watcher import runner
+
+
+def test_run_returncode():
+    result = runner.run([sys.executable, "-c", "raise SystemExit(3)"])
+
+    assert result.returncode == 3
+    assert result.command == [sys.executable, "-c", "raise SystemExit(3)"]
+    assert result.duration > 0
+
+
+def test_run_captures_output():
+    lines = []
+
+    result = runner.run(
+        [sys.executable, "-c", "print('foo'); print('bar')"], on_output=lines.append
+    )
+
+    assert result.returncode == 0
+    assert lines == ["foo\n", "bar\n"]
+
+
+@pytest.mark.skipif(not hasattr(os, "wait4"), reason="wait4 is not available")
+def test_run_collects_peak_rss():
+    result = runner.run([sys.executable, "-c", "data = b'x' * 50 * 1024 * 1024"])
+
+    assert result.usage.max_rss is not None
+    assert result.usage.max_rss > 50 * 1024 * 1024
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="requires /proc")
+def test_run_samples_rss():
+    result = runner.run(
+        [sys.executable, "-c", "import time; time.sleep(0.2)"], sample_interval=0.01
+    )
+
+    assert result.usage.rss_samples
+    assert all(rss > 0 for _, rss in result.usage.rss_samples)
+
+
+def test_run_env_extends_base_env():
+    lines = []
+
+    runner.run(
+        [sys.executable, "-c", "import os; print(os.environ['A'], os.environ['B'])"],
+        on_output=lines.append,
+        env={"B": "2"},
+        base_env={**os.environ, "A": "1"},
+    )
+
+    assert lines == ["1 2\n"]
+
+
+@pytest.mark.parametrize(
+    "command, expected",
+    [
+        (["pytest", "-x"], ["pytest", "-p", runner.PLUGIN, "-x"]),
+        (
+            ["python", "-m", "pytest", "-x"],
+            ["python", "-m", "pytest", "-p", runner.PLUGIN, "-x"],
+        ),
+    ],
+)
+def test_with_plugin(command, expected):
+    assert runner.with_plugin(command) == expected
+    assert runner.is_pytest_command(command)
+
+
+@pytest.mark.parametrize(
+    "args, expected",
+    [
+        ([], ([], [])),
+        (["-x", "tests"], (["-x"], ["tests"])),
+        (["--cov", "src", "-x"], (["--cov", "src", "-x"], [])),
+        (["--cov=src", "tests"], (["--cov=src"], ["tests"])),
+        (["-k", "slow", "t.py::test"], (["-k", "slow"], ["t.py::test"])),
+    ],
+)
+def test_split_args(args, expected):
+    assert runner.split_args(args) == expected
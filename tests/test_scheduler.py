@@ -0,0 +1,174 @@
+import os
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from pytest_watcher import scheduler
+from pytest_watcher.config import Config
+from pytest_watcher.scheduler import MB, Scheduler, on_battery
+
+
+@pytest.fixture
+def lock_dir(tmp_path: Path):
+    path = tmp_path.joinpath("locks")
+
+    yield path
+
+    if path.exists():
+        for file in path.glob("*"):
+            file.unlink()
+        path.rmdir()
+
+
+@pytest.fixture
+def sched(lock_dir: Path):
+    return Scheduler(lock_dir)
+
+
+@pytest.fixture(autouse=True)
+def _no_battery(mocker: MockerFixture):
+    return mocker.patch("pytest_watcher.scheduler.on_battery", return_value=False)
+
+
+def test_disabled_by_default(sched: Scheduler, config: Config, lock_dir: Path):
+    assert sched.try_acquire(config, 0) is not None
+    assert not lock_dir.exists()
+
+
+def test_load_pressure(sched: Scheduler, config: Config, mocker: MockerFixture):
+    mock_load = mocker.patch("pytest_watcher.scheduler.get_load", return_value=3.0)
+    config.max_load = 2.0
+
+    assert sched.try_acquire(config, 0) is None
+    assert sched.reason is not None
+    assert "load average" in sched.reason
+
+    mock_load.return_value = 1.5
+    assert sched.try_acquire(config, 0) is not None
+    assert sched.reason is None
+
+
+def test_load_threshold_halved_on_battery(
+    sched: Scheduler, config: Config, mocker: MockerFixture, _no_battery
+):
+    mocker.patch("pytest_watcher.scheduler.get_load", return_value=1.5)
+    _no_battery.return_value = True
+    config.max_load = 2.0
+
+    assert sched.try_acquire(config, 0) is None
+
+
+def test_memory_pressure(sched: Scheduler, config: Config, mocker: MockerFixture):
+    mocker.patch("pytest_watcher.scheduler.get_available_memory", return_value=100 * MB)
+    config.min_free_memory = 200
+
+    assert sched.try_acquire(config, 0) is None
+    assert sched.reason == "available memory 100 MB is below 200 MB"
+
+
+@pytest.mark.skipif(scheduler.fcntl is None, reason="requires fcntl")
+def test_parallel_runs_are_capped(config: Config, lock_dir: Path):
+    config.max_parallel_runs = 1
+    first, second = Scheduler(lock_dir), Scheduler(lock_dir)
+
+    slot = first.try_acquire(config, 0)
+    assert slot is not None
+
+    assert second.try_acquire(config, 0) is None
+    assert second.reason == "all 1 run slots are busy"
+
+    slot.release()
+    assert second.try_acquire(config, 0) is not None
+
+
+@pytest.mark.skipif(scheduler.fcntl is None, reason="requires fcntl")
+def test_lock_dir_is_shared_by_every_user(
+    sched: Scheduler, config: Config, lock_dir: Path
+):
+    config.max_parallel_runs = 1
+
+    slot = sched.try_acquire(config, 0)
+    assert slot is not None
+    slot.release()
+
+    assert lock_dir.stat().st_mode & 0o7777 == 0o1777
+    assert lock_dir.joinpath("slot-0.lock").stat().st_mode & 0o777 == 0o444
+
+
+def test_lock_dir_ignores_runtime_dir(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", "/run/user/1000")
+
+    assert not str(scheduler.get_lock_dir()).startswith("/run/user/1000")
+
+
+@pytest.mark.skipif(scheduler.fcntl is None, reason="requires fcntl")
+def test_runs_without_slot_on_permission_error(
+    sched: Scheduler, config: Config, mocker: MockerFixture
+):
+    mocker.patch(
+        "pytest_watcher.scheduler.os.open", side_effect=PermissionError("slot-0.lock")
+    )
+    config.max_parallel_runs = 1
+
+    assert sched.try_acquire(config, 0) is not None
+    assert sched.reason is None
+
+
+@pytest.mark.skipif(scheduler.fcntl is None, reason="requires fcntl")
+def test_most_recently_edited_project_has_priority(
+    sched: Scheduler, config: Config, lock_dir: Path
+):
+    config.max_parallel_runs = 1
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    lock_dir.joinpath(f"waiting-{os.getppid()}.ticket").write_text("200.0")
+
+    assert sched.try_acquire(config, 100.0) is None
+    assert sched.reason == "a more recently edited project is waiting"
+
+    slot = sched.try_acquire(config, 300.0)
+    assert slot is not None
+    slot.release()
+
+    assert not lock_dir.joinpath(f"waiting-{os.getpid()}.ticket").exists()
+
+
+@pytest.mark.skipif(scheduler.fcntl is None, reason="requires fcntl")
+def test_tickets_of_dead_processes_are_removed(
+    sched: Scheduler, config: Config, lock_dir: Path, mocker: MockerFixture
+):
+    mocker.patch("pytest_watcher.scheduler._is_alive", side_effect=lambda pid: False)
+    config.max_parallel_runs = 1
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    ticket = lock_dir.joinpath("waiting-999999.ticket")
+    ticket.write_text("200.0")
+
+    slot = sched.try_acquire(config, 100.0)
+
+    assert slot is not None
+    assert not ticket.exists()
+    slot.release()
+
+
+def test_get_available_memory(tmp_path: Path):
+    meminfo = tmp_path.joinpath("meminfo")
+    meminfo.write_text("MemTotal: 2048 kB\nMemAvailable: 1024 kB\n")
+
+    assert scheduler.get_available_memory(meminfo) == 1024 * 1024
+
+    meminfo.unlink()
+    assert scheduler.get_available_memory(meminfo) is None
+
+
+def test_on_battery(tmp_path_factory: pytest.TempPathFactory):
+    power_supply = tmp_path_factory.mktemp("power_supply")
+    battery = power_supply.joinpath("BAT0")
+    battery.mkdir()
+
+    battery.joinpath("status").write_text("Charging\n")
+    assert not on_battery(power_supply)
+
+    battery.joinpath("status").write_text("Discharging\n")
+    assert on_battery(power_supply)
+
+    assert not on_battery(power_supply.joinpath("missing"))
@@ -0,0 +1,142 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from pytest_watcher.config import Config
+from pytest_watcher.scope import (
+    DEFAULT_PATTERNS,
+    derive_scope,
+    find_packages,
+    find_pytest_ini,
+    read_testpaths,
+)
+
+
+@pytest.fixture
+def project(tmp_path: Path):
+    path = tmp_path.joinpath("project").absolute()
+    path.mkdir()
+
+    yield path
+
+    shutil.rmtree(path)
+
+
+def make_dirs(root: Path, *names: str) -> None:
+    for name in names:
+        root.joinpath(name).mkdir(parents=True)
+
+
+def make_package(root: Path, name: str) -> None:
+    make_dirs(root, name)
+    root.joinpath(name, "__init__.py").touch()
+
+
+def test_whole_path_without_testpaths(project: Path):
+    make_package(project, "pkg")
+
+    scope = derive_scope(Config(path=project))
+
+    assert scope.paths == [(project, "project path")]
+    assert not scope.is_narrowed
+    assert scope.patterns == DEFAULT_PATTERNS
+
+
+def test_pyproject_testpaths_and_src_layout(project: Path):
+    project.joinpath("pyproject.toml").write_text(
+        '[project]\nname = "not-installed-project"\n'
+        '[tool.pytest.ini_options]\ntestpaths = ["tests"]\n'
+    )
+    make_dirs(project, "tests", "src/pkg", "docs")
+
+    scope = derive_scope(Config(path=project))
+
+    assert scope.paths == [
+        (project.joinpath("tests"), "testpaths"),
+        (project.joinpath("src"), "package src"),
+    ]
+    assert scope.is_narrowed
+    assert scope.patterns == ["*.py", "pyproject.toml"]
+    assert "top-level files only" in scope.describe()
+
+
+def test_pytest_ini_and_flat_layout(project: Path):
+    project.joinpath("pytest.ini").write_text("[pytest]\ntestpaths = tests\n")
+    make_dirs(project, "tests", "scripts")
+    make_package(project, "pkg")
+
+    scope = derive_scope(Config(path=project))
+
+    assert [p for p, _ in scope.paths] == [
+        project.joinpath("tests"),
+        project.joinpath("pkg"),
+        project.joinpath("scripts"),
+    ]
+    assert scope.patterns == ["*.py", "pytest.ini"]
+
+
+def test_flat_layout_keeps_namespace_packages(project: Path):
+    project.joinpath("pytest.ini").write_text("[pytest]\ntestpaths = tests\n")
+    # Neither has an __init__.py
+    make_dirs(project, "tests", "ns/pkg", "lib", ".venv", "node_modules")
+
+    assert find_packages(project) == [
+        project.joinpath("lib"),
+        project.joinpath("ns"),
+        project.joinpath("tests"),
+    ]
+
+
+def test_nested_testpaths_are_merged(project: Path):
+    project.joinpath("tox.ini").write_text("[pytest]\ntestpaths = pkg/tests\n")
+    make_package(project, "pkg")
+    make_dirs(project, "pkg/tests")
+
+    scope = derive_scope(Config(path=project))
+
+    assert scope.paths == [(project.joinpath("pkg"), "package pkg")]
+
+
+def test_watch_paths_override(project: Path):
+    project.joinpath("pytest.ini").write_text("[pytest]\ntestpaths = tests\n")
+
+    scope = derive_scope(Config(path=project, watch_paths=["lib", "checks"]))
+
+    assert scope.paths == [
+        (project.joinpath("lib"), "watch_paths"),
+        (project.joinpath("checks"), "watch_paths"),
+    ]
+    assert scope.patterns == DEFAULT_PATTERNS
+
+
+def test_find_pytest_ini_skips_files_without_pytest_section(project: Path):
+    project.joinpath("pyproject.toml").write_text("[tool.black]\n")
+    project.joinpath("setup.cfg").write_text("[flake8]\n")
+    project.joinpath("tox.ini").write_text("[pytest]\n")
+
+    assert find_pytest_ini(project) == project.joinpath("tox.ini")
+
+
+def test_find_pytest_ini_in_parent_directory(project: Path):
+    project.joinpath("setup.cfg").write_text("[tool:pytest]\n")
+    make_dirs(project, "sub")
+
+    assert find_pytest_ini(project.joinpath("sub")) == project.joinpath("setup.cfg")
+
+
+def test_read_testpaths_globs(project: Path):
+    ini = project.joinpath("setup.cfg")
+    ini.write_text("[tool:pytest]\ntestpaths =\n    tests_*\n    missing\n")
+    make_dirs(project, "tests_unit", "tests_integration")
+
+    assert read_testpaths(ini) == [
+        project.joinpath("tests_integration"),
+        project.joinpath("tests_unit"),
+    ]
+
+
+def test_find_packages_from_import_location():
+    root = Path(__file__).parent.parent
+
+    assert find_packages(root) == [root.joinpath("pytest_watcher").absolute()]
@@ -0,0 +1,99 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from pytest_watcher.scope import PytestCache
+from pytest_watcher.search import NODE_IDS_KEY, TestIndex
+
+NODE_IDS = [
+    "tests/test_config.py::test_parse_toml",
+    "tests/test_config.py::test_reload",
+    "tests/test_watcher.py::TestLoop::test_main_loop",
+    "tests/test_watcher.py::TestLoop::test_main_loop_deferred",
+    "tests/test_watcher.py::test_parse_arguments[--now]",
+]
+
+
+@pytest.fixture
+def project(tmp_path: Path):
+    path = tmp_path.joinpath("search").absolute()
+    path.joinpath("tests").mkdir(parents=True)
+    path.joinpath("pytest.ini").write_text("[pytest]\ncache_dir = .cache\n")
+
+    yield path
+
+    shutil.rmtree(path)
+
+
+def write_node_ids(root: Path, node_ids) -> None:
+    path = PytestCache(root).file(NODE_IDS_KEY)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(node_ids))
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("reload", [NODE_IDS[1]]),
+        ("MAIN_LOOP", [NODE_IDS[2], NODE_IDS[3]]),
+        ("testloop deferred", [NODE_IDS[3]]),
+        ("test_config.py", NODE_IDS[:2]),
+        ("[--now]", [NODE_IDS[4]]),
+        # No substring match, the letters in order
+        ("mlpdef", [NODE_IDS[3]]),
+        # Within a part of the ID
+        ("wloop", []),
+        ("ptoml watcher", []),
+        ("", []),
+        ("  ", []),
+    ],
+)
+def test_search(query: str, expected):
+    assert TestIndex(NODE_IDS).search(query) == expected
+
+
+def test_search_narrows_previous_matches():
+    index = TestIndex(NODE_IDS)
+
+    assert len(index.search("main")) == 2
+    assert index.search("main_loop_d") == [NODE_IDS[3]]
+    # A query not extending the previous one searches everything again
+    assert index.search("config") == NODE_IDS[:2]
+
+
+def test_resolve_collapses_whole_files():
+    index = TestIndex(NODE_IDS)
+
+    assert index.resolve(index.search("test_")) == [
+        "tests/test_config.py",
+        "tests/test_watcher.py",
+    ]
+    assert index.resolve(index.search("main_loop")) == [NODE_IDS[2], NODE_IDS[3]]
+
+
+def test_load(project: Path):
+    project.joinpath("tests", "test_config.py").touch()
+    write_node_ids(project, NODE_IDS)
+
+    index = TestIndex.load(project)
+
+    # The tests of the removed files are left out
+    assert index.node_ids == NODE_IDS[:2]
+    assert project.joinpath(".cache", "v", NODE_IDS_KEY).exists()
+    assert TestIndex.load(project) is index
+
+    write_node_ids(project, NODE_IDS[:1])
+
+    assert TestIndex.load(project).node_ids == NODE_IDS[:1]
+
+
+@pytest.mark.parametrize("content", [None, "not json"])
+def test_load_without_cache(project: Path, content):
+    if content is not None:
+        path = PytestCache(project).file(NODE_IDS_KEY)
+        path.parent.mkdir(parents=True)
+        path.write_text(content)
+
+    assert len(TestIndex.load(project)) == 0
@@ -0,0 +1,62 @@
+import os
+from pathlib import Path
+
+from pytest_mock import MockerFixture
+
+from pytest_watcher.resources import Usage
+from pytest_watcher.runner import RunResult
+from pytest_watcher.session import Session
+
+
+def test_session_without_state_is_not_persisted(_isolate_cache_dir: Path):
+    session = Session()
+    session.record(RunResult(command=[], returncode=0, usage=Usage()))
+    session.save()
+
+    assert not _isolate_cache_dir.exists()
+
+
+def test_restore_resumes_previous_session():
+    session = Session.restore(Path("."))
+    session.changes = {"a.py"}
+    session.index.update(__file__)
+    session.record(
+        RunResult(command=["pytest"], returncode=1, usage=Usage(duration=2.0))
+    )
+    session.save()
+
+    restored = Session.restore(Path("."))
+
+    assert restored.index.get(__file__) == session.index.get(__file__)
+    assert [u.duration for u in restored.stats.runs] == [2.0]
+
+    assert restored.data_deps is not None
+    results = restored.state.get("results")
+    assert len(results) == 1
+    assert results[0]["returncode"] == 1
+    assert results[0]["changes"] == 1
+
+
+def test_restore_resumes_test_inputs():
+    session = Session.restore(Path("."))
+    assert session.data_deps is not None
+    session.data_deps.replace({"tests/test_a.py": ["tests/data/a.json"]})
+    session.save()
+
+    restored = Session.restore(Path("."))
+
+    assert restored.data_deps is not None
+    assert restored.data_deps.targets("tests/data/a.json") == [
+        os.path.abspath("tests/test_a.py")
+    ]
+
+
+def test_record_reports_slow_plugins(mocker: MockerFixture):
+    session = Session()
+    mocker.patch.object(
+        session.plugins, "take_warnings", return_value=["Plugin p took 200 ms"]
+    )
+
+    warnings = session.record(RunResult(command=[], returncode=0, usage=Usage()))
+
+    assert warnings == ["Plugin p took 200 ms"]
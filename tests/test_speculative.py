@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from pytest_watcher.speculative import SpeculativeGuard
+from pytest_watcher.tiers import Classifier
+from pytest_watcher.trigger import SOURCE_FILE, RunRequest, Trigger
+
+
+@pytest.fixture
+def classifier(tmp_path: Path) -> Classifier:
+    return Classifier(tmp_path.absolute())
+
+
+def make_request(root: Path, *names: str) -> RunRequest:
+    return RunRequest((), SOURCE_FILE, {str(root.absolute() / n) for n in names})
+
+
+@pytest.fixture
+def test_file(tmp_path: Path):
+    path = tmp_path.joinpath("test_a.py")
+    path.touch()
+    yield path
+    path.unlink()
+
+
+def test_whole_suite_is_affected_by_any_change(tmp_path: Path, classifier: Classifier):
+    guard = SpeculativeGuard(Trigger(), make_request(tmp_path, "pkg.py"), classifier)
+
+    assert guard.affects(str(tmp_path / "test_b.py"))
+
+
+def test_selected_tests_are_affected_by_their_inputs(
+    tmp_path: Path, classifier: Classifier, test_file: Path
+):
+    request = make_request(tmp_path, "test_a.py")
+    guard = SpeculativeGuard(Trigger(), request, classifier, affected=True)
+    root = tmp_path.absolute()
+
+    assert guard.affects(str(root / "test_a.py"))
+    assert guard.affects(str(root / "conftest.py"))
+    assert guard.affects(str(root / "module.py"))
+    assert not guard.affects(str(root / "test_b.py"))
+    assert not guard.affects(str(root / "sub" / "conftest.py"))
+
+
+def run_guarded(guard: SpeculativeGuard) -> int:
+    proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(5)"])
+    guard.on_start(proc)
+    try:
+        return proc.wait(timeout=10)
+    finally:
+        guard.stop()
+
+
+def test_affecting_change_cancels_the_run(tmp_path: Path, classifier: Classifier):
+    trigger = Trigger(delay=5)
+    guard = SpeculativeGuard(
+        trigger, make_request(tmp_path, "pkg.py"), classifier, interval=0.01
+    )
+    changed = str(tmp_path.absolute() / "other.py")
+    trigger.emit(changed)
+
+    started = time.monotonic()
+    returncode = run_guarded(guard)
+
+    assert returncode != 0
+    assert time.monotonic() - started < 5
+    assert guard.cancelled
+    assert guard.cancelled_by == changed
+
+
+def test_guard_stops_after_the_delay(tmp_path: Path, classifier: Classifier):
+    trigger = Trigger(delay=0)
+    guard = SpeculativeGuard(
+        trigger, make_request(tmp_path, "pkg.py"), classifier, interval=0.01
+    )
+    proc = MagicMock()
+
+    guard.on_start(proc)
+    assert guard._thread is not None
+    guard._thread.join(timeout=5)
+    trigger.emit(str(tmp_path / "other.py"))
+    guard.stop()
+
+    proc.terminate.assert_not_called()
+    assert not guard.cancelled
+
+
+def test_unrelated_changes_are_kept(
+    tmp_path: Path, classifier: Classifier, test_file: Path
+):
+    trigger = Trigger(delay=5)
+    request = make_request(tmp_path, "test_a.py")
+    guard = SpeculativeGuard(trigger, request, classifier, affected=True)
+    unrelated = os.path.join(tmp_path.absolute(), "test_b.py")
+    trigger.emit(unrelated)
+
+    assert guard._check(trigger.changes) == []
+    assert guard.unrelated == {unrelated}
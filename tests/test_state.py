@@ -0,0 +1,132 @@
+import logging
+import shutil
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from pytest_watcher import state as state_module
+from pytest_watcher.state import HEADER, MAGIC, StateStore
+
+
+@pytest.fixture
+def state_dir(tmp_path: Path):
+    path = tmp_path.joinpath("state")
+
+    yield path
+
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@pytest.fixture
+def store(state_dir: Path) -> StateStore:
+    return StateStore(state_dir)
+
+
+def test_for_project_uses_cache_dir(_isolate_cache_dir: Path):
+    store = StateStore.for_project(Path("."))
+
+    assert store.directory.parent.parent == _isolate_cache_dir.joinpath("pytest-watcher")
+    assert store.directory.name == "state"
+
+
+def test_missing_section_returns_default(store: StateStore):
+    assert store.get("results", []) == []
+
+
+def test_save_and_load(store: StateStore, state_dir: Path):
+    store.set("file_index", {"a.py": "abc"})
+    store.save()
+
+    assert StateStore(state_dir).get("file_index") == {"a.py": "abc"}
+
+
+def test_save_writes_only_modified_sections(store: StateStore, state_dir: Path):
+    store.set("one", 1)
+    store.save()
+    store.set("two", 2)
+    state_dir.joinpath("one.state").unlink()
+
+    store.save()
+
+    assert sorted(p.name for p in state_dir.iterdir()) == ["two.state"]
+
+
+def test_sections_are_loaded_lazily(
+    store: StateStore, state_dir: Path, mocker: MockerFixture
+):
+    store.set("one", 1)
+    store.set("two", 2)
+    store.save()
+
+    reloaded = StateStore(state_dir)
+    load = mocker.spy(reloaded, "_load")
+
+    assert reloaded.get("one") == 1
+    assert reloaded.get("one") == 1
+    load.assert_called_once_with("one", None)
+
+
+def test_write_leaves_no_temporary_files(store: StateStore, state_dir: Path):
+    store.set("one", list(range(1000)))
+    store.save()
+
+    assert [p.name for p in state_dir.iterdir()] == ["one.state"]
+
+
+def test_failed_write_keeps_previous_state(
+    store: StateStore, state_dir: Path, mocker: MockerFixture
+):
+    store.set("one", 1)
+    store.save()
+
+    mocker.patch("pytest_watcher.state.pickle.dump", side_effect=OSError("disk full"))
+    store.set("one", 2)
+    store.save()
+
+    assert StateStore(state_dir).get("one") == 1
+    assert [p.name for p in state_dir.iterdir()] == ["one.state"]
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b"",
+        b"garbage",
+        HEADER.pack(b"NOTSTATE", state_module.STATE_VERSION) + b"data",
+        HEADER.pack(MAGIC, state_module.STATE_VERSION) + b"\x80\x05truncated",
+    ],
+)
+def test_corrupted_state_is_discarded(
+    state_dir: Path, content: bytes, caplog: pytest.LogCaptureFixture
+):
+    state_dir.mkdir()
+    path = state_dir.joinpath("results.state")
+    path.write_bytes(content)
+
+    with caplog.at_level(logging.WARNING):
+        assert StateStore(state_dir).get("results", []) == []
+
+    assert "Discarding corrupted watcher state 'results'" in caplog.text
+    assert not path.exists()
+
+
+def test_state_of_another_version_is_discarded(
+    store: StateStore, state_dir: Path, mocker: MockerFixture
+):
+    store.set("results", [1])
+    store.save()
+
+    mocker.patch.object(state_module, "STATE_VERSION", state_module.STATE_VERSION + 1)
+
+    assert StateStore(state_dir).get("results", []) == []
+
+
+def test_clear(store: StateStore, state_dir: Path):
+    store.set("one", 1)
+    store.save()
+
+    store.clear()
+
+    assert store.get("one") is None
+    assert list(state_dir.iterdir()) == []
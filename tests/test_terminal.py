@@ -0,0 +1,169 @@
+import io
+import logging
+import os
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from pytest_watcher import terminal
+from pytest_watcher.terminal import (
+    DummyTerminal,
+    Status,
+    StatusLine,
+    format_elapsed,
+    get_terminal,
+)
+
+
+@pytest.fixture
+def stream() -> io.StringIO:
+    return io.StringIO()
+
+
+@pytest.fixture
+def clock(mocker: MockerFixture) -> MagicMock:
+    return mocker.patch("pytest_watcher.terminal.time.monotonic", return_value=100.0)
+
+
+@pytest.fixture(autouse=True)
+def terminal_size(mocker: MockerFixture) -> MagicMock:
+    return mocker.patch(
+        "pytest_watcher.terminal.shutil.get_terminal_size",
+        return_value=os.terminal_size((80, 24)),
+    )
+
+
+def test_draw(stream: io.StringIO, clock: MagicMock):
+    line = StatusLine(stream)
+
+    line.draw("[ptw] watching")
+
+    assert stream.getvalue() == "\r[ptw] watching\033[K"
+
+
+def test_draw_same_text_writes_nothing(stream: io.StringIO, clock: MagicMock):
+    line = StatusLine(stream)
+    line.draw("[ptw] watching")
+    clock.return_value += 1
+
+    line.draw("[ptw] watching")
+
+    assert stream.getvalue() == "\r[ptw] watching\033[K"
+
+
+def test_redraw_writes_only_the_difference(stream: io.StringIO, clock: MagicMock):
+    line = StatusLine(stream)
+    line.draw("last run 10s ago")
+    clock.return_value += 1
+    stream.truncate(0)
+    stream.seek(0)
+
+    line.draw("last run 11s ago")
+
+    assert stream.getvalue() == "\r\033[10C1s ago\033[K"
+
+
+def test_redraw_is_rate_limited(stream: io.StringIO, clock: MagicMock):
+    line = StatusLine(stream, interval=1.0)
+    line.draw("one")
+    clock.return_value += 0.5
+
+    line.draw("two")
+
+    assert "two" not in stream.getvalue()
+
+    clock.return_value += 0.5
+    line.draw("two")
+
+    assert "two" in stream.getvalue()
+
+
+def test_draw_after_erase_is_immediate(stream: io.StringIO, clock: MagicMock):
+    line = StatusLine(stream, interval=1.0)
+    line.draw("one")
+
+    line.erase()
+    line.draw("two")
+
+    assert stream.getvalue() == "\rone\033[K\r\033[K\rtwo\033[K"
+
+
+def test_draw_with_cursor(stream: io.StringIO, clock: MagicMock):
+    line = StatusLine(stream, interval=1.0)
+    line.draw("> -x", cursor=2)
+
+    assert stream.getvalue() == "\r> -x\033[K\r\033[2C"
+
+    line.draw("> -xv", cursor=5, force=True)
+
+    assert stream.getvalue().endswith("\r\033[4Cv\033[K")
+
+
+def test_erase_without_status_writes_nothing(stream: io.StringIO):
+    StatusLine(stream).erase()
+
+    assert stream.getvalue() == ""
+
+
+def test_draw_truncates_to_terminal_width(
+    stream: io.StringIO, clock: MagicMock, terminal_size: MagicMock
+):
+    terminal_size.return_value = os.terminal_size((10, 24))
+
+    StatusLine(stream).draw("a" * 20)
+
+    assert stream.getvalue() == "\r" + "a" * 9 + "\033[K"
+
+
+def test_erase_before_log(stream: io.StringIO, clock: MagicMock):
+    line = StatusLine(stream)
+    line.draw("status")
+    record = logging.LogRecord("ptw", logging.INFO, "", 0, "msg", None, None)
+
+    assert line.erase_before_log(record) is True
+    assert stream.getvalue().endswith("\r\033[K")
+
+
+@pytest.mark.parametrize(
+    ("seconds", "expected"),
+    [(-1, "0s"), (5.7, "5s"), (125, "2m"), (7300, "2h")],
+)
+def test_format_elapsed(seconds: float, expected: str):
+    assert format_elapsed(seconds) == expected
+
+
+def test_status_render():
+    status = Status(
+        state="watching",
+        runner_args=["-x"],
+        returncode=1,
+        duration=2.34,
+        finished=100.0,
+        queued=2,
+    )
+
+    assert status.render(130.0) == (
+        "[ptw] watching | last run failed in 2.3s, 30s ago | 2 queued | args: -x"
+        " | w: menu"
+    )
+
+
+def test_status_render_flaky():
+    status = Status(returncode=1, flaky=True, duration=1.0, finished=0.0)
+
+    assert "last run flaky in 1.0s" in status.render(0.0)
+
+
+def test_status_render_test_filter():
+    assert "| filter: main loop |" in Status(test_filter="main loop").render(0)
+
+
+def test_status_render_before_first_run():
+    assert Status().render(0) == "[ptw] watching | w: menu"
+
+
+def test_get_terminal_without_tty(mocker: MockerFixture):
+    mocker.patch.object(terminal.sys, "stdout", io.StringIO())
+
+    assert isinstance(get_terminal(), DummyTerminal)
@@ -0,0 +1,185 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+from watchdog import events
+
+from pytest_watcher.config import Config
+from pytest_watcher.datadeps import DataDependencies
+from pytest_watcher.event_handler import EventHandler
+from pytest_watcher.tiers import Classifier, Tier, select_tests
+from pytest_watcher.trigger import SOURCE_FILE, SOURCE_MANUAL, RunRequest, Trigger
+
+
+@pytest.fixture
+def project(tmp_path: Path):
+    path = tmp_path.joinpath("tiers").absolute()
+    for name in (
+        "conftest.py",
+        "pytest.ini",
+        "pkg/module.py",
+        "tests/conftest.py",
+        "tests/test_a.py",
+        "tests/b_test.py",
+        "tests/data/input.json",
+        "tests/test_input.py",
+        "README.md",
+    ):
+        path.joinpath(name).parent.mkdir(parents=True, exist_ok=True)
+        path.joinpath(name).touch()
+
+    yield path
+
+    shutil.rmtree(path)
+
+
+@pytest.fixture
+def classifier(project: Path) -> Classifier:
+    return Classifier(project, {"tests/data/*.json": ["tests/test_input.py"]})
+
+
+@pytest.mark.parametrize(
+    ("name", "tier", "targets"),
+    [
+        ("tests/test_a.py", Tier.TEST, ("tests/test_a.py",)),
+        ("tests/b_test.py", Tier.TEST, ("tests/b_test.py",)),
+        ("pkg/module.py", Tier.SOURCE, None),
+        ("tests/conftest.py", Tier.CONFTEST, ("tests",)),
+        ("conftest.py", Tier.CONFTEST, None),
+        ("pytest.ini", Tier.CONFIG, None),
+        ("tests/data/input.json", Tier.RESOURCE, ("tests/test_input.py",)),
+        ("README.md", Tier.OTHER, None),
+    ],
+)
+def test_classify(classifier: Classifier, project: Path, name: str, tier: Tier, targets):
+    change = classifier.classify(str(project.joinpath(name)))
+
+    assert change.tier is tier
+    if targets is None:
+        assert change.targets is None
+    else:
+        assert change.targets == tuple(str(project.joinpath(t)) for t in targets)
+
+
+def test_python_files_from_pytest_config(project: Path):
+    project.joinpath("pytest.ini").write_text("[pytest]\npython_files = check_*.py\n")
+
+    classifier = Classifier.create(project, {})
+
+    assert classifier.classify(str(project.joinpath("check_a.py"))).tier is Tier.TEST
+    assert classifier.classify(str(project.joinpath("test_a.py"))).tier is Tier.SOURCE
+
+
+def relative(project: Path, *names: str):
+    return [os.path.relpath(project.joinpath(n)) for n in names]
+
+
+def test_select_union_of_targets(classifier: Classifier, project: Path):
+    changes = [
+        str(project.joinpath("tests/test_a.py")),
+        str(project.joinpath("tests/data/input.json")),
+    ]
+
+    assert classifier.select(changes) == sorted(
+        relative(project, "tests/test_a.py", "tests/test_input.py")
+    )
+
+
+@pytest.mark.parametrize("name", ["conftest.py", "pytest.ini", "pkg/module.py"])
+def test_select_whole_suite(classifier: Classifier, project: Path, name: str):
+    changes = [str(project.joinpath("tests/test_a.py")), str(project.joinpath(name))]
+
+    assert classifier.select(changes) is None
+
+
+def test_select_removed_test_file(classifier: Classifier, project: Path):
+    path = project.joinpath("tests/test_a.py")
+    path.unlink()
+
+    assert classifier.select([str(path)]) is None
+
+
+def test_select_tests(classifier: Classifier, project: Path, config: Config):
+    config.affected = True
+    request = RunRequest(
+        ("-x",), SOURCE_FILE, {str(project.joinpath("tests/b_test.py"))}
+    )
+
+    assert select_tests(config, request, classifier) == relative(
+        project, "tests/b_test.py"
+    )
+
+
+def test_select_tests_with_option_values(
+    classifier: Classifier, project: Path, config: Config
+):
+    config.affected = True
+    request = RunRequest(
+        ("--cov", "tests"), SOURCE_FILE, {str(project.joinpath("tests/b_test.py"))}
+    )
+
+    assert select_tests(config, request, classifier) == relative(
+        project, "tests/b_test.py"
+    )
+
+
+@pytest.mark.parametrize(
+    ("affected", "source", "runner", "args"),
+    [
+        (False, SOURCE_FILE, "pytest", ()),
+        (True, SOURCE_MANUAL, "pytest", ()),
+        (True, SOURCE_FILE, "tox", ()),
+        (True, SOURCE_FILE, "pytest", ("-x", "tests")),
+        (True, SOURCE_FILE, "pytest", ("tests/test_a.py::test_one",)),
+    ],
+)
+def test_select_tests_disabled(
+    classifier: Classifier,
+    project: Path,
+    config: Config,
+    affected: bool,
+    source: str,
+    runner: str,
+    args,
+):
+    config.affected = affected
+    config.runner = runner
+    request = RunRequest(args, source, {str(project.joinpath("tests/test_a.py"))})
+
+    assert select_tests(config, request, classifier) == []
+
+
+def test_classify_learned_test_inputs(project: Path, trigger: Trigger):
+    deps = DataDependencies(project)
+    deps.replace(
+        {
+            str(project.joinpath("tests/test_a.py")): [
+                str(project.joinpath("tests/data/query.sql"))
+            ]
+        }
+    )
+    classifier = Classifier(project, data_deps=deps)
+    path = str(project.joinpath("tests/data/query.sql"))
+
+    change = classifier.classify(path)
+
+    assert change.tier is Tier.RESOURCE
+    assert change.targets == (str(project.joinpath("tests/test_a.py")),)
+    # Watched even though it does not match the patterns
+    EventHandler(trigger, classifier=classifier).dispatch(events.FileModifiedEvent(path))
+    assert trigger.changes == {path}
+
+
+def test_event_handler_watches_test_inputs(
+    classifier: Classifier, project: Path, trigger: Trigger
+):
+    handler = EventHandler(trigger, classifier=classifier)
+    path = str(project.joinpath("tests/data/input.json"))
+
+    handler.dispatch(events.FileModifiedEvent(path))
+
+    assert trigger.changes == {path}
+    change = handler.classify(path)
+    assert change is not None
+    assert change.tier is Tier.RESOURCE
@@ -0,0 +1,141 @@
+from freezegun import freeze_time
+
+from pytest_watcher.trigger import (
+    SOURCE_CLIENT,
+    SOURCE_FILE,
+    SOURCE_MANUAL,
+    RunRequest,
+    Trigger,
+)
+
+
+def test_emit_collects_changes(trigger: Trigger):
+    trigger.emit("a.py")
+    trigger.emit("b.py")
+    trigger.emit()
+
+    assert trigger.is_active()
+    assert trigger.changes == {"a.py", "b.py"}
+
+
+def test_take_changes_starts_new_change_set(trigger: Trigger):
+    trigger.emit_many(["a.py", "b.py"])
+
+    assert trigger.take_changes() == {"a.py", "b.py"}
+    assert trigger.changes == set()
+
+
+def test_add_changes_does_not_activate(trigger: Trigger):
+    trigger.add_changes(["a.py"])
+
+    assert not trigger.is_active()
+    assert trigger.changes == {"a.py"}
+
+
+def test_equivalent_requests_are_merged(trigger: Trigger):
+    trigger.emit_now(["-x"])
+    trigger.emit_now(["-x"])
+    trigger.emit_now(["--lf"])
+
+    assert [r.args for r in trigger.pending()] == [("-x",), ("--lf",)]
+
+
+def test_request_keeps_args_at_the_time_of_request(trigger: Trigger):
+    args = ["-x"]
+    trigger.emit_now(args)
+    args.append("--lf")
+
+    request = trigger.take_request(["-v"])
+
+    assert request is not None
+    assert request.args == ("-x",)
+    assert request.source == SOURCE_MANUAL
+
+
+def test_request_without_args_uses_current_runner_args(trigger: Trigger):
+    trigger.emit_now(source=SOURCE_CLIENT)
+
+    request = trigger.take_request(["-v"])
+
+    assert request is not None
+    assert request.args == ("-v",)
+    assert request.source == SOURCE_CLIENT
+
+
+@freeze_time("2020-01-01 00:00:00")
+def test_requests_take_priority_over_file_changes():
+    trigger = Trigger(delay=5)
+    trigger.emit("a.py")
+    trigger.emit_now(["-x"])
+
+    request = trigger.take_request([])
+
+    assert request is not None
+    assert request.source == SOURCE_MANUAL
+    assert request.changes == {"a.py"}
+
+    assert not trigger.is_active()
+    assert trigger.take_request([]) is None
+
+
+@freeze_time("2020-01-01 00:00:00")
+def test_file_request_is_due_after_delay():
+    trigger = Trigger(delay=5)
+    trigger.emit("a.py")
+
+    assert trigger.take_request(["-x"]) is None
+    assert [r.source for r in trigger.pending()] == [SOURCE_FILE]
+
+    with freeze_time("2020-01-01 00:00:06"):
+        request = trigger.take_request(["-x"])
+
+    assert request is not None
+    assert request.source == SOURCE_FILE
+    assert request.args == ("-x",)
+    assert request.changes == {"a.py"}
+
+
+@freeze_time("2020-01-01 00:00:00")
+def test_early_file_request():
+    trigger = Trigger(delay=5)
+    assert not trigger.check(early=True)
+
+    trigger.emit("a.py")
+
+    assert not trigger.check()
+    assert trigger.check(early=True)
+
+    request = trigger.take_request(["-x"], early=True)
+
+    assert request is not None
+    assert request.source == SOURCE_FILE
+    assert request.changes == {"a.py"}
+    assert not trigger.is_active()
+
+
+def test_release_keeps_requested_runs(trigger: Trigger):
+    trigger.emit()
+    trigger.emit_now(["-x"])
+
+    trigger.release()
+
+    assert trigger.check()
+    assert [r.source for r in trigger.pending()] == [SOURCE_MANUAL]
+
+
+def test_describe_request():
+    request = RunRequest(("-x", "--lf"), SOURCE_FILE, {"a.py", "b.py"})
+
+    assert request.describe() == "file [-x --lf] 2 changed files"
+
+
+def test_trigger_clock():
+    now = 0.0
+    trigger = Trigger(delay=1.0, clock=lambda: now)
+    trigger.emit("a.py")
+
+    assert not trigger.check()
+
+    now = 1.5
+
+    assert trigger.check()
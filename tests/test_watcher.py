@@ -1,21 +1,29 @@
+import json
+import os
 import sys
 from pathlib import Path
-from unittest.mock import MagicMock, sentinel
+from unittest.mock import ANY, MagicMock, sentinel
 
 import pytest
 from freezegun import freeze_time
 from pytest_mock.plugin import MockerFixture
 
-from pytest_watcher import watcher
+from pytest_watcher import inotify, watcher
 from pytest_watcher.config import Config
 from pytest_watcher.constants import LOOP_DELAY
+from pytest_watcher.datadeps import DataDependencies
+from pytest_watcher.plugin import INPUTS_OUTPUT_ENV, RESULTS_OUTPUT_ENV
+from pytest_watcher.resources import MB, Usage
+from pytest_watcher.runner import RunResult
+from pytest_watcher.session import Session
 from pytest_watcher.terminal import Terminal
+from pytest_watcher.tiers import Classifier
 from pytest_watcher.trigger import Trigger
 
 
 @freeze_time("2020-01-01 00:00:00")
 def test_main_loop_does_not_invoke_runner_without_trigger(
-    mock_subprocess_run: MagicMock,
+    mock_runner_run: MagicMock,
     mock_time_sleep: MagicMock,
     config: Config,
     mock_terminal: Terminal,
@@ -23,13 +31,13 @@ def test_main_loop_does_not_invoke_runner_without_trigger(
 ):
     watcher.main_loop(trigger, config, mock_terminal)
 
-    mock_subprocess_run.assert_not_called()
+    mock_runner_run.assert_not_called()
     mock_time_sleep.assert_called_once_with(LOOP_DELAY)
 
 
 @freeze_time("2020-01-01 00:00:00")
 def test_main_loop_does_not_invoke_runner_before_delay(
-    mock_subprocess_run: MagicMock,
+    mock_runner_run: MagicMock,
     mock_time_sleep: MagicMock,
     config: Config,
     mock_terminal: MagicMock,
@@ -41,7 +49,7 @@ def test_main_loop_does_not_invoke_runner_before_delay(
     with freeze_time("2020-01-01 00:00:04"):
         watcher.main_loop(trigger, config, mock_terminal)
 
-    mock_subprocess_run.assert_not_called()
+    mock_runner_run.assert_not_called()
     mock_time_sleep.assert_called_once_with(LOOP_DELAY)
 
     assert trigger.is_active()
@@ -49,7 +57,7 @@ def test_main_loop_does_not_invoke_runner_before_delay(
 
 @freeze_time("2020-01-01 00:00:00")
 def test_main_loop_invokes_runner_after_delay(
-    mock_subprocess_run: MagicMock,
+    mock_runner_run: MagicMock,
     mock_time_sleep: MagicMock,
     config: Config,
     mock_terminal: MagicMock,
@@ -63,7 +71,13 @@ def test_main_loop_invokes_runner_after_delay(
     with freeze_time("2020-01-01 00:00:06"):
         watcher.main_loop(trigger, config, mock_terminal)
 
-    mock_subprocess_run.assert_called_once_with(["custom", "foo", "bar"], check=True)
+    mock_runner_run.assert_called_once_with(
+        ["custom", "foo", "bar"],
+        sample_interval=config.rss_sample_interval,
+        env=None,
+        base_env=ANY,
+        on_start=None,
+    )
     mock_time_sleep.assert_called_once_with(LOOP_DELAY)
 
     assert not trigger.is_active()
@@ -71,7 +85,7 @@ def test_main_loop_invokes_runner_after_delay(
 
 @freeze_time("2020-01-01 00:00:00")
 def test_main_loop_clear(
-    mock_subprocess_run: MagicMock,
+    mock_runner_run: MagicMock,
     mock_time_sleep: MagicMock,
     config: Config,
     mock_terminal: MagicMock,
@@ -88,7 +102,7 @@ def test_main_loop_clear(
 
 @freeze_time("2020-01-01 00:00:00")
 def test_main_loop_no_clear(
-    mock_subprocess_run: MagicMock,
+    mock_runner_run: MagicMock,
     mock_time_sleep: MagicMock,
     config: Config,
     mock_terminal: MagicMock,
@@ -104,7 +118,7 @@ def test_main_loop_no_clear(
 
 
 def test_main_loop_keystroke(
-    mock_subprocess_run: MagicMock,
+    mock_runner_run: MagicMock,
     mock_time_sleep: MagicMock,
     mock_run_command: MagicMock,
     config: Config,
@@ -112,7 +126,7 @@ def test_main_loop_keystroke(
     mock_terminal: MagicMock,
 ):
     trigger.emit()
-    mock_terminal.capture_keystroke.return_value = sentinel.KEYSTROKE
+    mock_terminal.read_keys.return_value = [sentinel.KEYSTROKE]
 
     watcher.main_loop(trigger, config, mock_terminal)
 
@@ -124,11 +138,13 @@ def test_main_loop_keystroke(
 def assert_observer_started(mock_observer: MagicMock, expected_path: Path):
     mock_observer.assert_called_once_with()
     observer_instance = mock_observer.return_value
-    observer_instance.schedule.assert_called_once()
     observer_instance.start.assert_called_once()
 
-    path = mock_observer.return_value.schedule.call_args[0][1]
-    assert path == expected_path
+    project_watch, config_watch, *_ = observer_instance.schedule.call_args_list
+
+    assert project_watch[0][1] == expected_path
+    assert project_watch[1] == {"recursive": True}
+    assert config_watch[1] == {"recursive": False}
 
 
 def test_run_starts_the_observer_and_main_loop(
@@ -175,7 +191,444 @@ def test_patterns_and_ignore_patterns_are_passed_to_event_handler(
     with pytest.raises(InterruptedError):
         watcher.run()
 
-    event_handler = mock_observer.return_value.schedule.call_args[0][0]
+    event_handler = mock_observer.return_value.schedule.call_args_list[0][0][0]
 
     assert event_handler.patterns == ["*.py", ".env"]
     assert event_handler.ignore_patterns == ["settings.py"]
+
+
+@pytest.mark.parametrize(
+    ("returncode", "notify", "bell"),
+    [(0, True, False), (1, False, False), (1, True, True)],
+)
+def test_main_loop_notify_on_failure(
+    mock_runner_run: MagicMock,
+    config: Config,
+    mock_terminal: MagicMock,
+    trigger: Trigger,
+    returncode: int,
+    notify: bool,
+    bell: bool,
+):
+    mock_runner_run.return_value.returncode = returncode
+    config.notify_on_failure = notify
+    trigger.emit_now()
+
+    watcher.main_loop(trigger, config, mock_terminal)
+
+    assert mock_terminal.print_bell.called is bell
+
+
+def test_main_loop_prints_resource_usage(
+    mock_runner_run: MagicMock,
+    config: Config,
+    mock_terminal: MagicMock,
+    trigger: Trigger,
+):
+    session = Session()
+    session.stats.add(Usage(max_rss=10 * MB))
+    mock_runner_run.return_value.usage = Usage(duration=1.5, max_rss=300 * MB)
+    trigger.emit_now()
+
+    watcher.main_loop(trigger, config, mock_terminal, session)
+
+    printed = "".join(call[0][0] for call in mock_terminal.print.call_args_list)
+
+    assert "time 1.50s" in printed
+    assert "Peak RSS grew by 290 MB" in printed
+    assert len(session.stats.runs) == 2
+
+
+def test_main_loop_profiles_next_run(
+    mock_runner_run: MagicMock,
+    config: Config,
+    mock_terminal: MagicMock,
+    trigger: Trigger,
+    mocker: MockerFixture,
+    tmp_path: Path,
+):
+    mocker.patch("pytest_watcher.watcher.get_cache_dir", return_value=tmp_path)
+    mock_report = mocker.patch(
+        "pytest_watcher.profiling.Profiler.report", return_value="REPORT"
+    )
+    config.profile = True
+    trigger.emit_now()
+
+    watcher.main_loop(trigger, config, mock_terminal)
+
+    command = mock_runner_run.call_args[0][0]
+    assert command[:3] == ["pytest", "-p", "pytest_watcher.plugin"]
+    assert mock_runner_run.call_args[1]["env"]
+    mock_report.assert_called_once()
+    mock_terminal.print.assert_any_call("REPORT")
+
+    assert config.profile is False
+
+
+def test_main_loop_defers_run_when_scheduler_refuses(
+    mock_runner_run: MagicMock,
+    config: Config,
+    mock_terminal: MagicMock,
+    trigger: Trigger,
+    mocker: MockerFixture,
+):
+    session = Session()
+    mocker.patch.object(session.scheduler, "try_acquire", return_value=None)
+    trigger.emit_now()
+
+    watcher.main_loop(trigger, config, mock_terminal, session)
+
+    mock_runner_run.assert_not_called()
+    assert trigger.is_active()
+
+
+def test_main_loop_runs_requests_in_order(
+    mock_runner_run: MagicMock,
+    config: Config,
+    mock_terminal: MagicMock,
+    trigger: Trigger,
+):
+    config.runner_args = ["-v"]
+    trigger.emit_now(["-x"])
+    trigger.emit_now(["--lf"])
+
+    watcher.main_loop(trigger, config, mock_terminal)
+
+    assert mock_runner_run.call_args[0][0] == ["pytest", "-x"]
+    mock_terminal.print_pending.assert_called_once_with(trigger.pending())
+    assert trigger.is_active()
+
+    watcher.main_loop(trigger, config, mock_terminal)
+
+    assert mock_runner_run.call_args[0][0] == ["pytest", "--lf"]
+    assert not trigger.is_active()
+
+
+def test_main_loop_updates_status(
+    mock_runner_run: MagicMock,
+    config: Config,
+    mock_terminal: MagicMock,
+    trigger: Trigger,
+):
+    mock_runner_run.return_value.returncode = 1
+    trigger.emit_now(["-x"])
+    trigger.emit_now(["--lf"])
+
+    watcher.main_loop(trigger, config, mock_terminal)
+
+    status = mock_terminal.update_status.call_args[0][0]
+    assert status.state == "run pending"
+    assert status.returncode == 1
+    assert status.queued == 1
+
+
+def test_run_json_mode(
+    mocker: MockerFixture,
+    mock_observer: MagicMock,
+    mock_main_loop: MagicMock,
+):
+    mocker.patch.object(sys, "argv", ["ptw", ".", "--json", "--max-runs", "1"])
+    mocker.patch("pytest_watcher.watcher.daemon.is_running", return_value=True)
+    mock_batch_run = mocker.patch("pytest_watcher.watcher.batch.run", return_value=1)
+
+    assert watcher.run() == 1
+
+    mock_batch_run.assert_called_once()
+    assert_observer_started(mock_observer, Path("."))
+    mock_observer.return_value.stop.assert_called_once_with()
+    mock_main_loop.assert_not_called()
+
+
+def test_run_watches_derived_scope(
+    mocker: MockerFixture,
+    mock_observer: MagicMock,
+    mock_main_loop: MagicMock,
+    capsys: pytest.CaptureFixture,
+):
+    mocker.patch.object(sys, "argv", ["ptw", ".", "--watch-paths", "tests"])
+
+    with pytest.raises(InterruptedError):
+        watcher.run()
+
+    tests_watch, root_watch, *_ = mock_observer.return_value.schedule.call_args_list
+
+    assert tests_watch[0][1] == Path("tests")
+    assert tests_watch[1] == {"recursive": True}
+    assert root_watch[0][1] == Path(".")
+    assert root_watch[1] == {"recursive": False}
+
+    assert f"{Path('tests').absolute()} (watch_paths)" in capsys.readouterr().out
+
+
+@freeze_time("2020-01-01 00:00:00")
+def test_main_loop_runs_affected_tests(
+    mock_runner_run: MagicMock,
+    config: Config,
+    mock_terminal: MagicMock,
+):
+    config.affected = True
+    session = Session(classifier=Classifier(Path(".")))
+    trigger = Trigger(delay=1)
+    trigger.emit(str(Path("tests/test_watcher.py").absolute()))
+
+    with freeze_time("2020-01-01 00:00:02"):
+        watcher.main_loop(trigger, config, mock_terminal, session)
+
+    command = mock_runner_run.call_args[0][0]
+    assert command == ["pytest", os.path.join("tests", "test_watcher.py")]
+
+
+def test_create_observer(config: Config, mocker: MockerFixture):
+    mocker.patch("pytest_watcher.watcher.inotify.is_available", return_value=True)
+    assert type(watcher._create_observer(config)) is watcher.Observer
+
+    config.observer = "inotify"
+    observer = watcher._create_observer(config)
+    assert isinstance(observer, inotify.InotifyObserver)
+    observer.join()
+
+
+def test_create_observer_falls_back_to_watchdog(config: Config, mocker: MockerFixture):
+    mocker.patch("pytest_watcher.watcher.inotify.is_available", return_value=False)
+    config.observer = "inotify"
+
+    assert type(watcher._create_observer(config)) is watcher.Observer
+
+
+def test_main_loop_speculative_run_starts_before_delay(
+    mock_runner_run: MagicMock, config: Config, mock_terminal: MagicMock
+):
+    config.speculative = True
+    trigger = Trigger(delay=5)
+    trigger.emit("a.py")
+
+    watcher.main_loop(trigger, config, mock_terminal)
+
+    mock_runner_run.assert_called_once()
+    assert mock_runner_run.call_args[1]["on_start"] is not None
+    assert not trigger.is_active()
+
+
+def test_main_loop_cancelled_speculative_run_restarts(
+    mock_runner_run: MagicMock,
+    config: Config,
+    mock_terminal: MagicMock,
+    mocker: MockerFixture,
+):
+    guard = mocker.patch("pytest_watcher.watcher.SpeculativeGuard").return_value
+    guard.cancelled = True
+    guard.cancelled_by = "b.py"
+    config.speculative = True
+    session = Session()
+    trigger = Trigger(delay=5)
+    trigger.emit("a.py")
+
+    def run(*args, **kwargs):
+        trigger.emit("b.py")
+        return mock_runner_run.return_value
+
+    mock_runner_run.side_effect = run
+
+    watcher.main_loop(trigger, config, mock_terminal, session)
+
+    mock_terminal.print.assert_any_call("\n[ptw] b.py changed, restarting the run\n")
+    assert session.last_result is None
+    assert trigger.changes == {"a.py", "b.py"}
+    assert trigger.check(early=True)
+
+
+def test_main_loop_focused_run(
+    mock_runner_run: MagicMock, config: Config, mock_terminal: MagicMock
+):
+    mock_runner_run.return_value.returncode = 1
+    config.runner_args = ["-x", "tests"]
+    config.focus = "tests/test_a.py::test_one"
+    session = Session()
+    trigger = Trigger()
+    trigger.emit("a.py")
+
+    watcher.main_loop(trigger, config, mock_terminal, session)
+
+    command = mock_runner_run.call_args[0][0]
+    assert command == ["pytest", "-x", "tests/test_a.py::test_one"]
+    assert config.focus == "tests/test_a.py::test_one"
+    assert session.focus_changes == {"a.py"}
+    assert not trigger.is_active()
+
+
+def test_main_loop_filtered_run(
+    mock_runner_run: MagicMock, config: Config, mock_terminal: MagicMock
+):
+    config.runner_args = ["-x", "tests"]
+    config.test_filter = ["tests/test_a.py", "tests/test_b.py::test_one"]
+    trigger = Trigger()
+    trigger.emit("a.py")
+
+    watcher.main_loop(trigger, config, mock_terminal, Session())
+
+    command = mock_runner_run.call_args[0][0]
+    assert command == ["pytest", "-x", "tests/test_a.py", "tests/test_b.py::test_one"]
+
+
+def test_main_loop_focus_released_on_pass(
+    mock_runner_run: MagicMock, config: Config, mock_terminal: MagicMock
+):
+    config.focus = "tests/test_a.py::test_one"
+    session = Session(focus_changes={"a.py"})
+    trigger = Trigger()
+    trigger.emit("b.py")
+
+    watcher.main_loop(trigger, config, mock_terminal, session)
+
+    assert config.focus is None
+    # The affected tests of the changes made while focused run next
+    assert trigger.changes == {"a.py", "b.py"}
+    assert trigger.is_active()
+    assert session.focus_changes == set()
+
+
+def test_main_loop_runs_stages_before_tests(
+    mock_runner_run: MagicMock, config: Config, mock_terminal: MagicMock
+):
+    config.stages = [
+        {"name": "lint", "runner": "ruff", "args": ["check"], "pass_changes": True},
+        {"name": "docs", "runner": "mkdocs", "patterns": ["*.md"]},
+    ]
+    trigger = Trigger()
+    trigger.emit(__file__)
+
+    watcher.main_loop(trigger, config, mock_terminal, Session())
+
+    commands = [c[0][0] for c in mock_runner_run.call_args_list]
+    assert commands == [["ruff", "check", __file__], ["pytest"]]
+    mock_terminal.print.assert_any_call("[ptw] Skipped, no relevant change: docs\n")
+
+
+def test_main_loop_stage_failure_skips_tests(
+    mock_runner_run: MagicMock, config: Config, mock_terminal: MagicMock
+):
+    config.notify_on_failure = True
+    config.stages = [{"name": "lint", "runner": "ruff"}]
+    mock_runner_run.return_value = RunResult(["ruff"], 1, Usage())
+    session = Session()
+    trigger = Trigger()
+    trigger.emit_now()
+
+    watcher.main_loop(trigger, config, mock_terminal, session)
+
+    assert [c[0][0] for c in mock_runner_run.call_args_list] == [["ruff"]]
+    assert session.last_result is mock_runner_run.return_value
+    # Only the test runs are kept in the history
+    assert len(session.stats.runs) == 0
+    mock_terminal.print_bell.assert_called_once()
+
+
+def test_main_loop_learns_test_inputs(
+    mock_runner_run: MagicMock, config: Config, mock_terminal: MagicMock
+):
+    config.learn_test_inputs = True
+    session = Session(data_deps=DataDependencies(Path(".")))
+    trigger = Trigger()
+    trigger.emit_now()
+
+    def run(command, **kwargs):
+        with open(kwargs["env"][INPUTS_OUTPUT_ENV], "w") as f:
+            json.dump({os.path.abspath("t.py"): [os.path.abspath("a.json")]}, f)
+        return RunResult(command, 1, Usage())
+
+    mock_runner_run.side_effect = run
+
+    watcher.main_loop(trigger, config, mock_terminal, session)
+
+    assert mock_runner_run.call_args[0][0] == ["pytest", "-p", "pytest_watcher.plugin"]
+    assert session.data_deps is not None
+    assert session.data_deps.targets("a.json") == [os.path.abspath("t.py")]
+
+
+def test_main_loop_learns_test_inputs_on_whole_suite_only(
+    mock_runner_run: MagicMock, config: Config, mock_terminal: MagicMock
+):
+    config.learn_test_inputs = True
+    config.runner_args = ["-k", "slow"]
+    session = Session(data_deps=DataDependencies(Path(".")))
+    trigger = Trigger()
+    trigger.emit_now(config.runner_args)
+
+    watcher.main_loop(trigger, config, mock_terminal, session)
+
+    assert mock_runner_run.call_args[0][0] == ["pytest", "-k", "slow"]
+    assert mock_runner_run.call_args[1]["env"] is None
+
+
+def test_main_loop_remote_writes_no_reports(config: Config, mock_terminal: MagicMock):
+    config.retry_flaky = True
+    config.learn_test_inputs = True
+    config.profile = True
+    remote = MagicMock()
+    remote.run.return_value = RunResult(["pytest"], 0, Usage())
+    session = Session(remote=remote, data_deps=DataDependencies(Path(".")))
+    trigger = Trigger()
+    trigger.emit_now()
+
+    watcher.main_loop(trigger, config, mock_terminal, session)
+
+    assert remote.run.call_args[0][0] == ["pytest"]
+    assert remote.run.call_args[1]["env"] is None
+    mock_terminal.print.assert_any_call(
+        "[ptw] Profiling is not available with --remote\n"
+    )
+
+
+def test_main_loop_retries_flaky_tests(
+    mock_runner_run: MagicMock, config: Config, mock_terminal: MagicMock
+):
+    config.retry_flaky = True
+    config.notify_on_failure = True
+    session = Session()
+    session.flaky.history = {"t::a": ["passed", 2], "t::b": ["passed", 0]}
+    trigger = Trigger()
+    trigger.emit_now()
+
+    def run(command, **kwargs):
+        if "env" in kwargs:
+            with open(kwargs["env"][RESULTS_OUTPUT_ENV], "w") as f:
+                json.dump({"failed": ["t::a"], "passed": ["t::b"]}, f)
+            return RunResult(command, 1, Usage())
+        return RunResult(command, 0, Usage())
+
+    mock_runner_run.side_effect = run
+
+    watcher.main_loop(trigger, config, mock_terminal, session)
+
+    assert mock_runner_run.call_args_list[0][0][0][:3] == [
+        "pytest",
+        "-p",
+        "pytest_watcher.plugin",
+    ]
+    assert mock_runner_run.call_args_list[1][0][0] == ["pytest", "t::a"]
+    assert session.last_result is not None
+    assert session.last_result.flaky == ["t::a"]
+    mock_terminal.print_bell.assert_not_called()
+
+
+def test_main_loop_does_not_retry_new_failures(
+    mock_runner_run: MagicMock, config: Config, mock_terminal: MagicMock
+):
+    config.retry_flaky = True
+    session = Session()
+    trigger = Trigger()
+    trigger.emit_now()
+
+    def run(command, **kwargs):
+        with open(kwargs["env"][RESULTS_OUTPUT_ENV], "w") as f:
+            json.dump({"failed": ["t::a"], "passed": []}, f)
+        return RunResult(command, 1, Usage())
+
+    mock_runner_run.side_effect = run
+
+    watcher.main_loop(trigger, config, mock_terminal, session)
+
+    mock_runner_run.assert_called_once()
+    assert session.last_result is not None
+    assert session.last_result.flaky == []
+    assert session.flaky.history == {"t::a": ["failed", 0]}